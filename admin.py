@@ -0,0 +1,78 @@
+from fastapi import APIRouter, Depends, HTTPException, Header
+from fastapi.responses import PlainTextResponse
+import asyncio
+import hmac
+import os
+
+from college_attendance.services import backups, sampling_profiler
+
+router = APIRouter(prefix="/admin", tags=["admin"])
+
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
+
+def require_admin(x_admin_token: str = Header(None)):
+    """Allow the request only with the configured ADMIN_TOKEN"""
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Admin API is disabled")
+    if not x_admin_token or not hmac.compare_digest(x_admin_token, ADMIN_TOKEN):
+        raise HTTPException(status_code=401, detail="Invalid admin token")
+
+@router.post("/profiler/start", dependencies=[Depends(require_admin)])
+async def start_process_profile(seconds: float = 10, mode: str = "wall"):
+    """
+    Sample the whole process for a number of seconds
+    """
+    if mode not in ("wall", "cpu"):
+        raise HTTPException(status_code=400, detail="mode must be 'wall' or 'cpu'")
+    if not 0 < seconds <= sampling_profiler.MAX_SECONDS:
+        raise HTTPException(status_code=400, detail=f"seconds must be between 0 and {sampling_profiler.MAX_SECONDS}")
+
+    profile = sampling_profiler.profile_process(seconds, mode)
+    return profile.summary()
+
+@router.get("/profiles", dependencies=[Depends(require_admin)])
+async def list_profiles():
+    """
+    List captured profiles, newest first
+    """
+    return sampling_profiler.store.list()
+
+@router.get("/profiles/{profile_id}", dependencies=[Depends(require_admin)])
+async def download_profile(profile_id: str):
+    """
+    Download a profile as collapsed stacks for flamegraph.pl or speedscope
+    """
+    profile = sampling_profiler.store.get(profile_id)
+    if not profile:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    if not profile.done:
+        raise HTTPException(status_code=409, detail="Profile is still being captured")
+
+    return PlainTextResponse(
+        profile.folded(),
+        headers={"Content-Disposition": f'attachment; filename="{profile.id}.folded"'}
+    )
+
+@router.post("/backups", dependencies=[Depends(require_admin)])
+async def create_backup():
+    """
+    Snapshot the database online (the app keeps serving) and rotate old snapshots
+    """
+    try:
+        snapshot = await asyncio.to_thread(backups.snapshot)
+    except backups.BackupInProgress as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except backups.BackupError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return _without_path(snapshot)
+
+@router.get("/backups", dependencies=[Depends(require_admin)])
+async def list_backups():
+    """
+    List database snapshots, newest first
+    """
+    return [_without_path(snapshot) for snapshot in backups.list_snapshots()]
+
+def _without_path(snapshot: dict) -> dict:
+    # Server file paths stay out of responses
+    return {key: value for key, value in snapshot.items() if key != "path"}
@@ -1,9 +1,90 @@
-from sqlalchemy.orm import Session
-from sqlalchemy import and_
+from sqlalchemy.orm import Session, joinedload
+from sqlalchemy import Integer, String, and_, bindparam, exists, func, insert, select
+from sqlalchemy.exc import IntegrityError
 from datetime import datetime, timedelta
 from typing import Optional, Dict, Any
+import logging
+import os
 from college_attendance.models.db_models import Session as DBSession, Attendance, Student
 from college_attendance.services.qr_generator import QRGenerator
+from college_attendance.services.proxy_detector import detector as proxy_detector
+from college_attendance.services.geofence import GeofenceService, format_location
+from college_attendance.services.interning import client_ips, user_agents
+from college_attendance.services.name_matching import normalize_name
+from college_attendance.services.session_lifecycle import register_eviction
+from college_attendance.services.state_backend import StateBackendError, get_state
+from college_attendance.services.tenancy import scoped
+
+logger = logging.getLogger("college_attendance.attendance")
+
+# Scans read sessions and students from the shared state backend, so every
+# worker sees the same cache and a closed session is dropped for all of them
+SESSION_CACHE_SECONDS = float(os.getenv("SESSION_CACHE_SECONDS", "30"))
+STUDENT_CACHE_SECONDS = float(os.getenv("STUDENT_CACHE_SECONDS", "300"))
+
+# Statements of the scan path (mark_attendance_core), built once so every scan
+# reuses their compiled form from the engine's statement cache and the
+# driver's prepared statements instead of building ORM queries and objects
+_session_by_token = select(DBSession.id, DBSession.class_name, DBSession.expires_at).where(
+    DBSession.session_token == bindparam("session_token"), DBSession.is_active == True
+)
+_student_by_roll_no = select(
+    Student.id, Student.roll_no, Student.name, Student.class_name,
+    Student.name_normalized, Student.father_name, Student.father_name_normalized
+).where(Student.roll_no == bindparam("roll_no"))
+# Inserts nothing when the student already has a row for the session, so the
+# duplicate check, the insert and reading back the timestamp are one statement.
+# Two concurrent inserts can both pass the check (PostgreSQL's READ COMMITTED);
+# the unique ix_attendances_session_student index rejects the second one.
+_insert_scan = insert(Attendance).from_select(
+    ["session_id", "student_id", "timestamp", "ip_address_id", "user_agent_id", "location"],
+    select(
+        bindparam("session_id", type_=Integer), bindparam("student_id", type_=Integer), func.now(),
+        bindparam("ip_address_id", type_=Integer), bindparam("user_agent_id", type_=Integer),
+        bindparam("location", type_=String)
+    ).where(~exists().where(
+        Attendance.session_id == bindparam("session_id"), Attendance.student_id == bindparam("student_id")
+    ))
+)
+_insert_scan_returning = _insert_scan.returning(Attendance.timestamp)
+# For databases without INSERT ... RETURNING (SQLite before 3.35)
+_scan_timestamp = select(Attendance.timestamp).where(Attendance.id == bindparam("id"))
+
+def _cache_get(key: str) -> Any:
+    try:
+        return get_state().get(key)
+    except StateBackendError as e:
+        logger.warning("State backend read failed, using the database: %s", e)
+        return None
+
+def _cache_set(key: str, value: Any, ttl: float):
+    try:
+        get_state().set(key, value, ttl=ttl)
+    except StateBackendError as e:
+        logger.warning("State backend write failed: %s", e)
+
+def _claim_scan(session_id: int, roll_no: str, ttl: float) -> bool:
+    """Record a scan in the session's shared scan set; False if some worker already has"""
+    try:
+        return get_state().add_to_set(scoped(f"scanned:{session_id}"), roll_no, ttl=ttl)
+    except StateBackendError as e:
+        # The unique (session_id, student_id) index still catches duplicates
+        logger.warning("State backend unavailable for duplicate check: %s", e)
+        return True
+
+def _release_scan(session_id: int, roll_no: str):
+    try:
+        get_state().remove_from_set(scoped(f"scanned:{session_id}"), roll_no)
+    except StateBackendError:
+        pass
+
+@register_eviction
+def forget_cached_session(session_id: int, session_token: str):
+    """Closed sessions must stop accepting scans on every worker"""
+    try:
+        get_state().delete(scoped(f"session:{session_token}"), scoped(f"scanned:{session_id}"))
+    except StateBackendError as e:
+        logger.warning("Could not drop cached session %s: %s", session_id, e)
 
 class AttendanceService:
     @staticmethod
@@ -65,68 +146,220 @@ class AttendanceService:
             }
         }
     
+    @staticmethod
+    def get_session_snapshot(db: Session, session_token: str) -> Optional[Dict[str, Any]]:
+        """Id, class and expiry of an active session, cached in the state backend"""
+        key = scoped(f"session:{session_token}")
+        snapshot = _cache_get(key)
+        if snapshot is None:
+            session = db.connection().execute(_session_by_token, {"session_token": session_token}).first()
+            if not session:
+                return None
+            snapshot = {
+                "id": session.id,
+                "class_name": session.class_name,
+                "expires_at": session.expires_at.isoformat()
+            }
+            # Never cache past expiry, so the cached copy cannot outlive the session
+            ttl = min(SESSION_CACHE_SECONDS, (session.expires_at - datetime.utcnow()).total_seconds())
+            if ttl > 0:
+                _cache_set(key, snapshot, ttl)
+        return snapshot
+    
     @staticmethod
     def get_student_by_roll_no(db: Session, roll_no: str) -> Optional[Student]:
         """Get student by roll number"""
         return db.query(Student).filter(Student.roll_no == roll_no).first()
     
     @staticmethod
-    def mark_attendance(
+    def get_student_snapshot(db: Session, roll_no: str) -> Optional[Dict[str, Any]]:
+        """Id, name, normalized names and class of a student, cached in the state backend"""
+        key = scoped(f"student:{roll_no}")
+        snapshot = _cache_get(key)
+        # Snapshots cached before they carried the normalized names are reloaded
+        if snapshot is None or "name_normalized" not in snapshot:
+            row = db.connection().execute(_student_by_roll_no, {"roll_no": roll_no}).first()
+            if not row:
+                return None
+            snapshot = {
+                "id": row.id,
+                "roll_no": row.roll_no,
+                "name": row.name,
+                "class_name": row.class_name,
+                "name_normalized": row.name_normalized or normalize_name(row.name),
+                "father_name_normalized": row.father_name_normalized or normalize_name(row.father_name)
+            }
+            _cache_set(key, snapshot, STUDENT_CACHE_SECONDS)
+        return snapshot
+    
+    @staticmethod
+    def _admit_scan(
         db: Session,
         session_token: str,
         student_roll_no: str,
-        ip_address: str = None,
-        user_agent: str = None,
-        location: str = None
+        location: str = None,
+        latitude: float = None,
+        longitude: float = None
     ) -> Dict[str, Any]:
-        """Mark attendance for a student"""
+        """Checks shared by both scan paths: a failure result, or the session, student and location to record"""
         # Validate session
-        session_validation = AttendanceService.validate_session(db, session_token)
-        if not session_validation["valid"]:
-            return session_validation
+        session = AttendanceService.get_session_snapshot(db, session_token)
+        if not session:
+            return {"valid": False, "error": "Invalid session token"}
         
-        session = session_validation["session"]
+        expires_at = datetime.fromisoformat(session["expires_at"])
+        if datetime.utcnow() > expires_at:
+            return {"valid": False, "error": "Session has expired"}
         
         # Get student
-        student = AttendanceService.get_student_by_roll_no(db, student_roll_no)
+        student = AttendanceService.get_student_snapshot(db, student_roll_no)
         if not student:
             return {"success": False, "error": "Student not found"}
         
         # Check if student is in the correct class
-        if student.class_name != session.class_name:
+        if student["class_name"] != session["class_name"]:
             return {"success": False, "error": "Student not enrolled in this class"}
         
-        # Check if attendance already marked
-        existing_attendance = db.query(Attendance).filter(
-            and_(
-                Attendance.session_id == session.id,
-                Attendance.student_id == student.id
-            )
-        ).first()
+        # Check reported coordinates against the campus/room geofence
+        geofence = GeofenceService.check(session["class_name"], latitude, longitude)
+        if not geofence["allowed"]:
+            return {"success": False, "error": geofence["error"]}
+        if latitude is not None and longitude is not None:
+            location = format_location(latitude, longitude)
         
-        if existing_attendance:
+        # Reject repeat taps on any worker before touching the database
+        scan_ttl = (expires_at - datetime.utcnow()).total_seconds() + 60
+        if not _claim_scan(session["id"], student["roll_no"], scan_ttl):
             return {"success": False, "error": "Attendance already marked for this session"}
         
-        # Mark attendance
-        attendance = Attendance(
-            session_id=session.id,
-            student_id=student.id,
-            ip_address=ip_address,
-            user_agent=user_agent,
-            location=location
-        )
+        return {"session": session, "student": student, "location": location}
+    
+    @staticmethod
+    def mark_attendance(
+        db: Session,
+        session_token: str,
+        student_roll_no: str,
+        ip_address: str = None,
+        user_agent: str = None,
+        location: str = None,
+        latitude: float = None,
+        longitude: float = None
+    ) -> Dict[str, Any]:
+        """Mark attendance for a student through the ORM (the scan endpoint uses mark_attendance_core)"""
+        scan = AttendanceService._admit_scan(db, session_token, student_roll_no, location, latitude, longitude)
+        if "error" in scan:
+            return scan
+        session, student, location = scan["session"], scan["student"], scan["location"]
         
-        db.add(attendance)
-        db.commit()
-        db.refresh(attendance)
+        # The scan is claimed from here on: any failure must release it, or the student stays locked out
+        try:
+            # Check if attendance already marked
+            existing_attendance = db.query(Attendance.id).filter(
+                and_(
+                    Attendance.session_id == session["id"],
+                    Attendance.student_id == student["id"]
+                )
+            ).first()
+            
+            if existing_attendance:
+                return {"success": False, "error": "Attendance already marked for this session"}
+            
+            # Mark attendance
+            bind = db.get_bind()
+            attendance = Attendance(
+                session_id=session["id"],
+                student_id=student["id"],
+                ip_address_id=client_ips.resolve(bind, ip_address),
+                user_agent_id=user_agents.resolve(bind, user_agent),
+                location=location
+            )
+            db.add(attendance)
+            db.commit()
+            db.refresh(attendance)
+        except IntegrityError:
+            # A concurrent scan of the same student won the unique index; its row stands
+            db.rollback()
+            return {"success": False, "error": "Attendance already marked for this session"}
+        except Exception:
+            db.rollback()
+            _release_scan(session["id"], student["roll_no"])
+            raise
+        
+        # Track distinct students per device fingerprint for proxy detection
+        proxy_detector.observe(session["id"], student["roll_no"], ip_address, user_agent)
         
         return {
             "success": True,
             "message": "Attendance marked successfully",
-            "student_name": student.name,
+            "student_name": student["name"],
             "timestamp": attendance.timestamp.isoformat()
         }
     
+    @staticmethod
+    def mark_attendance_core(
+        db: Session,
+        session_token: str,
+        student_roll_no: str,
+        ip_address: str = None,
+        user_agent: str = None,
+        location: str = None,
+        latitude: float = None,
+        longitude: float = None
+    ) -> Dict[str, Any]:
+        """Mark attendance like mark_attendance, with cached Core statements and no ORM objects"""
+        scan = AttendanceService._admit_scan(db, session_token, student_roll_no, location, latitude, longitude)
+        if "error" in scan:
+            return scan
+        session, student = scan["session"], scan["student"]
+        
+        # The scan is claimed from here on: any failure must release it, or the student stays locked out
+        try:
+            conn = db.connection()
+            params = {
+                "session_id": session["id"],
+                "student_id": student["id"],
+                "ip_address_id": client_ips.resolve(conn.engine, ip_address),
+                "user_agent_id": user_agents.resolve(conn.engine, user_agent),
+                "location": scan["location"]
+            }
+            if conn.dialect.insert_returning:
+                timestamp = conn.execute(_insert_scan_returning, params).scalar()
+            else:
+                result = conn.execute(_insert_scan, params)
+                timestamp = None
+                if result.rowcount:
+                    timestamp = conn.execute(_scan_timestamp, {"id": result.lastrowid}).scalar()
+            if timestamp is None:
+                db.rollback()
+                return {"success": False, "error": "Attendance already marked for this session"}
+            db.commit()
+        except IntegrityError:
+            # A concurrent scan of the same student won the unique index; its row stands
+            db.rollback()
+            return {"success": False, "error": "Attendance already marked for this session"}
+        except Exception:
+            db.rollback()
+            _release_scan(session["id"], student["roll_no"])
+            raise
+        
+        # Track distinct students per device fingerprint for proxy detection
+        proxy_detector.observe(session["id"], student["roll_no"], ip_address, user_agent)
+        
+        return {
+            "success": True,
+            "message": "Attendance marked successfully",
+            "student_name": student["name"],
+            "timestamp": timestamp.isoformat()
+        }
+    
+    @staticmethod
+    def count_active_sessions(db: Session) -> int:
+        """Count sessions that are active and not yet expired"""
+        return db.query(DBSession).filter(
+            DBSession.is_active == True,
+            DBSession.expires_at > datetime.utcnow()
+        ).count()
+    
     @staticmethod
     def get_session_attendance(db: Session, session_id: int) -> list:
         """Get all attendance records for a session"""
@@ -135,6 +368,6 @@ class AttendanceService:
     @staticmethod
     def get_student_attendance(db: Session, student_id: int, limit: int = 50) -> list:
         """Get attendance history for a student"""
-        return db.query(Attendance).filter(
+        return db.query(Attendance).options(joinedload(Attendance.client_ip)).filter(
             Attendance.student_id == student_id
         ).order_by(Attendance.timestamp.desc()).limit(limit).all() 
\ No newline at end of file
@@ -0,0 +1,167 @@
+"""
+Teacher authentication: password login and signed access tokens
+
+bcrypt is deliberately slow (hundreds of milliseconds of CPU), so password
+checks run in a small bounded thread pool instead of on the event loop.
+Successful logins get an HS256 JWT signed with SECRET_KEY. Authenticated
+requests only check the token signature, and tokens already verified are
+kept in a small LRU cache, so a request costs neither a DB query nor bcrypt.
+"""
+import asyncio
+import base64
+import hashlib
+import hmac
+import json
+import logging
+import os
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Optional
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from college_attendance.models.db_models import Teacher
+from college_attendance.services.tenancy import DEFAULT_TENANT, current_tenant
+
+logger = logging.getLogger("college_attendance.auth")
+
+SECRET_KEY = os.getenv("SECRET_KEY", "")
+TOKEN_TTL = int(os.getenv("ACCESS_TOKEN_MINUTES", "480")) * 60
+HASH_WORKERS = int(os.getenv("AUTH_HASH_WORKERS", "2"))
+TOKEN_CACHE_SIZE = int(os.getenv("AUTH_TOKEN_CACHE", "1024"))
+
+_HEADER = base64.urlsafe_b64encode(b'{"alg":"HS256","typ":"JWT"}').rstrip(b"=")
+
+_pwd_context = None
+_random_key = None
+_hash_pool = ThreadPoolExecutor(max_workers=HASH_WORKERS, thread_name_prefix="bcrypt")
+
+def _passwords():
+    # passlib/bcrypt are imported on first use to keep cold starts fast
+    global _pwd_context
+    if _pwd_context is None:
+        from passlib.context import CryptContext
+        _pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+    return _pwd_context
+
+def hash_password(password: str) -> str:
+    return _passwords().hash(password)
+
+def verify_password(password: str, password_hash: Optional[str]) -> bool:
+    """Check a password; unknown users still pay for one hash so timing does not leak them"""
+    if not password_hash:
+        _passwords().dummy_verify()
+        return False
+    return _passwords().verify(password, password_hash)
+
+def _signing_key() -> str:
+    global _random_key
+    if SECRET_KEY:
+        return SECRET_KEY
+    if _random_key is None:
+        # Tokens from a random key do not survive a restart and are not shared between workers
+        logger.warning("SECRET_KEY is not set; using a random key for access tokens")
+        _random_key = secrets.token_urlsafe(32)
+    return _random_key
+
+def _b64encode(data: bytes) -> bytes:
+    return base64.urlsafe_b64encode(data).rstrip(b"=")
+
+def _b64decode(data: bytes) -> bytes:
+    return base64.urlsafe_b64decode(data + b"=" * (-len(data) % 4))
+
+def _signature(signing_input: bytes, secret: str) -> bytes:
+    return _b64encode(hmac.new(secret.encode(), signing_input, hashlib.sha256).digest())
+
+def create_access_token(teacher: Teacher, ttl: int = TOKEN_TTL, secret: Optional[str] = None) -> Dict[str, Any]:
+    """Signed access token for a teacher and its expiry timestamp"""
+    now = int(time.time())
+    claims = {"sub": str(teacher.id), "name": teacher.name, "email": teacher.email, "iat": now, "exp": now + ttl}
+    # Teacher ids repeat across colleges, so a token is only valid for the college that issued it
+    if current_tenant() != DEFAULT_TENANT:
+        claims["tenant"] = current_tenant()
+    signing_input = _HEADER + b"." + _b64encode(json.dumps(claims, separators=(",", ":")).encode())
+    token = signing_input + b"." + _signature(signing_input, secret or _signing_key())
+    return {"access_token": token.decode(), "expires_at": claims["exp"]}
+
+class TokenCache:
+    """Recently verified tokens and their claims, least recently used evicted first"""
+    def __init__(self, limit: int = TOKEN_CACHE_SIZE):
+        self.limit = limit
+        self._tokens: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, token: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            claims = self._tokens.get(token)
+            if claims is not None:
+                self._tokens.move_to_end(token)
+            return claims
+
+    def put(self, token: str, claims: Dict[str, Any]):
+        with self._lock:
+            self._tokens[token] = claims
+            while len(self._tokens) > self.limit:
+                self._tokens.popitem(last=False)
+
+    def discard(self, token: str):
+        with self._lock:
+            self._tokens.pop(token, None)
+
+token_cache = TokenCache()
+
+def _decode(token: str, secret: str) -> Optional[Dict[str, Any]]:
+    try:
+        signing_input, signature = token.encode("ascii").rsplit(b".", 1)
+        header, payload = signing_input.split(b".")
+    except (UnicodeEncodeError, ValueError):
+        return None
+    if header != _HEADER or not hmac.compare_digest(signature, _signature(signing_input, secret)):
+        return None
+    try:
+        claims = json.loads(_b64decode(payload))
+        return {"teacher_id": int(claims["sub"]), "name": claims.get("name"),
+                "email": claims.get("email"), "exp": int(claims["exp"]),
+                "tenant": claims.get("tenant", DEFAULT_TENANT)}
+    except (ValueError, KeyError, TypeError):
+        return None
+
+def verify_access_token(token: str, secret: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    """Claims of a valid, unexpired token of the current tenant (teacher_id, name, email, exp), else None"""
+    if not token:
+        return None
+    claims = token_cache.get(token)
+    if claims is None:
+        claims = _decode(token, secret or _signing_key())
+        if claims is None:
+            return None
+        token_cache.put(token, claims)
+    if claims["exp"] <= time.time():
+        token_cache.discard(token)
+        return None
+    if claims["tenant"] != current_tenant():
+        return None
+    return claims
+
+class AuthService:
+    @staticmethod
+    async def login(db: Session, email: str, password: str) -> Dict[str, Any]:
+        """Check teacher credentials off the event loop and issue an access token"""
+        # Stored addresses keep the case they were registered with
+        teacher = db.query(Teacher).filter(func.lower(Teacher.email) == email.strip().lower()).first()
+        password_hash = teacher.password_hash if teacher else None
+
+        loop = asyncio.get_running_loop()
+        valid = await loop.run_in_executor(_hash_pool, verify_password, password, password_hash)
+        if not valid:
+            return {"success": False, "error": "Invalid email or password"}
+
+        return {
+            "success": True,
+            "teacher": {"id": teacher.id, "name": teacher.name, "email": teacher.email},
+            **create_access_token(teacher),
+        }
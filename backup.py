@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+"""
+Database snapshots for College Attendance System
+
+Takes a consistent, compressed snapshot of the SQLite database while the app
+keeps running (see college_attendance/services/backups.py), lists snapshots,
+or restores one. Restoring first saves the current database as a snapshot of
+its own; stop the app before restoring.
+    python backup.py                      # snapshot into BACKUP_DIR, keep BACKUP_KEEP
+    python backup.py --tenant beant
+    python backup.py --list
+    python backup.py --restore backups/default-20261019T020000000Z.db.gz --yes
+
+--check snapshots and restores a scratch database under concurrent write
+load and verifies that every snapshot holds whole transactions only; it
+exits non-zero on failure (test_checks.py runs it under pytest):
+    python backup.py --check
+"""
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import argparse
+import gzip
+import itertools
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Online database snapshots")
+    parser.add_argument("--tenant", help="College from TENANT_DATABASE_URLS (default: DATABASE_URL)")
+    parser.add_argument("--dir", help="Snapshot directory (default: BACKUP_DIR)")
+    parser.add_argument("--keep", type=int, help="Snapshots to keep (default: BACKUP_KEEP)")
+    parser.add_argument("--list", action="store_true", help="List snapshots, newest first")
+    parser.add_argument("--restore", metavar="SNAPSHOT", help="Replace the database with this snapshot")
+    parser.add_argument("--yes", action="store_true", help="Confirm --restore")
+    parser.add_argument("--check", action="store_true", help="Run the consistency checks under write load and exit")
+    return parser.parse_args(argv)
+
+def run_checks() -> int:
+    from checks import Checks, use_database
+
+    directory = tempfile.mkdtemp()
+    use_database(os.path.join(directory, "attendance.db"))
+
+    from datetime import datetime, timedelta
+    from sqlalchemy import insert, text
+    from college_attendance.database import SessionLocal, engine
+    from college_attendance.models.db_models import Attendance, Session as DBSession, Student, Teacher
+    from college_attendance.services import backups
+    from college_attendance.services.attendance import AttendanceService
+    import migrate
+
+    migrate.migrate()
+    checks = Checks("snapshot")
+
+    db = SessionLocal()
+    teacher = Teacher(name="Dr. Check", email="check@college.edu", password_hash="-")
+    db.add(teacher)
+    db.add_all([Student(name=f"Student {i}", roll_no=f"CHK{i:04d}", class_name="Check") for i in range(500)])
+    db.commit()
+    sessions = [
+        DBSession(teacher_id=teacher.id, subject=subject, class_name="Check", final_count=0,
+                  expires_at=datetime.utcnow() + timedelta(hours=1))
+        for subject in ["Ledger", "Scans"] + ["History"] * 300
+    ]
+    db.add_all(sessions)
+    db.commit()
+    ledger, scan_token = sessions[0].id, sessions[1].session_token
+    history = [session.id for session in sessions[2:]]
+    # Enough history for the copy to take many steps: every student in every history session
+    with engine.begin() as conn:
+        conn.execute(insert(Attendance), [
+            {"session_id": history[i // 500], "student_id": 1 + i % 500, "location": "x" * 40} for i in range(150000)
+        ])
+    db.close()
+
+    # Writers: ledger transactions add three students with a row each and bump
+    # the session's count together, so a torn copy would show rows without
+    # their count; scans go through the real scan path and record their latency
+    stop = threading.Event()
+    scan_latencies = []
+    ledger_rolls = itertools.count()
+
+    def ledger_writer():
+        while not stop.is_set():
+            with engine.begin() as conn:
+                students = [
+                    conn.execute(insert(Student).values(
+                        name="Ledger", roll_no=f"LED{next(ledger_rolls):06d}", class_name="Ledger"
+                    )).inserted_primary_key[0]
+                    for _ in range(3)
+                ]
+                conn.execute(insert(Attendance), [{"session_id": ledger, "student_id": student} for student in students])
+                conn.execute(text("UPDATE sessions SET final_count = final_count + 3 WHERE id = :id"), {"id": ledger})
+            time.sleep(0.001)
+
+    def scanner():
+        scan_db = SessionLocal()
+        try:
+            for i in range(500):
+                if stop.is_set():
+                    return
+                started = time.perf_counter()
+                result = AttendanceService.mark_attendance_core(scan_db, scan_token, f"CHK{i:04d}")
+                scan_latencies.append(time.perf_counter() - started)
+                if not result.get("success"):
+                    checks.fail(f"scan failed: {result}")
+                time.sleep(0.002)
+        finally:
+            scan_db.close()
+
+    def ledger_count():
+        with engine.connect() as conn:
+            return conn.execute(text("SELECT final_count FROM sessions WHERE id = :id"), {"id": ledger}).scalar()
+
+    def snapshot_rows(path):
+        copy = path[:-3] + ".check"
+        with gzip.open(path, "rb") as f, open(copy, "wb") as out:
+            shutil.copyfileobj(f, out)
+        conn = sqlite3.connect(copy)
+        try:
+            return (
+                conn.execute("PRAGMA integrity_check").fetchone()[0],
+                conn.execute("SELECT count(*) FROM attendances WHERE session_id = ?", (ledger,)).fetchone()[0],
+                conn.execute("SELECT final_count FROM sessions WHERE id = ?", (ledger,)).fetchone()[0],
+            )
+        finally:
+            conn.close()
+            os.remove(copy)
+
+    threads = [threading.Thread(target=ledger_writer), threading.Thread(target=scanner)]
+    snapshots = os.path.join(directory, "snapshots")
+    try:
+        for thread in threads:
+            thread.start()
+        time.sleep(0.2)
+        before = ledger_count()
+        scans_before = len(scan_latencies)
+        result = backups.snapshot(directory=snapshots, keep=2, pages=64, pause=0.005)
+        after = ledger_count()
+        during = scan_latencies[scans_before:]
+        stop.set()
+        for thread in threads:
+            thread.join()
+
+        integrity, rows, count = snapshot_rows(result["path"])
+        checks.require("integrity", integrity == "ok", integrity)
+        checks.require("whole transactions only", rows == count, f"{rows} rows, count {count}")
+        checks.require("snapshot taken while writing", before <= count <= after, f"{before} <= {count} <= {after}")
+        checks.require("writes continued during the snapshot", after > before, f"{after - before} ledger rows")
+        checks.require("scans continued during the snapshot", len(during) > 0)
+        checks.require("copy never restarted", result["steps"] <= result["pages"] // 64 + 1,
+                       f"{result['steps']} steps for {result['pages']} pages")
+        checks.require("compressed", result["size"] < result["database_size"])
+        print(f"  {result['pages']} pages in {result['steps']} steps, {result['seconds']:.2f}s; "
+              f"{after - before} ledger rows and {len(during)} scans committed meanwhile"
+              + (f", slowest scan {max(during) * 1000:.1f} ms" if during else ""))
+
+        # Restore over the live database: back to the snapshot's contents
+        checks.require("database moved on", ledger_count() > count)
+        backups.restore(result["path"])
+        checks.require("restored contents", ledger_count() == count, f"{ledger_count()} != {count}")
+        with engine.connect() as conn:
+            restored_rows = conn.execute(
+                text("SELECT count(*) FROM attendances WHERE session_id = :id"), {"id": ledger}
+            ).scalar()
+        checks.require("restored rows", restored_rows == count, f"{restored_rows} != {count}")
+
+        # Rotation keeps the newest two
+        for _ in range(2):
+            backups.snapshot(directory=snapshots, keep=2)
+        names = [snapshot["name"] for snapshot in backups.list_snapshots(directory=snapshots)]
+        checks.require("rotation", len(names) == 2 and result["name"] not in names, names)
+    except Exception as e:
+        checks.fail(f"error: {e!r}")
+    finally:
+        stop.set()
+        for thread in threads:
+            if thread.is_alive():
+                thread.join()
+    return checks.report()
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.check:
+        sys.exit(1 if run_checks() else 0)
+
+    from college_attendance.database import tenant_engines
+    from college_attendance.services import backups, tenancy
+
+    tenant = (args.tenant or tenancy.DEFAULT_TENANT).lower()
+    if not tenancy.is_known(tenant):
+        raise SystemExit(f"ERROR: unknown tenant {tenant!r} (not in TENANT_DATABASE_URLS)")
+
+    try:
+        if args.list:
+            for snapshot in backups.list_snapshots(tenant, args.dir):
+                print(f"{snapshot['name']}  {snapshot['size'] / 1024 / 1024:8.1f} MB  {snapshot['created_at']}")
+        elif args.restore:
+            if not args.yes:
+                raise SystemExit("ERROR: restoring replaces the database; stop the app and pass --yes")
+            if not os.path.isfile(args.restore):
+                raise SystemExit(f"ERROR: snapshot {args.restore} not found")
+            # Kept outside rotation, so it can't push out the snapshot being restored
+            current = backups.snapshot(tenant, args.dir, keep=sys.maxsize)
+            print(f"Saved the current database as {current['path']}")
+            restored = backups.restore(args.restore, tenant)
+            print(f"Restored {restored['database']} from {restored['restored']}")
+        else:
+            result = backups.snapshot(tenant, args.dir, args.keep)
+            print(f"Snapshot {result['path']}: {result['size'] / 1024 / 1024:.1f} MB "
+                  f"({result['database_size'] / 1024 / 1024:.1f} MB database, {result['steps']} steps, "
+                  f"{result['seconds']:.1f}s)")
+    except backups.BackupError as e:
+        raise SystemExit(f"ERROR: {e}")
+    finally:
+        tenant_engines.dispose_all()
+
+if __name__ == "__main__":
+    main()
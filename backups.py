@@ -0,0 +1,189 @@
+"""
+Online SQLite snapshots
+
+snapshot() copies a live database with SQLite's online backup API while the
+app keeps serving: BACKUP_PAGES_PER_STEP pages at a time, pausing
+BACKUP_STEP_PAUSE seconds between steps so scans get the database and the
+GIL in between. The copy runs inside one read transaction on the WAL
+database, so it is the database exactly as it was when the snapshot began.
+Writes committed meanwhile neither tear the copy nor restart it, and are not
+blocked by it.
+
+The copy is checked (PRAGMA quick_check) and gzip-compressed to
+BACKUP_DIR/<tenant>-<UTC time>.db.gz, renamed into place only when complete.
+All but the newest BACKUP_KEEP snapshots of that database are then deleted.
+restore() writes a snapshot back into the database, also through the backup
+API, so it is safe on a WAL database another process has open; stop the
+app first all the same, as its caches would still hold the old data.
+
+Only SQLite databases are supported; use pg_dump for PostgreSQL.
+"""
+import gzip
+import logging
+import os
+import shutil
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, List
+
+from sqlalchemy.engine import make_url
+
+from college_attendance.database import SQLITE_BUSY_TIMEOUT_MS, tenant_engines
+from college_attendance.services.metrics import db_backups
+from college_attendance.services.tenancy import current_tenant
+
+logger = logging.getLogger("college_attendance.backups")
+
+BACKUP_DIR = os.getenv("BACKUP_DIR", "backups")
+BACKUP_KEEP = int(os.getenv("BACKUP_KEEP", "7"))
+PAGES_PER_STEP = int(os.getenv("BACKUP_PAGES_PER_STEP", "256"))
+STEP_PAUSE = float(os.getenv("BACKUP_STEP_PAUSE", "0.005"))
+GZIP_LEVEL = int(os.getenv("BACKUP_GZIP_LEVEL", "6"))
+SUFFIX = ".db.gz"
+
+# One snapshot or restore at a time per process
+_running = threading.Lock()
+
+class BackupError(Exception):
+    pass
+
+class BackupInProgress(BackupError):
+    pass
+
+def database_path(tenant: str = None) -> str:
+    """File of a tenant's SQLite database"""
+    url = make_url(str(tenant_engines.get(tenant or current_tenant(), touch=False).url))
+    if url.get_backend_name() != "sqlite" or not url.database or url.database == ":memory:":
+        raise BackupError("Snapshots are only supported for SQLite database files")
+    return os.path.abspath(url.database)
+
+def _connect(path: str) -> sqlite3.Connection:
+    return sqlite3.connect(path, timeout=SQLITE_BUSY_TIMEOUT_MS / 1000, isolation_level=None)
+
+def _remove_database(path: str):
+    for leftover in (path, path + "-wal", path + "-shm", path + "-journal"):
+        if os.path.exists(leftover):
+            os.remove(leftover)
+
+def list_snapshots(tenant: str = None, directory: str = None) -> List[Dict[str, Any]]:
+    """A tenant's snapshots, newest first"""
+    tenant = tenant or current_tenant()
+    directory = directory or BACKUP_DIR
+    if not os.path.isdir(directory):
+        return []
+    snapshots = []
+    for name in sorted(os.listdir(directory), reverse=True):
+        stamp = name[len(tenant) + 1:-len(SUFFIX)]
+        if not name.startswith(tenant + "-") or not name.endswith(SUFFIX) or "-" in stamp:
+            continue
+        path = os.path.join(directory, name)
+        snapshots.append({
+            "name": name,
+            "path": path,
+            "size": os.path.getsize(path),
+            "created_at": datetime.strptime(stamp, "%Y%m%dT%H%M%S%fZ").isoformat()
+        })
+    return snapshots
+
+def snapshot(tenant: str = None, directory: str = None, keep: int = None,
+             pages: int = PAGES_PER_STEP, pause: float = STEP_PAUSE) -> Dict[str, Any]:
+    """Copy a tenant's database online into a compressed snapshot and rotate old ones"""
+    tenant = tenant or current_tenant()
+    directory = directory or BACKUP_DIR
+    keep = BACKUP_KEEP if keep is None else keep
+    source_path = database_path(tenant)
+    if not _running.acquire(blocking=False):
+        raise BackupInProgress("A snapshot or restore is already running")
+    try:
+        os.makedirs(directory, exist_ok=True)
+        now = datetime.utcnow()
+        name = f"{tenant}-{now:%Y%m%dT%H%M%S}{now.microsecond // 1000:03d}Z{SUFFIX}"
+        copy_path = os.path.join(directory, f".{name}.db")
+        started = time.perf_counter()
+        steps = []
+
+        def progress(status, remaining, total):
+            steps.append(total)
+            time.sleep(pause)
+
+        try:
+            source = _connect(source_path)
+            try:
+                # The read transaction pins one WAL snapshot for every step of the copy
+                source.execute("PRAGMA journal_mode=WAL")
+                source.execute("BEGIN")
+                source.execute("SELECT count(*) FROM sqlite_master")
+                target = sqlite3.connect(copy_path)
+                try:
+                    source.backup(target, pages=pages, progress=progress)
+                    check = target.execute("PRAGMA quick_check").fetchone()[0]
+                finally:
+                    target.close()
+                source.execute("COMMIT")
+            finally:
+                source.close()
+            if check != "ok":
+                raise BackupError(f"Snapshot failed its integrity check: {check}")
+
+            path = os.path.join(directory, name)
+            with open(copy_path, "rb") as f, gzip.open(path + ".tmp", "wb", compresslevel=GZIP_LEVEL) as out:
+                shutil.copyfileobj(f, out, 1024 * 1024)
+            os.replace(path + ".tmp", path)
+        finally:
+            _remove_database(copy_path)
+    except Exception:
+        db_backups.inc("failed")
+        raise
+    finally:
+        _running.release()
+
+    for old in list_snapshots(tenant, directory)[keep:]:
+        os.remove(old["path"])
+    db_backups.inc("created")
+    result = {
+        "name": name,
+        "path": path,
+        "size": os.path.getsize(path),
+        "database_size": os.path.getsize(source_path),
+        "pages": steps[-1] if steps else 0,
+        "steps": len(steps),
+        "seconds": round(time.perf_counter() - started, 3),
+    }
+    logger.info("Snapshot %s: %d pages in %d steps, %.1fs", name, result["pages"], result["steps"], result["seconds"])
+    return result
+
+def restore(snapshot_path: str, tenant: str = None) -> Dict[str, Any]:
+    """Replace a tenant's database with the contents of a snapshot"""
+    target_path = database_path(tenant)
+    if not _running.acquire(blocking=False):
+        raise BackupInProgress("A snapshot or restore is already running")
+    # Decompressed next to the database, so a bad snapshot fails before anything is overwritten
+    copy_path = target_path + ".restore"
+    try:
+        with gzip.open(snapshot_path, "rb") as f, open(copy_path, "wb") as out:
+            shutil.copyfileobj(f, out, 1024 * 1024)
+        source = _connect(copy_path)
+        try:
+            check = source.execute("PRAGMA quick_check").fetchone()[0]
+            if check != "ok":
+                raise BackupError(f"Snapshot failed its integrity check: {check}")
+            target = _connect(target_path)
+            try:
+                source.backup(target)
+            finally:
+                target.close()
+        finally:
+            source.close()
+    except BackupError:
+        db_backups.inc("failed")
+        raise
+    except (OSError, EOFError, sqlite3.DatabaseError) as e:
+        db_backups.inc("failed")
+        raise BackupError(f"Could not restore {snapshot_path}: {e}") from e
+    finally:
+        _remove_database(copy_path)
+        _running.release()
+    db_backups.inc("restored")
+    return {"restored": os.path.basename(snapshot_path), "database": target_path}
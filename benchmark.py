@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+"""
+Endpoint micro-benchmarks for College Attendance System
+
+Runs the hot endpoints in-process against a freshly seeded SQLite database
+and records latency and SQL query counts per endpoint. Results can be saved
+as a baseline and later compared against it; the comparison exits non-zero
+when an endpoint regresses beyond the threshold.
+
+Usage:
+    python benchmark.py --save                # record benchmark_baseline.json
+    python benchmark.py --compare             # fail on regressions
+    python benchmark.py --compare --threshold 0.3
+"""
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import argparse
+import json
+import statistics
+import time
+
+from checks import use_database
+
+DEFAULT_DATABASE = "bench_attendance.db"
+DEFAULT_BASELINE = "benchmark_baseline.json"
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Endpoint micro-benchmarks")
+    parser.add_argument("--iterations", type=int, default=50, help="Timed requests per endpoint")
+    parser.add_argument("--warmup", type=int, default=5, help="Untimed requests per endpoint")
+    parser.add_argument("--database", default=DEFAULT_DATABASE, help="SQLite file seeded for the run")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="Baseline file to save or compare")
+    parser.add_argument("--save", action="store_true", help="Store results as the new baseline")
+    parser.add_argument("--compare", action="store_true", help="Compare against the baseline")
+    parser.add_argument("--threshold", type=float, default=0.25,
+                        help="Allowed relative p50 latency regression (0.25 = 25%%)")
+    parser.add_argument("--only", nargs="*", help="Run only these benchmarks")
+    return parser.parse_args(argv)
+
+class QueryCounter:
+    """Counts SQL statements issued on an engine"""
+    def __init__(self, engine):
+        from sqlalchemy import event
+        self.count = 0
+        event.listen(engine, "before_cursor_execute", self._on_execute)
+
+    def _on_execute(self, conn, cursor, statement, parameters, context, executemany):
+        self.count += 1
+
+class Benchmark:
+    """One endpoint: setup() builds an untimed request, run() is what gets timed"""
+    def __init__(self, name, method, path, setup=None):
+        self.name = name
+        self.method = method
+        self.path = path
+        self.setup = setup or (lambda i: {})
+
+def seed_database(path):
+    """Recreate the benchmark database with a small, reproducible dataset"""
+    if os.path.exists(path):
+        os.remove(path)
+    import generate_dataset
+    generate_dataset.Base.metadata.create_all(bind=generate_dataset.engine)
+    generate_dataset.generate(generate_dataset.parse_args([
+        "--departments", "2", "--years", "1", "--sections", "1", "--class-size", "60",
+        "--teachers-per-department", "2", "--weeks", "8", "--seed", "7",
+    ]))
+
+def build_benchmarks(client, db):
+    """Benchmarks for the hot endpoints, with fixtures picked from the seeded data"""
+    from sqlalchemy import func
+    from college_attendance.models.db_models import Attendance, Session, Student, Teacher
+
+    class_name, = db.query(Student.class_name).order_by(Student.id).first()
+    roster = db.query(Student.roll_no, Student.name, Student.father_name) \
+        .filter(Student.class_name == class_name).order_by(Student.id).all()
+    busiest_session, = db.query(Attendance.session_id).group_by(Attendance.session_id) \
+        .order_by(func.count(Attendance.id).desc(), Attendance.session_id).first()
+    busiest_student = db.query(Student.roll_no).join(Attendance).group_by(Student.id) \
+        .order_by(func.count(Attendance.id).desc(), Student.id).first()[0]
+
+    # Teacher endpoints run as the owner of the busiest session
+    email, = db.query(Teacher.email).join(Session).filter(Session.id == busiest_session).first()
+    login = client.post("/teacher/login", json={"email": email, "password": "teacher123"})
+    client.headers["Authorization"] = f"Bearer {login.json()['access_token']}"
+
+    qr_request = {"subject": "Benchmark", "class_name": class_name, "section": "A", "duration_minutes": 10}
+    qr = client.post("/teacher/generate-qr", json=qr_request).json()
+    state = {"session": None}
+
+    def mark_setup(i):
+        # A fresh session per pass over the roster keeps every scan a first-time mark
+        if i % len(roster) == 0:
+            state["session"] = client.post("/teacher/generate-qr", json=qr_request).json()["session_token"]
+        # With the names the student page sends, so the identity check is measured too
+        roll_no, name, father = roster[i % len(roster)]
+        return {"json": {"session_token": state["session"], "student_roll_no": roll_no,
+                         "student_name": name, "father_name": father}}
+
+    return [
+        Benchmark("generate_qr", "POST", "/teacher/generate-qr", lambda i: {"json": qr_request}),
+        Benchmark("mark_attendance", "POST", "/student/mark-attendance", mark_setup),
+        Benchmark("validate_qr", "POST", "/student/validate-qr",
+                  lambda i: {"json": {"qr_data": json.dumps(qr["session_info"])}}),
+        Benchmark("teacher_sessions", "GET", "/teacher/sessions"),
+        Benchmark("session_attendance", "GET", f"/teacher/sessions/{busiest_session}/attendance"),
+        Benchmark("student_history", "GET", f"/student/attendance-history/{busiest_student}"),
+    ]
+
+def run_benchmark(client, counter, bench, iterations, warmup):
+    """Time one endpoint and return its latency and query statistics"""
+    latencies, queries = [], []
+    for i in range(warmup + iterations):
+        kwargs = bench.setup(i)
+        before = counter.count
+        started = time.perf_counter()
+        response = client.request(bench.method, bench.path, **kwargs)
+        elapsed = time.perf_counter() - started
+        if response.status_code != 200:
+            raise RuntimeError(f"{bench.name}: HTTP {response.status_code} {response.text}")
+        if i >= warmup:
+            latencies.append(elapsed * 1000)
+            queries.append(counter.count - before)
+
+    latencies.sort()
+    return {
+        "p50_ms": round(statistics.median(latencies), 3),
+        "p95_ms": round(latencies[max(0, int(round(0.95 * len(latencies))) - 1)], 3),
+        "mean_ms": round(statistics.fmean(latencies), 3),
+        "queries": max(queries),
+    }
+
+def compare(results, baseline, threshold):
+    """Print a comparison table and return the names of regressed endpoints"""
+    regressions = []
+    print(f"{'endpoint':<20} {'p50 base':>10} {'p50 now':>10} {'change':>8} {'queries':>10}")
+    for name, current in results.items():
+        base = baseline.get(name)
+        if not base:
+            print(f"{name:<20} {'-':>10} {current['p50_ms']:>10.2f} {'new':>8} {current['queries']:>10}")
+            continue
+        change = current["p50_ms"] / base["p50_ms"] - 1 if base["p50_ms"] else 0.0
+        queries = f"{base['queries']}->{current['queries']}"
+        regressed = change > threshold or current["queries"] > base["queries"]
+        marker = "  REGRESSION" if regressed else ""
+        print(f"{name:<20} {base['p50_ms']:>10.2f} {current['p50_ms']:>10.2f} {change:>+8.0%} {queries:>10}{marker}")
+        if regressed:
+            regressions.append(name)
+    return regressions
+
+def main(argv=None):
+    args = parse_args(argv)
+    use_database(args.database)
+
+    seed_database(args.database)
+
+    from fastapi.testclient import TestClient
+    from college_attendance.database import SessionLocal, engine
+    from college_attendance.main import app
+
+    client = TestClient(app)
+    counter = QueryCounter(engine)
+    db = SessionLocal()
+    try:
+        benchmarks = build_benchmarks(client, db)
+    finally:
+        db.close()
+
+    results = {}
+    for bench in benchmarks:
+        if args.only and bench.name not in args.only:
+            continue
+        results[bench.name] = run_benchmark(client, counter, bench, args.iterations, args.warmup)
+        r = results[bench.name]
+        print(f"{bench.name:<20} p50 {r['p50_ms']:>8.2f} ms  p95 {r['p95_ms']:>8.2f} ms  queries {r['queries']}")
+
+    if args.save:
+        with open(args.baseline, "w") as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+        print(f"\nBaseline saved to {args.baseline}")
+
+    if args.compare:
+        if not os.path.exists(args.baseline):
+            print(f"ERROR: baseline {args.baseline} not found. Run with --save first.")
+            sys.exit(2)
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        print()
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"\nFAILED: {', '.join(regressions)} regressed beyond {args.threshold:.0%}")
+            sys.exit(1)
+        print("\nSUCCESS: no regressions")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,38 @@
+"""
+Shared helpers for the --check self-checks
+
+redis_standin.py, smtp_standin.py and backup.py collect failures in a Checks
+per group and print one OK/FAILED line for it; test_checks.py runs every
+--check under pytest. use_database() points the package at a scratch SQLite
+file before it is imported.
+"""
+import os
+from typing import List
+
+def use_database(path: str):
+    """Point the package at a SQLite file; call before importing it, as it reads DATABASE_URL at import time"""
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.abspath(path)}"
+
+class Checks:
+    """Failures collected by one group of checks, reported as a single OK/FAILED line"""
+    def __init__(self, name: str):
+        self.name = name
+        self.failures: List[str] = []
+
+    def expect(self, name: str, actual, expected):
+        if actual != expected:
+            self.failures.append(f"{name}: expected {expected!r}, got {actual!r}")
+
+    def require(self, name: str, ok: bool, detail=""):
+        if not ok:
+            self.failures.append(f"{name}{': ' + str(detail) if detail else ''}")
+
+    def fail(self, message: str):
+        self.failures.append(message)
+
+    def report(self) -> int:
+        """Print the result line and any failures; returns the number of failures"""
+        print(f"{self.name:8} {'OK' if not self.failures else 'FAILED'}")
+        for failure in self.failures:
+            print(f"  - {failure}")
+        return len(self.failures)
@@ -0,0 +1,12 @@
+"""
+College Attendance System
+
+The modules live flat in the repository root. This package and its models,
+routes and services subpackages resolve college_attendance.* imports to
+those files, so app.py, serve.py and the scripts run from a plain checkout
+without installing anything.
+"""
+import os
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+__path__.append(ROOT)
@@ -0,0 +1,4 @@
+# college_attendance.models.* are the flat files in the repository root
+from college_attendance import ROOT
+
+__path__.append(ROOT)
@@ -1,25 +1,225 @@
-from sqlalchemy import create_engine
+from fastapi import Request
+from sqlalchemy import create_engine, event
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import NullPool
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import List, Optional
+import hashlib
+import itertools
 import os
-from dotenv import load_dotenv
+import threading
+import time
+from college_attendance.services import tenancy
+from college_attendance.services.metrics import db_read_routes, db_tenant_engines, instrument_engine
+from college_attendance.services.state_backend import StateBackendError, get_state
 
-load_dotenv()
+# Only pay for python-dotenv when there is a .env file to load
+if os.path.exists(".env"):
+    from dotenv import load_dotenv
+    load_dotenv()
 
 # Database URL - using SQLite for development, can be changed to PostgreSQL for production
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./college_attendance.db")
 
-engine = create_engine(
-    DATABASE_URL, connect_args={"check_same_thread": False} if "sqlite" in DATABASE_URL else {}
-)
+# Read replicas for the read-only endpoints, comma-separated (empty: read from the primary)
+DATABASE_READ_URLS = [url.strip() for url in os.getenv("DATABASE_READ_URLS", "").split(",") if url.strip()]
+
+# After writing, a caller reads from the primary for this long so it sees its own writes
+READ_YOUR_WRITES_SECONDS = float(os.getenv("READ_YOUR_WRITES_SECONDS", "5"))
+
+# How long a SQLite writer waits for another process's write lock before failing
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+
+# Other colleges' engines (TENANT_DATABASE_URLS) kept open at once, and how long an unused one stays open
+TENANT_ENGINE_LIMIT = int(os.getenv("TENANT_ENGINE_LIMIT", "16"))
+TENANT_IDLE_SECONDS = float(os.getenv("TENANT_IDLE_SECONDS", "900"))
+
+def configure_sqlite(dbapi_connection, connection_record):
+    # WAL lets readers run alongside a writer in other worker processes;
+    # busy_timeout makes writers queue for the lock instead of failing
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.close()
+
+def build_engine(url: str, name: str = "primary", **options):
+    engine = create_engine(
+        url,
+        connect_args={"check_same_thread": False, "timeout": SQLITE_BUSY_TIMEOUT_MS / 1000} if "sqlite" in url else {},
+        **options
+    )
+    instrument_engine(engine, name)
+    if url.startswith("sqlite") and ":memory:" not in url:
+        event.listen(engine, "connect", configure_sqlite)
+    return engine
+
+engine = build_engine(DATABASE_URL)
+read_engines = [build_engine(url, f"replica{i}") for i, url in enumerate(DATABASE_READ_URLS)]
+_next_replica = itertools.count()
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+ReadSessionLocal = sessionmaker(autocommit=False, autoflush=False)
 
 Base = declarative_base()
 
+class TenantEngines:
+    """Engines of the configured colleges, opened on first use. At most `limit` stay open:
+    the least recently used one is disposed to make room, and any unused for
+    idle_seconds is disposed too. The default tenant always uses `engine`."""
+    def __init__(self, limit: int = TENANT_ENGINE_LIMIT, idle_seconds: float = TENANT_IDLE_SECONDS):
+        self.limit = limit
+        self.idle_seconds = idle_seconds
+        self._engines: "OrderedDict[str, list]" = OrderedDict()  # tenant -> [engine, last used]
+        self._lock = threading.Lock()
+
+    def get(self, tenant: str, touch: bool = True):
+        """Engine of a tenant; touch=False (background jobs) doesn't count as use"""
+        if tenant == tenancy.DEFAULT_TENANT:
+            return engine
+        now = time.monotonic()
+        with self._lock:
+            entry = self._engines.get(tenant)
+            if entry is None:
+                if tenant not in tenancy.TENANT_DATABASE_URLS:
+                    raise tenancy.UnknownTenant(tenant)
+                entry = self._engines[tenant] = [build_engine(tenancy.TENANT_DATABASE_URLS[tenant], f"tenant-{tenant}"), now]
+                db_tenant_engines.inc("opened")
+            elif touch:
+                entry[1] = now
+                self._engines.move_to_end(tenant)
+            expired = self._evict(now, keep=tenant)
+        for stale in expired:
+            stale.dispose()
+        return entry[0]
+
+    def _evict(self, now: float, keep: str) -> list:
+        expired = []
+        for tenant, (tenant_engine, last_used) in list(self._engines.items()):
+            if tenant != keep and now - last_used > self.idle_seconds:
+                expired.append(self._engines.pop(tenant)[0])
+                db_tenant_engines.inc("idle")
+        while len(self._engines) > self.limit:
+            expired.append(self._engines.popitem(last=False)[1][0])
+            db_tenant_engines.inc("evicted")
+        return expired
+
+    def peek(self, tenant: str):
+        """Engine of a tenant if it is open, without opening it or counting as use"""
+        if tenant == tenancy.DEFAULT_TENANT:
+            return engine
+        with self._lock:
+            entry = self._engines.get(tenant)
+        return entry[0] if entry else None
+
+    def open_tenants(self) -> List[str]:
+        with self._lock:
+            expired = self._evict(time.monotonic(), keep=None)
+            tenants = list(self._engines)
+        for stale in expired:
+            stale.dispose()
+        return tenants
+
+    def dispose_all(self):
+        with self._lock:
+            engines = [entry[0] for entry in self._engines.values()]
+            self._engines.clear()
+        for tenant_engine in engines:
+            tenant_engine.dispose()
+
+    def __len__(self):
+        return len(self._engines)
+
+tenant_engines = TenantEngines()
+
+def tenant_session(touch: bool = True):
+    """New database session on the current tenant's primary"""
+    return SessionLocal(bind=tenant_engines.get(tenancy.current_tenant(), touch=touch))
+
+def all_tenants() -> List[str]:
+    """Tenants background jobs visit: the default one and every college in TENANT_DATABASE_URLS"""
+    return [tenancy.DEFAULT_TENANT] + list(tenancy.TENANT_DATABASE_URLS)
+
+@contextmanager
+def job_session():
+    """Session on the current tenant's primary for a background job. A college with no open
+    engine (idle, or evicted) gets a throwaway unpooled one, so background jobs neither keep
+    idle colleges' engines open nor push busy ones out of TENANT_ENGINE_LIMIT"""
+    tenant = tenancy.current_tenant()
+    bind = tenant_engines.peek(tenant)
+    transient = None
+    if bind is None:
+        transient = bind = build_engine(tenancy.TENANT_DATABASE_URLS[tenant], f"tenant-{tenant}", poolclass=NullPool)
+    db = SessionLocal(bind=bind)
+    try:
+        yield db
+    finally:
+        db.close()
+        if transient is not None:
+            transient.dispose()
+
+def client_address(request: Request) -> Optional[str]:
+    """Address of the client, not of the Render/Railway proxy in front of the app"""
+    forwarded = request.headers.get("x-forwarded-for")
+    if forwarded:
+        return forwarded.split(",")[0].strip()
+    return request.headers.get("x-real-ip") or (request.client.host if request.client else None)
+
+def caller_key(request: Request):
+    """Short hash identifying who made a request: their access token, else their address and user agent"""
+    identity = request.headers.get("authorization")
+    if not identity:
+        # The user agent tells apart students behind the same campus NAT address
+        address = client_address(request)
+        identity = f"{address}|{request.headers.get('user-agent', '')}" if address else None
+    return hashlib.blake2b(identity.encode(), digest_size=8).hexdigest() if identity else None
+
+@event.listens_for(SessionLocal, "after_commit")
+def remember_writer(session):
+    writer = session.info.get("writer")
+    if writer and read_engines:
+        try:
+            get_state().set(f"wrote:{writer}", 1, ttl=READ_YOUR_WRITES_SECONDS)
+        except StateBackendError:
+            pass
+
+def read_engine_for(request: Request):
+    """Engine for a read-only request: a replica (round-robin) unless the caller asked
+    for the primary (X-Read-Primary header) or wrote within READ_YOUR_WRITES_SECONDS.
+    Replicas belong to the default tenant; other colleges read from their own primary."""
+    tenant = tenancy.current_tenant()
+    if tenant != tenancy.DEFAULT_TENANT:
+        return tenant_engines.get(tenant)
+    if not read_engines:
+        return engine
+    if request.headers.get("x-read-primary"):
+        db_read_routes.inc("requested")
+        return engine
+    writer = caller_key(request)
+    try:
+        wrote_recently = writer is not None and get_state().get(f"wrote:{writer}")
+    except StateBackendError:
+        wrote_recently = True
+    if wrote_recently:
+        db_read_routes.inc("read_your_writes")
+        return engine
+    db_read_routes.inc("replica")
+    return read_engines[next(_next_replica) % len(read_engines)]
+
 # Dependency to get database session
-def get_db():
-    db = SessionLocal()
+def get_db(request: Request):
+    db = tenant_session()
+    db.info["writer"] = caller_key(request)
+    try:
+        yield db
+    finally:
+        db.close()
+
+# Dependency for read-only endpoints
+def get_read_db(request: Request):
+    db = ReadSessionLocal(bind=read_engine_for(request))
     try:
         yield db
     finally:
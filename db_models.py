@@ -1,7 +1,8 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Boolean, Text
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Boolean, Text, Index, UniqueConstraint, Time
+from sqlalchemy.orm import relationship, validates
 from sqlalchemy.sql import func
 from college_attendance.database import Base
+from college_attendance.services.name_matching import normalize_name
 import uuid
 from datetime import datetime, timedelta
 
@@ -16,6 +17,7 @@ class Teacher(Base):
     
     # Relationship
     sessions = relationship("Session", back_populates="teacher")
+    timetable = relationship("TimetableSlot", back_populates="teacher")
 
 class Student(Base):
     __tablename__ = "students"
@@ -26,10 +28,20 @@ class Student(Base):
     class_name = Column(String(50), nullable=False)
     email = Column(String(100), unique=True, nullable=True)
     father_name = Column(String(100), nullable=True)
+    # Absence notices go here, else to the student's own email
+    guardian_email = Column(String(100), nullable=True)
+    # Casefolded, diacritic-free forms used for identity checks
+    name_normalized = Column(String(100), nullable=True, index=True)
+    father_name_normalized = Column(String(100), nullable=True)
     created_at = Column(DateTime, default=func.now())
     
     # Relationship
     attendances = relationship("Attendance", back_populates="student")
+    
+    @validates("name", "father_name")
+    def _normalize_name(self, key, value):
+        setattr(self, f"{key}_normalized", normalize_name(value))
+        return value
 
 class Session(Base):
     __tablename__ = "sessions"
@@ -43,10 +55,27 @@ class Session(Base):
     generated_at = Column(DateTime, default=func.now())
     expires_at = Column(DateTime, nullable=False)
     is_active = Column(Boolean, default=True)
+    # Set for sessions pre-created from the timetable
+    timetable_slot_id = Column(Integer, ForeignKey("timetable.id"), nullable=True)
+    scheduled_start = Column(DateTime, nullable=True)
+    # Set when a teacher first shows a pre-created session's QR code (generate-qr)
+    claimed_at = Column(DateTime, nullable=True)
+    # Frozen when the session is closed (expired or deactivated)
+    closed_at = Column(DateTime, nullable=True)
+    final_count = Column(Integer, nullable=True)
+    absent_count = Column(Integer, nullable=True)
     
     # Relationship
     teacher = relationship("Teacher", back_populates="sessions")
     attendances = relationship("Attendance", back_populates="session")
+    absences = relationship("Absence", back_populates="session")
+    timetable_slot = relationship("TimetableSlot")
+    
+    __table_args__ = (
+        Index("ix_sessions_active_expires", "is_active", "expires_at"),
+        Index("ix_sessions_teacher_generated", "teacher_id", "generated_at"),
+        UniqueConstraint("timetable_slot_id", "scheduled_start", name="uq_sessions_slot_start"),
+    )
     
     def is_expired(self):
         return datetime.utcnow() > self.expires_at
@@ -58,10 +87,101 @@ class Attendance(Base):
     session_id = Column(Integer, ForeignKey("sessions.id"), nullable=False)
     student_id = Column(Integer, ForeignKey("students.id"), nullable=False)
     timestamp = Column(DateTime, default=func.now())
-    ip_address = Column(String(45), nullable=True)  # IPv6 compatible
-    user_agent = Column(Text, nullable=True)
+    # Interned through the client_ips / user_agents lookup tables (see services/interning.py)
+    ip_address_id = Column(Integer, ForeignKey("client_ips.id"), nullable=True)
+    user_agent_id = Column(Integer, ForeignKey("user_agents.id"), nullable=True)
     location = Column(String(255), nullable=True)
     
     # Relationship
     session = relationship("Session", back_populates="attendances")
-    student = relationship("Student", back_populates="attendances") 
\ No newline at end of file
+    student = relationship("Student", back_populates="attendances")
+    client_ip = relationship("ClientIP")
+    agent = relationship("UserAgent")
+    
+    @property
+    def ip_address(self):
+        return self.client_ip.address if self.client_ip else None
+    
+    @property
+    def user_agent(self):
+        return self.agent.value if self.agent else None
+    
+    # Also serve the version stamps (newest id, count) of the listing ETags; the
+    # unique index is what stops two concurrent scans both inserting a row
+    __table_args__ = (
+        Index("ix_attendances_session_student", "session_id", "student_id", unique=True),
+        Index("ix_attendances_student_id", "student_id", "id"),
+    )
+
+class ClientIP(Base):
+    __tablename__ = "client_ips"
+    
+    id = Column(Integer, primary_key=True)
+    address = Column(String(45), unique=True, nullable=False)  # IPv6 compatible
+
+class UserAgent(Base):
+    __tablename__ = "user_agents"
+    
+    id = Column(Integer, primary_key=True)
+    # Unique on a hash, as the strings themselves can be too long to index
+    digest = Column(String(32), unique=True, nullable=False)
+    value = Column(Text, nullable=False)
+
+class TimetableSlot(Base):
+    __tablename__ = "timetable"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    teacher_id = Column(Integer, ForeignKey("teachers.id"), nullable=False, index=True)
+    subject = Column(String(100), nullable=False)
+    class_name = Column(String(50), nullable=False)
+    section = Column(String(10), nullable=True)
+    weekday = Column(Integer, nullable=False)  # 0 = Monday
+    start_time = Column(Time, nullable=False)  # local time, see TIMETABLE_TIMEZONE
+    duration_minutes = Column(Integer, nullable=False)
+    is_active = Column(Boolean, default=True)
+    
+    # Relationship
+    teacher = relationship("Teacher", back_populates="timetable")
+
+class Absence(Base):
+    __tablename__ = "absences"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    session_id = Column(Integer, ForeignKey("sessions.id"), nullable=False, index=True)
+    student_id = Column(Integer, ForeignKey("students.id"), nullable=False, index=True)
+    
+    # Relationship
+    session = relationship("Session", back_populates="absences")
+    student = relationship("Student")
+    
+    __table_args__ = (
+        UniqueConstraint("session_id", "student_id", name="uq_absences_session_student"),
+    )
+
+class Notification(Base):
+    """Outbox row: one absence to report, written in the transaction that closes its session"""
+    __tablename__ = "notification_outbox"
+    
+    id = Column(Integer, primary_key=True)
+    student_id = Column(Integer, ForeignKey("students.id"), nullable=False)
+    session_id = Column(Integer, ForeignKey("sessions.id"), nullable=False)
+    recipient = Column(String(100), nullable=False)
+    status = Column(String(10), nullable=False, default="pending")  # pending, sending, sent, failed
+    attempts = Column(Integer, nullable=False, default=0)
+    next_attempt_at = Column(DateTime, nullable=False)
+    # Set while a delivery worker holds the row; an expired lease can be claimed again
+    claim_token = Column(String(32), nullable=True)
+    claimed_until = Column(DateTime, nullable=True)
+    sent_at = Column(DateTime, nullable=True)
+    last_error = Column(String(255), nullable=True)
+    created_at = Column(DateTime, default=func.now())
+    
+    # Relationship
+    student = relationship("Student")
+    session = relationship("Session")
+    
+    __table_args__ = (
+        Index("ix_notification_outbox_due", "status", "next_attempt_at"),
+        Index("ix_notification_outbox_student", "student_id", "status"),
+        UniqueConstraint("session_id", "student_id", name="uq_notification_outbox_session_student"),
+    ) 
\ No newline at end of file
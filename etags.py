@@ -0,0 +1,52 @@
+"""
+Conditional GET for listing endpoints
+
+A listing's ETag is a hash of a cheap version stamp (for example the newest
+attendance id and row count behind it, read from an index) instead of the
+response body, so a client whose copy is current gets 304 Not Modified
+before the listing is queried or serialized. Tags are weak: equal tags mean
+the same data, not byte-identical bodies.
+
+Responses carry `Cache-Control: private, no-cache`, so browsers keep them
+but revalidate with If-None-Match on every fetch.
+"""
+import hashlib
+from typing import Any, Optional
+
+from fastapi import Request, Response
+
+from college_attendance.services.tenancy import current_tenant
+
+# Bump when a listing's response format changes, so old tags stop matching
+ETAG_VERSION = "1"
+CACHE_CONTROL = "private, no-cache"
+
+def make_etag(*stamp: Any) -> str:
+    """Weak ETag for a version stamp of the current tenant's data"""
+    key = "|".join(str(part) for part in (ETAG_VERSION, current_tenant()) + stamp)
+    return 'W/"' + hashlib.blake2b(key.encode(), digest_size=12).hexdigest() + '"'
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """Weak comparison of If-None-Match against an ETag"""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    opaque = etag[2:] if etag.startswith("W/") else etag
+    return any(
+        (candidate[2:] if candidate.startswith("W/") else candidate) == opaque
+        for candidate in (part.strip() for part in header.split(","))
+    )
+
+def not_modified(request: Request, etag: str) -> Optional[Response]:
+    """304 response when the client already has this version, else None"""
+    if etag_matches(request, etag):
+        return Response(status_code=304, headers={"ETag": etag, "Cache-Control": CACHE_CONTROL})
+    return None
+
+def with_etag(response: Response, etag: str) -> Response:
+    """Attach the ETag and revalidation headers to a full response"""
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = CACHE_CONTROL
+    return response
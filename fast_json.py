@@ -0,0 +1,41 @@
+"""
+Fast JSON responses for hot endpoints
+
+Returning a FastJSONResponse from a route skips response-model validation
+and FastAPI's jsonable_encoder, and serializes with orjson when it is
+installed. Rows can be passed as plain dicts (e.g. query rows via
+row._asdict()) with datetime values left as they are: both encoders write
+them in isoformat, so nothing is formatted per row in Python.
+
+FAST_JSON=0, or orjson not being installed, falls back to the standard
+library encoder with identical output.
+"""
+import json
+import os
+from datetime import date, datetime, time
+from typing import Any
+
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+FAST_JSON = os.getenv("FAST_JSON", "1").lower() not in ("0", "false", "no") and orjson is not None
+
+def _default(value: Any) -> str:
+    if isinstance(value, (datetime, date, time)):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+def dumps(content: Any) -> bytes:
+    if FAST_JSON:
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(
+        content, default=_default, ensure_ascii=False, allow_nan=False, separators=(",", ":")
+    ).encode("utf-8")
+
+class FastJSONResponse(JSONResponse):
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
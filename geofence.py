@@ -0,0 +1,223 @@
+"""
+Campus geofence for attendance scans
+
+Zones (whole campus or single rooms) are polygons of [latitude, longitude]
+points loaded from the JSON file named by GEOFENCE_FILE:
+
+    {"zones": [
+        {"name": "Main Campus", "polygon": [[30.90, 75.85], [30.90, 75.86], ...]},
+        {"name": "CS Lab", "polygon": [...], "classes": ["Computer Science"]}
+    ]}
+
+A zone listing "classes" applies to sessions of those classes; the other
+zones apply to every class without a zone of its own.
+
+At startup the polygons are projected to metres and compiled into a uniform
+grid (GEOFENCE_CELL_METERS). Each cell records the zones covering it
+entirely and the zones whose edge crosses it, so most checks are a dict
+lookup and only points in boundary cells need a point-in-polygon test. The
+distance to the nearest zone is computed only for points outside, and is
+recorded for tuning GEOFENCE_TOLERANCE_METERS.
+
+GEOFENCE_MODE=enforce rejects scans outside the fence or without a
+location; GEOFENCE_MODE=monitor only records the statistics.
+"""
+import json
+import logging
+import math
+import os
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from college_attendance.services.metrics import geofence_checks, geofence_distance
+
+logger = logging.getLogger("college_attendance.geofence")
+
+GEOFENCE_FILE = os.getenv("GEOFENCE_FILE", "")
+GEOFENCE_MODE = os.getenv("GEOFENCE_MODE", "enforce")
+CELL_METERS = float(os.getenv("GEOFENCE_CELL_METERS", "20"))
+TOLERANCE_METERS = float(os.getenv("GEOFENCE_TOLERANCE_METERS", "25"))
+
+METERS_PER_DEGREE_LAT = 110540.0
+METERS_PER_DEGREE_LON = 111320.0
+
+INSIDE = 1
+BOUNDARY = 2
+
+Point = Tuple[float, float]
+
+def _segment_crosses_box(a: Point, b: Point, box: Tuple[float, float, float, float]) -> bool:
+    """Liang-Barsky clip: does segment a-b touch the box (x0, y0, x1, y1)?"""
+    x0, y0, x1, y1 = box
+    dx, dy = b[0] - a[0], b[1] - a[1]
+    t0, t1 = 0.0, 1.0
+    for p, q in ((-dx, a[0] - x0), (dx, x1 - a[0]), (-dy, a[1] - y0), (dy, y1 - a[1])):
+        if p == 0:
+            if q < 0:
+                return False
+            continue
+        t = q / p
+        if p < 0:
+            t0 = max(t0, t)
+        else:
+            t1 = min(t1, t)
+        if t0 > t1:
+            return False
+    return True
+
+def _segment_distance(p: Point, a: Point, b: Point) -> float:
+    dx, dy = b[0] - a[0], b[1] - a[1]
+    length = dx * dx + dy * dy
+    t = 0.0 if length == 0 else max(0.0, min(1.0, ((p[0] - a[0]) * dx + (p[1] - a[1]) * dy) / length))
+    return math.hypot(p[0] - a[0] - t * dx, p[1] - a[1] - t * dy)
+
+class Zone:
+    def __init__(self, name: str, points: Sequence[Point], classes: Iterable[str] = ()):
+        self.name = name
+        self.points = list(points)
+        self.classes = set(classes)
+        self.edges = list(zip(self.points, self.points[1:] + self.points[:1]))
+        xs, ys = [x for x, _ in self.points], [y for _, y in self.points]
+        self.bbox = (min(xs), min(ys), max(xs), max(ys))
+
+    def contains(self, point: Point) -> bool:
+        """Ray-casting point-in-polygon test"""
+        x, y = point
+        inside = False
+        for (x0, y0), (x1, y1) in self.edges:
+            if (y0 > y) != (y1 > y) and x < x0 + (y - y0) * (x1 - x0) / (y1 - y0):
+                inside = not inside
+        return inside
+
+    def distance(self, point: Point) -> float:
+        """Metres from the point to the zone (0 inside)"""
+        if self.contains(point):
+            return 0.0
+        return min(_segment_distance(point, a, b) for a, b in self.edges)
+
+class Geofence:
+    """Zones compiled into a grid index over a local metric projection"""
+    def __init__(self, zones: List[Dict[str, Any]], cell_meters: float = CELL_METERS):
+        coordinates = [tuple(point) for zone in zones for point in zone["polygon"]]
+        self.origin = (
+            sum(lat for lat, _ in coordinates) / len(coordinates),
+            sum(lon for _, lon in coordinates) / len(coordinates),
+        )
+        self.lon_scale = METERS_PER_DEGREE_LON * math.cos(math.radians(self.origin[0]))
+        self.zones = [
+            Zone(zone["name"], [self.project(lat, lon) for lat, lon in zone["polygon"]], zone.get("classes", ()))
+            for zone in zones
+        ]
+        self.default_zones = frozenset(i for i, zone in enumerate(self.zones) if not zone.classes)
+        self.class_zones: Dict[str, frozenset] = {}
+        for i, zone in enumerate(self.zones):
+            for class_name in zone.classes:
+                self.class_zones[class_name] = self.class_zones.get(class_name, frozenset()) | {i}
+
+        self.cell = cell_meters
+        self.cells: Dict[Tuple[int, int], List[Tuple[int, int]]] = {}
+        for i, zone in enumerate(self.zones):
+            self._compile(i, zone)
+
+    def project(self, latitude: float, longitude: float) -> Point:
+        return (
+            (longitude - self.origin[1]) * self.lon_scale,
+            (latitude - self.origin[0]) * METERS_PER_DEGREE_LAT,
+        )
+
+    def _cell_of(self, point: Point) -> Tuple[int, int]:
+        return (math.floor(point[0] / self.cell), math.floor(point[1] / self.cell))
+
+    def _compile(self, index: int, zone: Zone):
+        (cx0, cy0), (cx1, cy1) = self._cell_of(zone.bbox[:2]), self._cell_of(zone.bbox[2:])
+        boundary = set()
+        for a, b in zone.edges:
+            (ex0, ey0), (ex1, ey1) = self._cell_of(a), self._cell_of(b)
+            for cx in range(min(ex0, ex1), max(ex0, ex1) + 1):
+                for cy in range(min(ey0, ey1), max(ey0, ey1) + 1):
+                    box = (cx * self.cell, cy * self.cell, (cx + 1) * self.cell, (cy + 1) * self.cell)
+                    if _segment_crosses_box(a, b, box):
+                        boundary.add((cx, cy))
+        for cx in range(cx0, cx1 + 1):
+            for cy in range(cy0, cy1 + 1):
+                if (cx, cy) in boundary:
+                    self.cells.setdefault((cx, cy), []).append((index, BOUNDARY))
+                elif zone.contains(((cx + 0.5) * self.cell, (cy + 0.5) * self.cell)):
+                    self.cells.setdefault((cx, cy), []).append((index, INSIDE))
+
+    def zones_for(self, class_name: str) -> frozenset:
+        return self.class_zones.get(class_name, self.default_zones)
+
+    def locate(self, latitude: float, longitude: float, class_name: str) -> Tuple[bool, Optional[str], float]:
+        """(inside, zone name, metres to the nearest applicable zone)"""
+        zones = self.zones_for(class_name)
+        if not zones:
+            return True, None, 0.0
+        point = self.project(latitude, longitude)
+        for index, status in self.cells.get(self._cell_of(point), ()):
+            if index in zones and (status == INSIDE or self.zones[index].contains(point)):
+                return True, self.zones[index].name, 0.0
+        distance, nearest = min((self.zones[i].distance(point), self.zones[i].name) for i in zones)
+        return False, nearest, distance
+
+_geofence: Optional[Geofence] = None
+_loaded = False
+_load_lock = threading.Lock()
+
+def load(path: str = GEOFENCE_FILE) -> Optional[Geofence]:
+    """Read and compile the zone file; None when no geofence is configured"""
+    global _geofence, _loaded
+    with _load_lock:
+        if not path:
+            _geofence = None
+        else:
+            with open(path) as f:
+                zones = json.load(f)["zones"]
+            _geofence = Geofence(zones) if zones else None
+            if _geofence:
+                logger.info("Geofence: %d zones compiled into %d grid cells", len(zones), len(_geofence.cells))
+        _loaded = True
+    return _geofence
+
+def get_geofence() -> Optional[Geofence]:
+    """Compiled geofence, loading it on first use if startup did not"""
+    return _geofence if _loaded else load()
+
+def format_location(latitude: float, longitude: float) -> str:
+    return f"{latitude:.6f},{longitude:.6f}"
+
+class GeofenceService:
+    @staticmethod
+    def check(class_name: str, latitude: Optional[float], longitude: Optional[float]) -> Dict[str, Any]:
+        """Check scan coordinates against the zones for a class"""
+        geofence = get_geofence()
+        enforce = GEOFENCE_MODE == "enforce"
+        if geofence is None:
+            return {"allowed": True}
+
+        if latitude is None or longitude is None:
+            geofence_checks.inc("missing")
+            if enforce:
+                return {"allowed": False, "error": "Location is required to mark attendance"}
+            return {"allowed": True}
+
+        if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+            geofence_checks.inc("invalid")
+            return {"allowed": not enforce, "error": "Invalid location coordinates"}
+
+        inside, zone, distance = geofence.locate(latitude, longitude, class_name)
+        if inside:
+            geofence_checks.inc("inside")
+            return {"allowed": True, "zone": zone}
+
+        geofence_distance.observe(distance)
+        if distance <= TOLERANCE_METERS:
+            geofence_checks.inc("near")
+            return {"allowed": True, "zone": zone, "distance_m": round(distance, 1)}
+
+        geofence_checks.inc("outside")
+        return {
+            "allowed": not enforce,
+            "error": f"Location is outside the allowed area ({distance:.0f} m from {zone})",
+            "distance_m": round(distance, 1)
+        }
@@ -0,0 +1,123 @@
+"""
+Idempotency keys for retried requests
+
+A client that may retry a request (a student re-tapping "Mark Attendance" on
+flaky Wi-Fi) sends the same Idempotency-Key header with every attempt. The
+first attempt claims the key and its response is stored for
+IDEMPOTENCY_TTL_SECONDS; retries get that response back without running the
+request again or touching the database. Responses live in a bounded
+in-process LRU (IDEMPOTENCY_CACHE_SIZE entries) and in the shared state
+backend, so a retry that lands on another worker is replayed too.
+
+A key is tied to a fingerprint of the request it was first used with; reusing
+it for a different request is an error rather than a replay. A retry that
+arrives while the first attempt is still running is told so (409) instead of
+running twice.
+"""
+import hashlib
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from college_attendance.services.metrics import idempotent_requests
+from college_attendance.services.state_backend import StateBackendError, get_state
+from college_attendance.services.tenancy import scoped
+
+logger = logging.getLogger("college_attendance.idempotency")
+
+TTL_SECONDS = float(os.getenv("IDEMPOTENCY_TTL_SECONDS", "900"))
+CACHE_SIZE = int(os.getenv("IDEMPOTENCY_CACHE_SIZE", "10000"))
+# How long a claimed key blocks other attempts if its request never finishes
+CLAIM_SECONDS = float(os.getenv("IDEMPOTENCY_CLAIM_SECONDS", "30"))
+MAX_KEY_LENGTH = 255
+
+# Outcomes of begin()
+NEW = "new"
+REPLAY = "replay"
+MISMATCH = "mismatch"
+IN_PROGRESS = "in_progress"
+
+def fingerprint(*parts: Any) -> str:
+    """Stable hash of the request fields that identify a retry"""
+    key = "\x1f".join("" if part is None else str(part) for part in parts)
+    return hashlib.blake2b(key.encode(), digest_size=16).hexdigest()
+
+class IdempotencyStore:
+    def __init__(self, scope: str, ttl: float = TTL_SECONDS, max_size: int = CACHE_SIZE):
+        self.scope = scope
+        self.ttl = ttl
+        self.max_size = max_size
+        self._entries: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _local_get(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def _local_set(self, key: str, record: Dict[str, Any]):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, record)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def begin(self, key: str, request_fingerprint: str) -> Tuple[str, Optional[Dict[str, Any]]]:
+        """Look up or claim a key; returns (NEW | REPLAY | MISMATCH | IN_PROGRESS, stored response)"""
+        key = scoped(key)
+        record = self._local_get(key)
+        if record is None:
+            try:
+                record = get_state().get(f"idempotency:{self.scope}:{key}")
+            except StateBackendError as e:
+                logger.warning("State backend unavailable for idempotency lookup: %s", e)
+            if record is not None:
+                self._local_set(key, record)
+
+        if record is not None:
+            outcome = REPLAY if record["fingerprint"] == request_fingerprint else MISMATCH
+            idempotent_requests.inc(outcome)
+            return outcome, record["response"] if outcome == REPLAY else None
+
+        try:
+            claimed = get_state().incr(f"idempotency-claim:{self.scope}:{key}", ttl=CLAIM_SECONDS) == 1
+        except StateBackendError as e:
+            # Without a claim concurrent retries may both run; duplicate scans are still rejected
+            logger.warning("State backend unavailable for idempotency claim: %s", e)
+            claimed = True
+        outcome = NEW if claimed else IN_PROGRESS
+        idempotent_requests.inc(outcome)
+        return outcome, None
+
+    def complete(self, key: str, request_fingerprint: str, response: Dict[str, Any]):
+        """Store the response of a claimed key for replays"""
+        key = scoped(key)
+        record = {"fingerprint": request_fingerprint, "response": response}
+        self._local_set(key, record)
+        try:
+            get_state().set(f"idempotency:{self.scope}:{key}", record, ttl=self.ttl)
+        except StateBackendError as e:
+            logger.warning("State backend write failed for idempotency key: %s", e)
+
+    def release(self, key: str):
+        """Drop the claim of a request that failed, so a retry runs it again"""
+        key = scoped(key)
+        try:
+            get_state().delete(f"idempotency-claim:{self.scope}:{key}")
+        except StateBackendError as e:
+            logger.warning("State backend unavailable to release idempotency claim: %s", e)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+mark_attendance_keys = IdempotencyStore("mark-attendance")
@@ -0,0 +1,88 @@
+"""
+Interned client IPs and user agents
+
+Scans repeat the same few hundred IP and user agent strings millions of
+times, so attendance rows store ids into the client_ips and user_agents
+lookup tables instead. resolve() returns the id for a string from a bounded
+in-process LRU (INTERN_CACHE_SIZE entries per table), and only on a miss
+looks it up or inserts it, in its own short transaction: an id is cached
+only once its row is committed, so a rolled-back scan can't leave the cache
+pointing at a row that doesn't exist. Two workers interning the same new
+string race on the unique key; the loser reads the winner's id.
+"""
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, Optional
+
+from sqlalchemy import insert, select
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import IntegrityError
+
+from college_attendance.models.db_models import ClientIP, UserAgent
+from college_attendance.services.metrics import intern_lookups
+
+CACHE_SIZE = int(os.getenv("INTERN_CACHE_SIZE", "4096"))
+
+def user_agent_digest(value: str) -> str:
+    return hashlib.blake2b(value.encode("utf-8", "surrogatepass"), digest_size=16).hexdigest()
+
+class InternTable:
+    def __init__(self, model, key_column: str, key: Callable[[str], str], row: Callable[[str], Dict[str, str]],
+                 max_size: int = CACHE_SIZE):
+        self.table = model.__table__
+        self.key_column = self.table.c[key_column]
+        self.key = key
+        self.row = row
+        self.max_size = max_size
+        self._ids: "OrderedDict[tuple, int]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def resolve(self, bind: Engine, value: Optional[str]) -> Optional[int]:
+        """Id of value in this table (inserting it if new), or None for an empty value"""
+        if not value:
+            return None
+        key = self.key(value)
+        # Databases number their rows independently
+        cache_key = (bind.url, key)
+        with self._lock:
+            id = self._ids.get(cache_key)
+            if id is not None:
+                self._ids.move_to_end(cache_key)
+        if id is not None:
+            intern_lookups.inc(self.table.name, "hit")
+            return id
+
+        query = select(self.table.c.id).where(self.key_column == key)
+        try:
+            with bind.begin() as conn:
+                id = conn.execute(query).scalar()
+                result = "found"
+                if id is None:
+                    id = conn.execute(insert(self.table).values(**self.row(value))).inserted_primary_key[0]
+                    result = "inserted"
+        except IntegrityError:
+            # Interned by another worker since our lookup
+            with bind.connect() as conn:
+                id = conn.execute(query).scalar_one()
+            result = "found"
+        intern_lookups.inc(self.table.name, result)
+
+        with self._lock:
+            self._ids[cache_key] = id
+            while len(self._ids) > self.max_size:
+                self._ids.popitem(last=False)
+        return id
+
+    def clear(self):
+        with self._lock:
+            self._ids.clear()
+
+client_ips = InternTable(
+    ClientIP, "address", key=lambda value: value[:45], row=lambda value: {"address": value[:45]}
+)
+user_agents = InternTable(
+    UserAgent, "digest", key=user_agent_digest,
+    row=lambda value: {"digest": user_agent_digest(value), "value": value}
+)
@@ -0,0 +1,296 @@
+#!/usr/bin/env python3
+"""
+Scan-storm load test for College Attendance System
+
+Simulates K concurrent attendance sessions with M students each scanning
+the QR code along a configurable arrival curve, including duplicate taps,
+scans of expired codes and client retries. Latency percentiles, throughput
+and an outcome breakdown are reported as JSON.
+
+Runs either in-process against the ASGI app or against a live server:
+    python load_test.py --sessions 10 --students 60 --curve burst
+    python load_test.py --url http://localhost:8000 --roster roster.json
+
+Rosters are read from the database (DATABASE_URL) unless --roster points to
+a JSON file mapping class names to roll numbers. Use generate_dataset.py to
+create enough students first.
+"""
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import argparse
+import asyncio
+import json
+import random
+import time
+from collections import Counter, defaultdict
+
+try:
+    import httpx
+except ImportError:
+    print("ERROR: load_test.py requires httpx. Please run: pip install httpx")
+    sys.exit(1)
+
+CURVES = ("uniform", "burst", "poisson", "normal")
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Concurrent scan-storm load test")
+    parser.add_argument("--url", help="Base URL of a running server (default: in-process ASGI app)")
+    parser.add_argument("--sessions", type=int, default=5, help="Concurrent sessions (K)")
+    parser.add_argument("--students", type=int, default=60, help="Students scanning per session (M)")
+    parser.add_argument("--curve", choices=CURVES, default="normal", help="Arrival curve of scans")
+    parser.add_argument("--window", type=float, default=10.0, help="Seconds over which scans arrive")
+    parser.add_argument("--duplicate-rate", type=float, default=0.1, help="Share of students that tap twice")
+    parser.add_argument("--expired-rate", type=float, default=0.05, help="Share of scans using an expired code")
+    parser.add_argument("--retries", type=int, default=2, help="Retries on 5xx or transport errors")
+    # The async routes do blocking DB work, so in-flight requests beyond the
+    # engine's pool size stall the event loop on pool checkout
+    parser.add_argument("--concurrency", type=int, default=10, help="Max in-flight HTTP requests")
+    parser.add_argument("--timeout", type=float, default=10.0, help="Per-request timeout in seconds")
+    parser.add_argument("--roster", help="JSON file mapping class names to roll numbers")
+    parser.add_argument("--teacher-email", help="Teacher that creates the sessions (default: first in the DB)")
+    parser.add_argument("--teacher-password", default="teacher123")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="Write the JSON report to this file")
+    return parser.parse_args(argv)
+
+def load_rosters(args):
+    """Pick K classes with at least M students each"""
+    if args.roster:
+        with open(args.roster) as f:
+            rosters = json.load(f)
+    else:
+        from sqlalchemy import func
+        from college_attendance.database import SessionLocal
+        from college_attendance.models.db_models import Student
+
+        db = SessionLocal()
+        try:
+            classes = [
+                name for name, in db.query(Student.class_name)
+                .group_by(Student.class_name)
+                .having(func.count(Student.id) >= args.students)
+                .order_by(Student.class_name)
+                .limit(args.sessions)
+            ]
+            rosters = {
+                name: [roll for roll, in db.query(Student.roll_no)
+                       .filter(Student.class_name == name)
+                       .order_by(Student.roll_no)
+                       .limit(args.students)]
+                for name in classes
+            }
+        finally:
+            db.close()
+
+    rosters = {name: rolls[:args.students] for name, rolls in rosters.items() if len(rolls) >= args.students}
+    if len(rosters) < args.sessions:
+        raise SystemExit(
+            f"ERROR: need {args.sessions} classes with {args.students} students, found {len(rosters)}. "
+            "Run generate_dataset.py first."
+        )
+    return dict(list(rosters.items())[:args.sessions])
+
+def arrival_offsets(rng, curve, count, window):
+    """Seconds after the QR is shown at which each student scans"""
+    if curve == "burst":
+        return [0.0] * count
+    if curve == "uniform":
+        return sorted(rng.uniform(0, window) for _ in range(count))
+    if curve == "poisson":
+        offsets, t = [], 0.0
+        for _ in range(count):
+            t += rng.expovariate(count / window)
+            offsets.append(min(t, window))
+        return offsets
+    # normal: most of the hall scans shortly after the code goes up
+    return sorted(min(max(rng.gauss(window / 3, window / 6), 0.0), window) for _ in range(count))
+
+def classify(body):
+    """Map an API response body to an outcome label"""
+    if body.get("success") or body.get("valid") or not body.get("error"):
+        return "ok"
+    error = (body.get("error") or "").lower()
+    if "already marked" in error:
+        return "already_marked"
+    if "expired" in error:
+        return "expired"
+    if "invalid session" in error or "invalid qr" in error:
+        return "invalid_token"
+    if "not found" in error:
+        return "not_found"
+    if "not enrolled" in error:
+        return "wrong_class"
+    if "does not match" in error:
+        return "identity_mismatch"
+    return "error"
+
+class LoadRecorder:
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.outcomes = defaultdict(Counter)
+        self.retries = Counter()
+
+    def record(self, op: str, latency: float, outcome: str):
+        self.latencies[op].append(latency)
+        self.outcomes[op][outcome] += 1
+
+    @staticmethod
+    def percentiles(values):
+        """Nearest-rank p50/p95/p99 in milliseconds"""
+        if not values:
+            return {}
+        ordered = sorted(values)
+        pick = lambda p: ordered[min(len(ordered) - 1, max(0, int(round(p / 100 * len(ordered))) - 1))]
+        return {
+            "p50_ms": round(pick(50) * 1000, 2),
+            "p95_ms": round(pick(95) * 1000, 2),
+            "p99_ms": round(pick(99) * 1000, 2),
+            "max_ms": round(ordered[-1] * 1000, 2),
+        }
+
+    def report(self, elapsed: float, config: dict) -> dict:
+        every = [v for values in self.latencies.values() for v in values]
+        return {
+            "config": config,
+            "elapsed_s": round(elapsed, 3),
+            "requests": len(every),
+            "throughput_rps": round(len(every) / elapsed, 1) if elapsed else None,
+            "latency": self.percentiles(every),
+            "endpoints": {
+                op: {
+                    "requests": len(values),
+                    "latency": self.percentiles(values),
+                    "outcomes": dict(self.outcomes[op]),
+                    "retries": self.retries[op],
+                }
+                for op, values in self.latencies.items()
+            },
+        }
+
+async def call(client, limiter, recorder, op, method, path, payload, retries):
+    """Issue one request, retrying 5xx and transport errors with backoff"""
+    for attempt in range(retries + 1):
+        if attempt:
+            recorder.retries[op] += 1
+            await asyncio.sleep(0.05 * 2 ** attempt)
+        async with limiter:
+            started = time.perf_counter()
+            try:
+                response = await client.request(method, path, json=payload)
+            except httpx.HTTPError as e:
+                recorder.record(op, time.perf_counter() - started, f"transport_{type(e).__name__}")
+                continue
+            latency = time.perf_counter() - started
+        if response.status_code >= 500:
+            recorder.record(op, latency, f"http_{response.status_code}")
+            continue
+        if response.status_code >= 400:
+            recorder.record(op, latency, f"http_{response.status_code}")
+            return None
+        body = response.json()
+        recorder.record(op, latency, classify(body) if isinstance(body, dict) else "ok")
+        return body
+    return None
+
+async def student_scan(client, limiter, recorder, args, rng, delay, roll_no, session, expired):
+    """One student: wait for their arrival, validate the QR, then mark attendance"""
+    await asyncio.sleep(delay)
+    target = expired if expired and rng.random() < args.expired_rate else session
+
+    await call(client, limiter, recorder, "validate-qr", "POST", "/student/validate-qr",
+               {"qr_data": json.dumps(target["session_info"])}, args.retries)
+
+    payload = {"session_token": target["session_token"], "student_roll_no": roll_no}
+    taps = 2 if rng.random() < args.duplicate_rate else 1
+    await asyncio.gather(*[
+        call(client, limiter, recorder, "mark-attendance", "POST", "/student/mark-attendance", payload, args.retries)
+        for _ in range(taps)
+    ])
+
+async def create_session(client, limiter, recorder, args, class_name, duration_minutes):
+    return await call(client, limiter, recorder, "generate-qr", "POST", "/teacher/generate-qr", {
+        "subject": f"Load Test {class_name}",
+        "class_name": class_name,
+        "section": "A",
+        "duration_minutes": duration_minutes,
+    }, args.retries)
+
+async def teacher_login(client, args):
+    """Log in once; the access token is then sent with every request"""
+    email = args.teacher_email
+    if email is None:
+        from college_attendance.database import SessionLocal
+        from college_attendance.models.db_models import Teacher
+
+        db = SessionLocal()
+        try:
+            email, = db.query(Teacher.email).order_by(Teacher.id).first()
+        finally:
+            db.close()
+
+    response = await client.post("/teacher/login", json={"email": email, "password": args.teacher_password})
+    if response.status_code != 200:
+        raise SystemExit(f"ERROR: teacher login failed for {email}: {response.text}")
+    client.headers["Authorization"] = f"Bearer {response.json()['access_token']}"
+
+async def run(args, client):
+    rng = random.Random(args.seed)
+    rosters = load_rosters(args)
+    recorder = LoadRecorder()
+    limiter = asyncio.Semaphore(args.concurrency)
+
+    started = time.perf_counter()
+
+    # Teachers put codes up at the same time; one already-expired code per class feeds stale scans
+    sessions = await asyncio.gather(*[
+        create_session(client, limiter, recorder, args, name, 10) for name in rosters
+    ])
+    expired = await asyncio.gather(*[
+        create_session(client, limiter, recorder, args, name, 0) if args.expired_rate > 0 else asyncio.sleep(0)
+        for name in rosters
+    ])
+
+    scans = []
+    for (name, rolls), session, stale in zip(rosters.items(), sessions, expired):
+        if session is None:
+            continue
+        offsets = arrival_offsets(rng, args.curve, len(rolls), args.window)
+        order = rolls[:]
+        rng.shuffle(order)
+        scans.extend(
+            student_scan(client, limiter, recorder, args, random.Random(rng.random()), delay, roll_no, session, stale)
+            for delay, roll_no in zip(offsets, order)
+        )
+    await asyncio.gather(*scans)
+
+    elapsed = time.perf_counter() - started
+    config = {key: value for key, value in vars(args).items() if key not in ("output", "roster", "teacher_password")}
+    config["target"] = args.url or "in-process"
+    return recorder.report(elapsed, config)
+
+async def main_async(args):
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    if args.url:
+        client = httpx.AsyncClient(base_url=args.url, timeout=args.timeout, limits=limits)
+    else:
+        from college_attendance.main import app
+        client = httpx.AsyncClient(
+            transport=httpx.ASGITransport(app=app), base_url="http://loadtest", timeout=args.timeout, limits=limits
+        )
+    async with client:
+        await teacher_login(client, args)
+        return await run(args, client)
+
+def main(argv=None):
+    args = parse_args(argv)
+    report = asyncio.run(main_async(args))
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+    print(output)
+
+if __name__ == "__main__":
+    main()
@@ -1,64 +1,150 @@
-from fastapi import FastAPI
+import asyncio
+from contextlib import asynccontextmanager, suppress
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
-from college_attendance.database import engine
-from college_attendance.models import db_models
-from college_attendance.routes import teacher, student
+from fastapi.responses import Response
+from college_attendance.database import all_tenants, engine, job_session, read_engines, tenant_engines
+from college_attendance.routes import teacher, student, admin
+from college_attendance.services import (
+    geofence, metrics, notifications, query_profiler, sampling_profiler, session_lifecycle, session_scheduler,
+    static_assets, tenancy
+)
+from college_attendance.services.attendance import AttendanceService
 import os
 
-# Create database tables
-db_models.Base.metadata.create_all(bind=engine)
+# Frontend locations, checked in order
+FRONTEND_PATHS = ["index.html", "static/index.html"]
 
-# Create FastAPI app
-app = FastAPI(
-    title="College Attendance System",
-    description="A QR code-based attendance system for colleges",
-    version="1.0.0"
-)
+def count_active_sessions():
+    """Active sessions of every college; a failing database leaves the gauge at its last value"""
+    total = 0
+    for tenant in all_tenants():
+        with tenancy.use_tenant(tenant), job_session() as db:
+            total += AttendanceService.count_active_sessions(db)
+    return total
 
-# Add CORS middleware for web deployment
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],  # In production, specify your domain
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Compile geofence polygons into their grid index before the first scan
+    geofence.load()
+    
+    # Close and finalize expired sessions, pre-create upcoming timetable sessions
+    tasks = []
+    if session_lifecycle.SWEEPER_ENABLED:
+        tasks.append(asyncio.create_task(session_lifecycle.run_sweeper()))
+    if session_scheduler.SCHEDULER_ENABLED:
+        tasks.append(asyncio.create_task(session_scheduler.run_scheduler()))
+    
+    # Send absence digests queued by session close-out
+    smtp_pool = notifications.SMTPPool()
+    if notifications.ENABLED:
+        for _ in range(notifications.WORKERS):
+            tasks.append(asyncio.create_task(notifications.run_delivery(smtp_pool)))
+    
+    # Drop cached state of sessions closed by other workers
+    stop_listening = session_lifecycle.listen_for_closes()
+    
+    yield
+    
+    stop_listening()
+    for task in tasks:
+        task.cancel()
+        with suppress(asyncio.CancelledError):
+            await task
+    smtp_pool.close()
+    tenant_engines.dispose_all()
+
+def create_app() -> FastAPI:
+    """Build the FastAPI application.
+
+    Nothing here touches the database or imports QR/imaging or hashing
+    libraries, so a sleeping dyno wakes up quickly. Tables are created by
+    the explicit migrate step (python migrate.py), not at import time.
+    """
+    app = FastAPI(
+        title="College Attendance System",
+        description="A QR code-based attendance system for colleges",
+        version="1.0.0",
+        lifespan=lifespan
+    )
+
+    # Add CORS middleware for web deployment
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=["*"],  # In production, specify your domain
+        allow_credentials=True,
+        allow_methods=["*"],
+        allow_headers=["*"],
+    )
+
+    # Record per-route latency, status codes and DB usage for /metrics
+    app.add_middleware(metrics.MetricsMiddleware)
+    metrics.set_active_sessions_source(count_active_sessions)
+
+    # Per-request SQL profiling (QUERY_PROFILER=1) for catching N+1 patterns
+    query_profiler.install(app, engine)
+    if query_profiler.ENABLED:
+        for read_engine in read_engines:
+            query_profiler.attach(read_engine)
+
+    # Signed single-request sampling profiles (enabled with PROFILER_SECRET)
+    sampling_profiler.install(app)
+
+    # Gzip large JSON responses
+    static_assets.install_compression(app)
+
+    # Pick the college (and its database) of each request when several are hosted
+    tenancy.install(app)
+
+    # Frontend and static files, read and precompressed once
+    frontend = static_assets.load_first(FRONTEND_PATHS)
+    static_files = static_assets.load_directory("static")
+
+    # Include routers
+    app.include_router(teacher.router)
+    app.include_router(student.router)
+    app.include_router(admin.router)
+
+    @app.get("/")
+    async def root():
+        return {
+            "message": "College Attendance System API",
+            "version": "1.0.0",
+            "docs": "/docs",
+            "redoc": "/redoc",
+            "frontend": "/ui"
+        }
+
+    @app.get("/health")
+    async def health_check():
+        return {"status": "healthy"}
+
+    @app.get("/metrics", include_in_schema=False)
+    def prometheus_metrics():
+        """Prometheus scrape endpoint"""
+        return Response(metrics.registry.render(), media_type=metrics.CONTENT_TYPE)
+
+    @app.get("/ui")
+    async def serve_frontend(request: Request):
+        """Serve the frontend application"""
+        if frontend is None:
+            return {"message": "Frontend not found. Please check if index.html exists."}
+        return static_assets.respond(request, frontend)
+
+    @app.get("/static/{path:path}", include_in_schema=False)
+    async def serve_static(path: str, request: Request):
+        asset = static_files.get(path)
+        if asset is None:
+            raise HTTPException(status_code=404, detail="Not Found")
+        return static_assets.respond(request, asset)
+
+    return app
 
-# Mount static files
-if os.path.exists("static"):
-    app.mount("/static", StaticFiles(directory="static"), name="static")
-
-# Include routers
-app.include_router(teacher.router)
-app.include_router(student.router)
-
-@app.get("/")
-async def root():
-    return {
-        "message": "College Attendance System API",
-        "version": "1.0.0",
-        "docs": "/docs",
-        "redoc": "/redoc",
-        "frontend": "/ui"
-    }
-
-@app.get("/health")
-async def health_check():
-    return {"status": "healthy"}
-
-@app.get("/ui")
-async def serve_frontend():
-    """Serve the frontend application"""
-    if os.path.exists("static/index.html"):
-        return FileResponse("static/index.html")
-    else:
-        return {"message": "Frontend not found. Please check if static/index.html exists."}
+app = create_app()
 
 if __name__ == "__main__":
     import uvicorn
     # Use environment variables for production
     port = int(os.getenv("PORT", 8000))
     host = os.getenv("HOST", "0.0.0.0")
-    uvicorn.run(app, host=host, port=port) 
\ No newline at end of file
+    uvicorn.run(app, host=host, port=port)
\ No newline at end of file
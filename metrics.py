@@ -0,0 +1,275 @@
+"""
+Prometheus-style metrics for the attendance API
+
+Counters, gauges and histograms are kept in-process and rendered in the
+Prometheus text exposition format on /metrics. Recording a sample is a
+couple of dict operations, so instrumentation stays cheap on the scan path.
+"""
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, Optional, Sequence, Tuple
+
+from sqlalchemy import event
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _format_labels(names: Sequence[str], values: Tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def header(self) -> str:
+        return f"# HELP {self.name} {self.documentation}\n# TYPE {self.name} {self.kind}\n"
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, *labels: str, amount: float = 1.0):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def value(self, *labels: str) -> float:
+        return self._values.get(labels, 0.0)
+
+    def render(self) -> str:
+        lines = [self.header()]
+        for labels, value in sorted(self._values.items()):
+            lines.append(f"{self.name}{_format_labels(self.labelnames, labels)} {value}\n")
+        return "".join(lines)
+
+class Gauge(_Metric):
+    """Gauge whose value is set directly or read from a callback at scrape time"""
+    kind = "gauge"
+
+    def __init__(self, name, documentation, labelnames=(), callback: Optional[Callable[[], float]] = None):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self.callback = callback
+
+    def set(self, value: float, *labels: str):
+        self._values[labels] = value
+
+    def render(self) -> str:
+        if self.callback is not None:
+            try:
+                self._values[()] = float(self.callback())
+            except Exception:
+                pass
+        lines = [self.header()]
+        for labels, value in sorted(self._values.items()):
+            lines.append(f"{self.name}{_format_labels(self.labelnames, labels)} {value}\n")
+        return "".join(lines)
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # labels -> [per-bucket counts..., +Inf count, sum]
+        self._values: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, value: float, *labels: str):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._values.get(labels)
+            if series is None:
+                series = self._values[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+
+    def count(self, *labels: str) -> int:
+        series = self._values.get(labels)
+        return sum(series[:-1]) if series else 0
+
+    def render(self) -> str:
+        lines = [self.header()]
+        for labels, series in sorted(self._values.items()):
+            cumulative = 0
+            for bound, observed in zip(self.buckets, series):
+                cumulative += observed
+                le = _format_labels(self.labelnames, labels, f'le="{bound}"')
+                lines.append(f"{self.name}_bucket{le} {cumulative}\n")
+            cumulative += series[len(self.buckets)]
+            inf = _format_labels(self.labelnames, labels, 'le="+Inf"')
+            lines.append(f"{self.name}_bucket{inf} {cumulative}\n")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, labels)} {series[-1]}\n")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, labels)} {cumulative}\n")
+        return "".join(lines)
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics[metric.name] = metric
+        return metric
+
+    def get(self, name: str) -> Optional[_Metric]:
+        return self._metrics.get(name)
+
+    def render(self) -> str:
+        return "".join(metric.render() for metric in self._metrics.values())
+
+registry = MetricsRegistry()
+
+http_requests = registry.register(Counter(
+    "http_requests_total", "HTTP requests by route, method and status", ("method", "route", "status")))
+http_latency = registry.register(Histogram(
+    "http_request_duration_seconds", "HTTP request latency by route", ("method", "route")))
+request_db_queries = registry.register(Histogram(
+    "http_request_db_queries", "SQL statements issued per request", ("route",), QUERY_COUNT_BUCKETS))
+request_db_duration = registry.register(Histogram(
+    "http_request_db_duration_seconds", "Time spent in SQL per request", ("route",)))
+db_queries = registry.register(Counter(
+    "db_queries_total", "SQL statements executed", ("engine",)))
+db_query_duration = registry.register(Histogram(
+    "db_query_duration_seconds", "SQL statement latency", ("engine",)))
+db_tenant_engines = registry.register(Counter(
+    "db_tenant_engines_total", "Per-college engines opened, and disposed when idle or evicted", ("event",)))
+db_read_routes = registry.register(Counter(
+    "db_read_routes_total", "Read-only requests by why they went to a replica or the primary", ("reason",)))
+qr_render = registry.register(Histogram(
+    "qr_render_seconds", "Time to render a QR code PNG"))
+scan_outcomes = registry.register(Counter(
+    "attendance_scans_total", "Attendance scans by outcome", ("outcome",)))
+identity_checks = registry.register(Counter(
+    "attendance_identity_checks_total", "Name and father's name checks by result", ("result",)))
+proxy_flags = registry.register(Counter(
+    "attendance_proxy_flags_total", "Device fingerprints flagged for scanning for several students"))
+sessions_closed = registry.register(Counter(
+    "attendance_sessions_closed_total", "Sessions finalized, by what closed them", ("reason",)))
+prerendered_qr = registry.register(Counter(
+    "attendance_prerendered_qr_total", "generate-qr lookups of timetable sessions: hit, rendered or miss", ("result",)))
+idempotent_requests = registry.register(Counter(
+    "attendance_idempotent_requests_total", "Requests with an Idempotency-Key by outcome", ("outcome",)))
+intern_lookups = registry.register(Counter(
+    "attendance_intern_lookups_total", "IP and user agent id lookups: hit (cached), found or inserted", ("table", "result")))
+geofence_checks = registry.register(Counter(
+    "attendance_geofence_checks_total", "Scan location checks by result", ("result",)))
+geofence_distance = registry.register(Histogram(
+    "attendance_geofence_distance_meters", "Distance from the nearest zone for scans outside the geofence",
+    buckets=(5, 10, 25, 50, 100, 250, 500, 1000, 2500, 10000)))
+notifications = registry.register(Counter(
+    "attendance_notifications_total", "Absence outbox rows by outcome: queued, sent, retried or failed", ("outcome",)))
+notification_digests = registry.register(Counter(
+    "attendance_notification_digests_total", "Absence digest emails by result", ("result",)))
+db_backups = registry.register(Counter(
+    "attendance_db_backups_total", "Database snapshots: created, restored or failed", ("result",)))
+active_sessions = registry.register(Gauge(
+    "attendance_active_sessions", "Sessions that are active and not yet expired, across every college"))
+
+# Per-request DB accounting: [query count, seconds in SQL]
+_request_db: ContextVar[Optional[list]] = ContextVar("request_db", default=None)
+
+def scan_outcome(result: Dict) -> str:
+    """Label for a mark_attendance result dict"""
+    if result.get("success"):
+        return "marked"
+    error = (result.get("error") or "").lower()
+    if "already marked" in error:
+        return "already_marked"
+    if "expired" in error:
+        return "expired"
+    if "not found" in error:
+        return "not_found"
+    if "not enrolled" in error:
+        return "wrong_class"
+    if "invalid session" in error:
+        return "invalid_token"
+    if "does not match" in error:
+        return "identity_mismatch"
+    if "location" in error:
+        return "geofence"
+    return "error"
+
+def record_scan(result: Dict):
+    """Count an attendance scan by the outcome of its result dict"""
+    scan_outcomes.inc(scan_outcome(result))
+
+@contextmanager
+def timed(histogram: Histogram, *labels: str):
+    """Observe the elapsed seconds of a block into a histogram"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        histogram.observe(time.perf_counter() - started, *labels)
+
+def instrument_engine(engine, name: str = "primary"):
+    """Attach query counting and timing hooks to a SQLAlchemy engine"""
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["query_started"].pop()
+        db_queries.inc(name)
+        db_query_duration.observe(elapsed, name)
+        stats = _request_db.get()
+        if stats is not None:
+            stats[0] += 1
+            stats[1] += elapsed
+
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", after_cursor_execute)
+    return engine
+
+def set_active_sessions_source(callback: Callable[[], float]):
+    """Compute the active-session gauge lazily at scrape time"""
+    active_sessions.callback = callback
+
+class MetricsMiddleware:
+    """ASGI middleware recording per-route latency, status and DB usage"""
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = {"code": 500}
+        stats = [0, 0.0]
+        token = _request_db.set(stats)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - started
+            _request_db.reset(token)
+            route = scope.get("route")
+            path = getattr(route, "path", None) or "unmatched"
+            method = scope.get("method", "GET")
+            http_requests.inc(method, path, str(status["code"]))
+            http_latency.observe(elapsed, method, path)
+            request_db_queries.observe(stats[0], path)
+            request_db_duration.observe(stats[1], path)
@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+"""
+Database migration step for College Attendance System
+
+Creates any missing tables and applies pending schema changes in order.
+The application no longer does this at import time; run it once per
+deploy (release phase / build command) or after pulling new code:
+    python migrate.py
+    python migrate.py --all-tenants     # also every college in TENANT_DATABASE_URLS
+    python migrate.py --tenant beant
+"""
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import argparse
+import sqlite3
+from datetime import datetime
+from sqlalchemy import Column, DateTime, MetaData, String, Table, inspect, text
+from college_attendance.database import all_tenants, engine, tenant_engines
+from college_attendance.models.db_models import Base
+from college_attendance.services.interning import user_agent_digest
+from college_attendance.services.name_matching import normalize_name
+from college_attendance.services import tenancy
+
+schema_migrations = Table(
+    "schema_migrations",
+    MetaData(),
+    Column("name", String(100), primary_key=True),
+    Column("applied_at", DateTime, nullable=False),
+)
+
+def add_column(conn, table: str, column: str, ddl: str):
+    """ALTER TABLE ... ADD COLUMN unless the column already exists"""
+    if column not in {c["name"] for c in inspect(conn).get_columns(table)}:
+        conn.exec_driver_sql(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}")
+
+def drop_column(conn, table: str, column: str):
+    """ALTER TABLE ... DROP COLUMN; SQLite before 3.35 can't, so the column is emptied instead"""
+    if conn.dialect.name == "sqlite" and sqlite3.sqlite_version_info < (3, 35, 0):
+        conn.exec_driver_sql(f"UPDATE {table} SET {column} = NULL")
+    else:
+        conn.exec_driver_sql(f"ALTER TABLE {table} DROP COLUMN {column}")
+
+def normalize_student_names(conn):
+    """Add the normalized name columns to students and backfill them"""
+    add_column(conn, "students", "name_normalized", "VARCHAR(100)")
+    add_column(conn, "students", "father_name_normalized", "VARCHAR(100)")
+    conn.exec_driver_sql("CREATE INDEX IF NOT EXISTS ix_students_name_normalized ON students (name_normalized)")
+
+    rows = conn.exec_driver_sql("SELECT id, name, father_name FROM students WHERE name_normalized IS NULL").fetchall()
+    if rows:
+        conn.execute(
+            text("UPDATE students SET name_normalized = :name, father_name_normalized = :father WHERE id = :id"),
+            [{"id": id, "name": normalize_name(name), "father": normalize_name(father)} for id, name, father in rows]
+        )
+
+def session_close_out(conn):
+    """Add the frozen close-out columns to sessions and the sweeper's index"""
+    add_column(conn, "sessions", "closed_at", "TIMESTAMP")
+    add_column(conn, "sessions", "final_count", "INTEGER")
+    add_column(conn, "sessions", "absent_count", "INTEGER")
+    conn.exec_driver_sql("CREATE INDEX IF NOT EXISTS ix_sessions_active_expires ON sessions (is_active, expires_at)")
+
+def timetable_sessions(conn):
+    """Link sessions to the timetable slot they were pre-created for"""
+    add_column(conn, "sessions", "timetable_slot_id", "INTEGER REFERENCES timetable(id)")
+    add_column(conn, "sessions", "scheduled_start", "TIMESTAMP")
+    conn.exec_driver_sql(
+        "CREATE UNIQUE INDEX IF NOT EXISTS uq_sessions_slot_start ON sessions (timetable_slot_id, scheduled_start)"
+    )
+
+def listing_indexes(conn):
+    """Indexes behind the session/attendance listings and their ETag version stamps"""
+    conn.exec_driver_sql(
+        "CREATE INDEX IF NOT EXISTS ix_sessions_teacher_generated ON sessions (teacher_id, generated_at)"
+    )
+    conn.exec_driver_sql(
+        "CREATE INDEX IF NOT EXISTS ix_attendances_session_student ON attendances (session_id, student_id)"
+    )
+    conn.exec_driver_sql("CREATE INDEX IF NOT EXISTS ix_attendances_student_id ON attendances (student_id, id)")
+
+def intern_client_metadata(conn):
+    """Move attendance IPs and user agents into the client_ips / user_agents lookup tables"""
+    add_column(conn, "attendances", "ip_address_id", "INTEGER REFERENCES client_ips(id)")
+    add_column(conn, "attendances", "user_agent_id", "INTEGER REFERENCES user_agents(id)")
+    columns = {c["name"] for c in inspect(conn).get_columns("attendances")}
+
+    if "ip_address" in columns:
+        conn.exec_driver_sql(
+            "INSERT INTO client_ips (address) SELECT DISTINCT ip_address FROM attendances "
+            "WHERE ip_address IS NOT NULL AND ip_address <> '' "
+            "AND ip_address NOT IN (SELECT address FROM client_ips)"
+        )
+        conn.exec_driver_sql(
+            "UPDATE attendances SET ip_address_id = "
+            "(SELECT id FROM client_ips WHERE client_ips.address = attendances.ip_address) "
+            "WHERE ip_address IS NOT NULL AND ip_address <> ''"
+        )
+        drop_column(conn, "attendances", "ip_address")
+
+    if "user_agent" in columns:
+        # The unique key is a hash computed here, so new values are inserted from Python
+        known = {digest for digest, in conn.exec_driver_sql("SELECT digest FROM user_agents")}
+        agents = {
+            user_agent_digest(value): value for value, in conn.exec_driver_sql(
+                "SELECT DISTINCT user_agent FROM attendances WHERE user_agent IS NOT NULL AND user_agent <> ''"
+            )
+        }
+        new = [{"digest": digest, "value": value} for digest, value in agents.items() if digest not in known]
+        if new:
+            conn.execute(text("INSERT INTO user_agents (digest, value) VALUES (:digest, :value)"), new)
+        conn.exec_driver_sql(
+            "UPDATE attendances SET user_agent_id = "
+            "(SELECT id FROM user_agents WHERE user_agents.value = attendances.user_agent) "
+            "WHERE user_agent IS NOT NULL AND user_agent <> ''"
+        )
+        drop_column(conn, "attendances", "user_agent")
+
+def guardian_emails(conn):
+    """Add students.guardian_email; the notification outbox table itself comes from create_all"""
+    add_column(conn, "students", "guardian_email", "VARCHAR(100)")
+
+def timetable_claims(conn):
+    """Add sessions.claimed_at; pre-created sessions that already have scans were evidently shown"""
+    add_column(conn, "sessions", "claimed_at", "TIMESTAMP")
+    conn.exec_driver_sql(
+        "UPDATE sessions SET claimed_at = generated_at "
+        "WHERE timetable_slot_id IS NOT NULL AND claimed_at IS NULL "
+        "AND EXISTS (SELECT 1 FROM attendances WHERE attendances.session_id = sessions.id)"
+    )
+
+def unique_scans(conn):
+    """Make ix_attendances_session_student unique, keeping the first row of any duplicate scans"""
+    conn.exec_driver_sql(
+        "DELETE FROM attendances WHERE EXISTS (SELECT 1 FROM attendances AS earlier "
+        "WHERE earlier.session_id = attendances.session_id "
+        "AND earlier.student_id = attendances.student_id AND earlier.id < attendances.id)"
+    )
+    conn.exec_driver_sql("DROP INDEX IF EXISTS ix_attendances_session_student")
+    conn.exec_driver_sql(
+        "CREATE UNIQUE INDEX ix_attendances_session_student ON attendances (session_id, student_id)"
+    )
+
+# Ordered (name, function(connection)) schema changes for existing databases.
+# Fresh databases get the full schema from create_all, so steps must be
+# idempotent; each one is recorded in schema_migrations and runs only once.
+MIGRATIONS = [
+    ("0001_student_normalized_names", normalize_student_names),
+    ("0002_session_close_out", session_close_out),
+    ("0003_timetable_sessions", timetable_sessions),
+    ("0004_listing_indexes", listing_indexes),
+    ("0005_intern_client_metadata", intern_client_metadata),
+    ("0006_absence_notifications", guardian_emails),
+    ("0007_timetable_claims", timetable_claims),
+    ("0008_unique_scans", unique_scans),
+]
+
+def migrate(bind=engine) -> list:
+    """Create missing tables, apply pending migrations and return their names"""
+    Base.metadata.create_all(bind=bind)
+    schema_migrations.create(bind=bind, checkfirst=True)
+
+    applied = []
+    with bind.begin() as conn:
+        done = {name for name, in conn.execute(schema_migrations.select().with_only_columns(schema_migrations.c.name))}
+        for name, step in MIGRATIONS:
+            if name in done:
+                continue
+            step(conn)
+            conn.execute(schema_migrations.insert().values(name=name, applied_at=datetime.utcnow()))
+            applied.append(name)
+    return applied
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Create or update the database schema")
+    parser.add_argument("--tenant", action="append", default=[],
+                        help="College to migrate, from TENANT_DATABASE_URLS (repeatable; default: DATABASE_URL)")
+    parser.add_argument("--all-tenants", action="store_true",
+                        help="Migrate DATABASE_URL and every college in TENANT_DATABASE_URLS")
+    args = parser.parse_args(argv)
+
+    if args.all_tenants:
+        tenants = all_tenants()
+    else:
+        tenants = [tenant.lower() for tenant in args.tenant] or [tenancy.DEFAULT_TENANT]
+    for tenant in tenants:
+        if not tenancy.is_known(tenant):
+            raise SystemExit(f"ERROR: unknown tenant {tenant!r} (not in TENANT_DATABASE_URLS)")
+
+    for tenant in tenants:
+        applied = migrate(tenant_engines.get(tenant))
+        label = "" if tenants == [tenancy.DEFAULT_TENANT] else f" ({tenant})"
+        print(f"Database schema is up to date{label}.")
+        for name in applied:
+            print(f"  applied: {name}")
+    tenant_engines.dispose_all()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+"""
+Name normalization and identity matching for attendance scans
+
+Names are compared in a normalized form: Unicode diacritics stripped,
+casefolded, punctuation dropped and whitespace collapsed, so "  José  O'Neil"
+and "jose oneil" are the same name. Student rows store the normalized name
+and father's name (computed on insert), and the scan path reads them from
+the cached student snapshot, so the exact check is a string comparison.
+
+When NAME_MATCH_THRESHOLD is below 1.0, near misses (typos, swapped word
+order, transliteration variants) are also accepted when the bigram (Dice)
+similarity of the normalized names reaches the threshold. Bigram sets for
+a class roster are built once and cached, so a fuzzy check costs one dict
+lookup and one set intersection per scan.
+"""
+import os
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Any, Dict, FrozenSet, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from college_attendance.services.metrics import identity_checks
+from college_attendance.services.tenancy import scoped
+
+MATCH_THRESHOLD = float(os.getenv("NAME_MATCH_THRESHOLD", "1.0"))
+ROSTER_TTL = int(os.getenv("ROSTER_CACHE_SECONDS", "600"))
+MAX_ROSTERS = int(os.getenv("ROSTER_CACHE_SIZE", "256"))
+
+_APOSTROPHES = re.compile(r"['\u2018\u2019`]")
+_SEPARATORS = re.compile(r"[\W_]+")
+
+def normalize_name(value: Optional[str]) -> Optional[str]:
+    """Casefolded, diacritic-free, single-spaced form of a name"""
+    if value is None:
+        return None
+    decomposed = unicodedata.normalize("NFKD", value)
+    stripped = "".join(ch for ch in decomposed if not unicodedata.combining(ch))
+    stripped = _APOSTROPHES.sub("", stripped.casefold())
+    return _SEPARATORS.sub(" ", stripped).strip()
+
+def name_bigrams(normalized: str) -> FrozenSet[str]:
+    """Character bigrams of a normalized name with its words sorted, so word order does not matter"""
+    padded = " " + " ".join(sorted(normalized.split())) + " "
+    return frozenset(padded[i:i + 2] for i in range(len(padded) - 1))
+
+def similarity(a: FrozenSet[str], b: FrozenSet[str]) -> float:
+    """Dice coefficient of two bigram sets"""
+    if not a or not b:
+        return 0.0
+    return 2 * len(a & b) / (len(a) + len(b))
+
+class RosterIndex:
+    """Precomputed name and father's-name bigrams for one class, by roll number"""
+    def __init__(self, rows):
+        self.loaded_at = time.monotonic()
+        self.entries: Dict[str, Tuple[FrozenSet[str], Optional[FrozenSet[str]]]] = {
+            roll_no: (name_bigrams(name or ""), name_bigrams(father) if father else None)
+            for roll_no, name, father in rows
+        }
+
+    def get(self, roll_no: str) -> Optional[Tuple[FrozenSet[str], Optional[FrozenSet[str]]]]:
+        return self.entries.get(roll_no)
+
+_rosters: "OrderedDict[str, RosterIndex]" = OrderedDict()
+_rosters_lock = threading.Lock()
+
+def get_roster(db: Session, class_name: str) -> RosterIndex:
+    """Cached roster index for a class, rebuilt after ROSTER_CACHE_SECONDS"""
+    key = scoped(class_name)
+    with _rosters_lock:
+        roster = _rosters.get(key)
+        if roster is not None and time.monotonic() - roster.loaded_at < ROSTER_TTL:
+            _rosters.move_to_end(key)
+            return roster
+
+    from college_attendance.models.db_models import Student
+
+    roster = RosterIndex(db.query(
+        Student.roll_no, Student.name_normalized, Student.father_name_normalized
+    ).filter(Student.class_name == class_name).all())
+    with _rosters_lock:
+        _rosters[key] = roster
+        while len(_rosters) > MAX_ROSTERS:
+            _rosters.popitem(last=False)
+    return roster
+
+def invalidate_roster(class_name: Optional[str] = None):
+    """Drop a cached roster (or all of them) after students are imported or edited"""
+    with _rosters_lock:
+        if class_name is None:
+            _rosters.clear()
+        else:
+            _rosters.pop(scoped(class_name), None)
+
+class NameMatcher:
+    @staticmethod
+    def verify_identity(
+        db: Session,
+        student: Dict[str, Any],
+        student_name: str,
+        father_name: str,
+        threshold: float = MATCH_THRESHOLD
+    ) -> Dict[str, Any]:
+        """Check the submitted name and father's name against a student snapshot"""
+        name = normalize_name(student_name)
+        father = normalize_name(father_name)
+        stored_name = student["name_normalized"]
+        stored_father = student["father_name_normalized"]
+
+        name_ok = name == stored_name
+        father_ok = not stored_father or father == stored_father
+        if name_ok and father_ok:
+            identity_checks.inc("exact")
+            return {"success": True}
+
+        if threshold < 1.0:
+            entry = get_roster(db, student["class_name"]).get(student["roll_no"])
+            if entry is None:
+                entry = (name_bigrams(stored_name), name_bigrams(stored_father) if stored_father else None)
+            name_ok = name_ok or similarity(name_bigrams(name), entry[0]) >= threshold
+            father_ok = father_ok or similarity(name_bigrams(father), entry[1]) >= threshold
+            if name_ok and father_ok:
+                identity_checks.inc("fuzzy")
+                return {"success": True}
+
+        identity_checks.inc("mismatch")
+        if not name_ok:
+            return {"success": False, "error": "Student name does not match the roll number"}
+        return {"success": False, "error": "Father's name does not match the student record"}
@@ -0,0 +1,304 @@
+"""
+Absence notifications (transactional outbox)
+
+When a session closes, a finalizer queues one notification_outbox row per
+absentee in the same transaction that records the absences, so a notice is
+queued exactly when the close commits and nothing is sent from the request
+path. NOTIFY_WORKERS tasks in the app lifespan claim due rows in batches and
+send them over a pool of reused SMTP connections.
+
+Rows become due NOTIFY_DIGEST_SECONDS after they are queued and a worker
+claims every pending row of a student at once, so a student who misses
+several lectures gets one digest listing them instead of an email each.
+Claims are leases taken with a conditional UPDATE (claim_token,
+claimed_until): several workers and processes deliver without sending a row
+twice, and rows held by a worker that died are claimed again after
+NOTIFY_LEASE_SECONDS. Delivery is at-least-once; a crash between sending a
+digest and recording it sends that digest again.
+
+Temporary failures (4xx replies, dropped connections) are retried with
+exponential backoff and jitter, up to NOTIFY_MAX_ATTEMPTS; permanent ones
+(the recipient or message refused with 5xx) mark the rows failed. Notices go
+to students.guardian_email, else to the student's own email.
+
+Queueing is on when SMTP_HOST is set (ABSENCE_NOTIFICATIONS=0/1 overrides).
+To try it locally, run smtp_standin.py and point SMTP_HOST/SMTP_PORT at it.
+"""
+import asyncio
+import logging
+import os
+import queue
+import random
+import smtplib
+import ssl
+import uuid
+from datetime import datetime, timedelta, timezone
+from email.message import EmailMessage
+from email.utils import make_msgid
+from typing import Dict, List, Optional
+
+from sqlalchemy import and_, func, insert, literal, or_, select, update
+from sqlalchemy.orm import Session
+
+from college_attendance.database import all_tenants, job_session
+from college_attendance.models.db_models import Absence, Notification, Session as DBSession, Student, Teacher
+from college_attendance.services.metrics import notification_digests, notifications
+from college_attendance.services.session_lifecycle import register_finalizer
+from college_attendance.services.session_scheduler import TIMETABLE_TIMEZONE
+from college_attendance.services.tenancy import use_tenant
+
+logger = logging.getLogger("college_attendance.notifications")
+
+SMTP_HOST = os.getenv("SMTP_HOST", "")
+SMTP_PORT = int(os.getenv("SMTP_PORT", "25"))
+SMTP_USERNAME = os.getenv("SMTP_USERNAME", "")
+SMTP_PASSWORD = os.getenv("SMTP_PASSWORD", "")
+SMTP_STARTTLS = os.getenv("SMTP_STARTTLS", "0").lower() not in ("0", "false", "no")
+SMTP_SSL = os.getenv("SMTP_SSL", "0").lower() not in ("0", "false", "no")
+SMTP_TIMEOUT = float(os.getenv("SMTP_TIMEOUT", "10"))
+NOTIFY_FROM = os.getenv("NOTIFY_FROM", "attendance@localhost")
+
+ENABLED = os.getenv("ABSENCE_NOTIFICATIONS", "1" if SMTP_HOST else "0").lower() not in ("0", "false", "no")
+WORKERS = int(os.getenv("NOTIFY_WORKERS", "2"))
+SMTP_POOL_SIZE = int(os.getenv("SMTP_POOL_SIZE", str(WORKERS)))
+BATCH_SIZE = int(os.getenv("NOTIFY_BATCH_SIZE", "50"))  # students per claim
+POLL_INTERVAL = float(os.getenv("NOTIFY_POLL_SECONDS", "5"))
+DIGEST_SECONDS = float(os.getenv("NOTIFY_DIGEST_SECONDS", "1800"))
+LEASE_SECONDS = float(os.getenv("NOTIFY_LEASE_SECONDS", "600"))
+MAX_ATTEMPTS = int(os.getenv("NOTIFY_MAX_ATTEMPTS", "8"))
+RETRY_BASE_SECONDS = float(os.getenv("NOTIFY_RETRY_BASE_SECONDS", "60"))
+RETRY_MAX_SECONDS = float(os.getenv("NOTIFY_RETRY_MAX_SECONDS", "3600"))
+
+# Outbox row states
+PENDING = "pending"
+SENDING = "sending"
+SENT = "sent"
+FAILED = "failed"
+
+@register_finalizer
+def queue_absence_notifications(db: Session, session: DBSession):
+    """Queue a notice for each absentee of the closing session, in its transaction"""
+    if not ENABLED:
+        return
+    now = datetime.utcnow()
+    recipient = func.coalesce(func.nullif(Student.guardian_email, ""), func.nullif(Student.email, ""))
+    rows = select(
+        Absence.student_id, Absence.session_id, recipient, literal(PENDING), literal(0),
+        literal(now + timedelta(seconds=DIGEST_SECONDS), Notification.next_attempt_at.type),
+        literal(now, Notification.created_at.type)
+    ).join(Student, Student.id == Absence.student_id).where(
+        Absence.session_id == session.id, recipient.isnot(None)
+    )
+    queued = db.execute(insert(Notification).from_select(
+        ["student_id", "session_id", "recipient", "status", "attempts", "next_attempt_at", "created_at"], rows
+    )).rowcount
+    if queued:
+        notifications.inc("queued", amount=queued)
+
+def retry_delay(attempts: int) -> float:
+    """Exponential backoff after the given number of failed attempts, with jitter"""
+    delay = min(RETRY_MAX_SECONDS, RETRY_BASE_SECONDS * 2 ** (attempts - 1))
+    return delay * random.uniform(0.5, 1.0)
+
+def is_permanent(error: Exception) -> bool:
+    """True for refusals that retrying won't fix"""
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return all(code >= 500 for code, _ in error.recipients.values())
+    if isinstance(error, smtplib.SMTPDataError):
+        return error.smtp_code >= 500
+    return False
+
+class SMTPPool:
+    """SMTP connections reused across digests; at most size are kept open"""
+    def __init__(self, host: str = None, port: int = None, size: int = None, timeout: float = SMTP_TIMEOUT,
+                 username: str = SMTP_USERNAME, password: str = SMTP_PASSWORD,
+                 starttls: bool = SMTP_STARTTLS, use_ssl: bool = SMTP_SSL):
+        self.host = SMTP_HOST if host is None else host
+        self.port = SMTP_PORT if port is None else port
+        self.timeout = timeout
+        self.username = username
+        self.password = password
+        self.starttls = starttls
+        self.use_ssl = use_ssl
+        # Most recently used first, so surplus connections are the ones left to time out
+        self._idle: "queue.LifoQueue[smtplib.SMTP]" = queue.LifoQueue(maxsize=SMTP_POOL_SIZE if size is None else size)
+
+    def _connect(self) -> smtplib.SMTP:
+        if self.use_ssl:
+            smtp = smtplib.SMTP_SSL(self.host, self.port, timeout=self.timeout, context=ssl.create_default_context())
+        else:
+            smtp = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+            if self.starttls:
+                smtp.starttls(context=ssl.create_default_context())
+        if self.username:
+            smtp.login(self.username, self.password)
+        return smtp
+
+    @staticmethod
+    def _close(smtp: smtplib.SMTP):
+        try:
+            smtp.quit()
+        except Exception:
+            smtp.close()
+
+    def send(self, message: EmailMessage):
+        while True:
+            try:
+                smtp, reused = self._idle.get_nowait(), True
+            except queue.Empty:
+                smtp, reused = self._connect(), False
+            try:
+                smtp.send_message(message)
+            except smtplib.SMTPServerDisconnected:
+                self._close(smtp)
+                # An idle connection the server has since dropped; try the next one
+                if reused:
+                    continue
+                raise
+            except (smtplib.SMTPResponseException, smtplib.SMTPRecipientsRefused):
+                # Refused, but the session was reset and can be reused
+                self._release(smtp)
+                raise
+            except Exception:
+                self._close(smtp)
+                raise
+            self._release(smtp)
+            return
+
+    def _release(self, smtp: smtplib.SMTP):
+        try:
+            self._idle.put_nowait(smtp)
+        except queue.Full:
+            self._close(smtp)
+
+    def close(self):
+        while True:
+            try:
+                self._close(self._idle.get_nowait())
+            except queue.Empty:
+                return
+
+def build_digest(student: Student, recipient: str, absences: list) -> EmailMessage:
+    """One email listing every (session, teacher name) a student missed"""
+    lines = []
+    for session, teacher_name in absences:
+        started = session.scheduled_start or session.generated_at
+        local = started.replace(tzinfo=timezone.utc).astimezone(TIMETABLE_TIMEZONE)
+        section = f" {session.section}" if session.section else ""
+        lines.append(
+            f"  - {local:%a %d %b %Y %H:%M}  {session.subject} ({session.class_name}{section}), {teacher_name}"
+        )
+    count = len(absences)
+    message = EmailMessage()
+    message["From"] = NOTIFY_FROM
+    message["To"] = recipient
+    message["Subject"] = f"Absence notice: {student.name} ({student.roll_no})"
+    message["Message-ID"] = make_msgid(domain=NOTIFY_FROM.rpartition("@")[2] or None)
+    message.set_content(
+        "Dear parent/guardian,\n\n"
+        f"{student.name} (roll no. {student.roll_no}) was marked absent from "
+        f"{'the following lecture' if count == 1 else f'the following {count} lectures'}:\n\n"
+        + "\n".join(lines) +
+        "\n\nThis is an automated message from the College Attendance System.\n"
+    )
+    return message
+
+def claim_batch(db: Session, batch_size: int = BATCH_SIZE) -> Optional[str]:
+    """Lease every pending row of up to batch_size students with a row due; returns the claim token"""
+    now = datetime.utcnow()
+    expired = and_(Notification.status == SENDING, Notification.claimed_until <= now)
+    students = [student_id for student_id, in db.query(Notification.student_id).filter(
+        or_(and_(Notification.status == PENDING, Notification.next_attempt_at <= now), expired)
+    ).group_by(Notification.student_id).order_by(func.min(Notification.next_attempt_at)).limit(batch_size)]
+    if not students:
+        db.rollback()
+        return None
+
+    # Rows of these students not yet due ride along in their digest; rows another
+    # worker claimed since the query above no longer match
+    token = uuid.uuid4().hex
+    claimed = db.execute(
+        update(Notification)
+        .where(Notification.student_id.in_(students), or_(Notification.status == PENDING, expired))
+        .values(status=SENDING, claim_token=token, claimed_until=now + timedelta(seconds=LEASE_SECONDS))
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    db.commit()
+    return token if claimed else None
+
+def _finish(db: Session, token: str, ids: List[int], **values):
+    db.execute(
+        update(Notification)
+        .where(Notification.id.in_(ids), Notification.claim_token == token)
+        .values(claim_token=None, claimed_until=None, **values)
+        .execution_options(synchronize_session=False)
+    )
+    db.commit()
+
+def deliver_batch(db: Session, pool: SMTPPool, batch_size: int = BATCH_SIZE) -> Dict[str, int]:
+    """Claim a batch and send each student one digest; returns outbox row counts by outcome"""
+    results = {"sent": 0, "retried": 0, "failed": 0}
+    token = claim_batch(db, batch_size)
+    if token is None:
+        return results
+
+    rows = db.query(Notification, Student, DBSession, Teacher.name).join(
+        Student, Student.id == Notification.student_id
+    ).join(DBSession, DBSession.id == Notification.session_id).join(
+        Teacher, Teacher.id == DBSession.teacher_id
+    ).filter(Notification.claim_token == token).order_by(
+        Notification.student_id, DBSession.generated_at
+    ).all()
+    digests: Dict[int, list] = {}
+    for row in rows:
+        digests.setdefault(row[0].student_id, []).append(row)
+
+    for items in digests.values():
+        ids = [notification.id for notification, _, _, _ in items]
+        student = items[0][1]
+        # The newest row has the current address if it changed in between
+        recipient = max(items, key=lambda item: item[0].id)[0].recipient
+        attempts = max(notification.attempts for notification, _, _, _ in items) + 1
+        try:
+            pool.send(build_digest(student, recipient, [(session, teacher) for _, _, session, teacher in items]))
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"[:255]
+            if is_permanent(e) or attempts >= MAX_ATTEMPTS:
+                logger.warning("Giving up on absence digest for student %s after %d attempts: %s",
+                               student.id, attempts, error)
+                _finish(db, token, ids, status=FAILED, attempts=attempts, last_error=error)
+                outcome = "failed"
+            else:
+                retry_at = datetime.utcnow() + timedelta(seconds=retry_delay(attempts))
+                _finish(db, token, ids, status=PENDING, attempts=attempts, next_attempt_at=retry_at,
+                        last_error=error)
+                outcome = "retried"
+        else:
+            _finish(db, token, ids, status=SENT, attempts=attempts, sent_at=datetime.utcnow(), last_error=None)
+            outcome = "sent"
+        results[outcome] += len(ids)
+        notifications.inc(outcome, amount=len(ids))
+        notification_digests.inc(outcome)
+    return results
+
+def deliver_once(pool: SMTPPool, batch_size: int = BATCH_SIZE) -> int:
+    """Deliver one batch per college; returns how many outbox rows were processed"""
+    processed = 0
+    for tenant in all_tenants():
+        try:
+            with use_tenant(tenant), job_session() as db:
+                processed += sum(deliver_batch(db, pool, batch_size).values())
+        except Exception:
+            logger.exception("Notification delivery for %s failed", tenant)
+    return processed
+
+async def run_delivery(pool: SMTPPool, interval: float = POLL_INTERVAL):
+    """Deliver due notifications until cancelled, polling every interval seconds when idle"""
+    while True:
+        try:
+            processed = await asyncio.to_thread(deliver_once, pool)
+        except Exception:
+            logger.exception("Notification delivery failed")
+            processed = 0
+        if not processed:
+            await asyncio.sleep(interval)
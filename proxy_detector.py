@@ -0,0 +1,155 @@
+"""
+Proxy-attendance detection
+
+One phone scanning for several classmates shows up as many distinct roll
+numbers behind the same device fingerprint (client IP + user agent).
+
+The session attendance view flags such devices with clusters(), which counts
+distinct students per fingerprint exactly from the rows the view already
+loaded, so every worker shows the same flags.
+
+Separately, observe() raises an alert at scan time, logged and counted in
+attendance_proxy_flags_total, without reading `attendances`. For every
+session it keeps a count-min grid of small HyperLogLog sketches: each
+fingerprint hashes to one cell per row, each cell estimates the distinct
+roll numbers seen in it, and the minimum over the rows is the fingerprint's
+estimate. Memory per session is fixed (depth x width x registers bytes)
+whatever the number of scans. The sketches are per process and feed only
+this alert: with several workers each one sees only the scans it handled,
+so the alert is a best effort.
+"""
+import hashlib
+import logging
+import math
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, Iterable, Optional, Tuple
+
+from college_attendance.services.metrics import proxy_flags
+from college_attendance.services.tenancy import current_tenant
+
+logger = logging.getLogger("college_attendance.proxy_detector")
+
+CLUSTER_THRESHOLD = int(os.getenv("PROXY_CLUSTER_THRESHOLD", "4"))
+MAX_SESSIONS = int(os.getenv("PROXY_MAX_SESSIONS", "256"))
+# 3 x 512 cells of 16 one-byte registers: 24 KiB per tracked session. Wide
+# enough that a few hundred single-student devices rarely share cells, and
+# small cardinalities are estimated by linear counting.
+SKETCH_DEPTH = 3
+SKETCH_WIDTH = 512
+HLL_PRECISION = 4
+
+def fingerprint(ip_address: Optional[str], user_agent: Optional[str]) -> Optional[str]:
+    """Short device fingerprint of a scan, or None when neither IP nor user agent is known"""
+    if not ip_address and not user_agent:
+        return None
+    key = f"{ip_address or ''}|{user_agent or ''}".encode()
+    return hashlib.blake2b(key, digest_size=6).hexdigest()
+
+def _hash64(value: str, salt: bytes = b"") -> int:
+    return int.from_bytes(hashlib.blake2b(value.encode(), digest_size=8, salt=salt).digest(), "big")
+
+class DistinctCountSketch:
+    """Count-min grid of HyperLogLog registers: approximate distinct items per key"""
+    def __init__(self, depth: int = SKETCH_DEPTH, width: int = SKETCH_WIDTH, precision: int = HLL_PRECISION):
+        self.depth = depth
+        self.width = width
+        self.precision = precision
+        self.registers = 1 << precision
+        self.alpha = 0.7213 / (1 + 1.079 / self.registers)
+        self._cells = bytearray(depth * width * self.registers)
+        self._salts = [row.to_bytes(2, "big") for row in range(depth)]
+
+    def _offsets(self, key: str):
+        for row, salt in enumerate(self._salts):
+            column = _hash64(key, salt) % self.width
+            yield (row * self.width + column) * self.registers
+
+    def add(self, key: str, item: str) -> int:
+        """Record item under key and return the new distinct estimate for key"""
+        hashed = _hash64(item)
+        index = hashed >> (64 - self.precision)
+        rest = hashed & ((1 << (64 - self.precision)) - 1)
+        rank = (64 - self.precision) - rest.bit_length() + 1
+        for offset in self._offsets(key):
+            if self._cells[offset + index] < rank:
+                self._cells[offset + index] = rank
+        return self.estimate(key)
+
+    def _cell_estimate(self, offset: int) -> float:
+        cell = self._cells[offset:offset + self.registers]
+        raw = self.alpha * self.registers ** 2 / sum(2.0 ** -r for r in cell)
+        zeros = cell.count(0)
+        if raw <= 2.5 * self.registers and zeros:
+            # Linear counting is much more accurate for the small counts that matter here
+            return self.registers * math.log(self.registers / zeros)
+        return raw
+
+    def estimate(self, key: str) -> int:
+        return int(round(min(self._cell_estimate(offset) for offset in self._offsets(key))))
+
+    @property
+    def memory_bytes(self) -> int:
+        return len(self._cells)
+
+class SessionTracker:
+    """Sketch and flagged fingerprints for one session"""
+    def __init__(self):
+        self.sketch = DistinctCountSketch()
+        self.flagged: Dict[str, int] = {}
+
+class ProxyDetector:
+    def __init__(self, threshold: int = CLUSTER_THRESHOLD, max_sessions: int = MAX_SESSIONS):
+        self.threshold = threshold
+        self.max_sessions = max_sessions
+        # Keyed by (tenant, session id): session ids repeat across colleges' databases
+        self._sessions: "OrderedDict[Tuple[str, int], SessionTracker]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _tracker(self, session_id: int, create: bool = True) -> Optional[SessionTracker]:
+        key = (current_tenant(), session_id)
+        tracker = self._sessions.get(key)
+        if tracker is None and create:
+            tracker = self._sessions[key] = SessionTracker()
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+        elif tracker is not None:
+            self._sessions.move_to_end(key)
+        return tracker
+
+    def observe(self, session_id: int, roll_no: str, ip_address: Optional[str], user_agent: Optional[str]) -> bool:
+        """Feed one accepted scan; True if its fingerprint is (now) a suspected proxy cluster"""
+        key = fingerprint(ip_address, user_agent)
+        if key is None:
+            return False
+        with self._lock:
+            tracker = self._tracker(session_id)
+            estimate = tracker.sketch.add(key, roll_no)
+            if estimate < self.threshold:
+                return False
+            newly_flagged = key not in tracker.flagged
+            tracker.flagged[key] = estimate
+        if newly_flagged:
+            proxy_flags.inc()
+            logger.warning(
+                "Possible proxy attendance in session %s: ~%d students from %s (%s)",
+                session_id, estimate, ip_address, (user_agent or "")[:80]
+            )
+        return True
+
+    def clusters(self, scans: Iterable[Tuple[str, Optional[str], Optional[str]]]) -> Dict[str, int]:
+        """Fingerprints behind at least threshold distinct students, counted exactly from a
+        session's (roll_no, ip, user agent) rows the caller already loaded"""
+        students: Dict[str, set] = {}
+        for roll_no, ip_address, user_agent in scans:
+            key = fingerprint(ip_address, user_agent)
+            if key is not None:
+                students.setdefault(key, set()).add(roll_no)
+        return {key: len(rolls) for key, rolls in students.items() if len(rolls) >= self.threshold}
+
+    def forget(self, session_id: int):
+        with self._lock:
+            self._sessions.pop((current_tenant(), session_id), None)
+
+detector = ProxyDetector()
@@ -1,10 +1,10 @@
-import qrcode
 import base64
 import io
 import json
 from datetime import datetime, timedelta
 from typing import Dict, Any
 import uuid
+from college_attendance.services.metrics import qr_render, timed
 
 class QRGenerator:
     @staticmethod
@@ -18,10 +18,12 @@ class QRGenerator:
         subject: str,
         class_name: str,
         section: str = None,
-        duration_minutes: int = 10
+        duration_minutes: int = 10,
+        expires_at: datetime = None
     ) -> Dict[str, Any]:
         """Create session data for QR code"""
-        expires_at = datetime.utcnow() + timedelta(minutes=duration_minutes)
+        if expires_at is None:
+            expires_at = datetime.utcnow() + timedelta(minutes=duration_minutes)
         
         session_data = {
             "session_token": session_token,
@@ -40,23 +42,27 @@ class QRGenerator:
         # Convert session data to JSON string
         qr_data = json.dumps(session_data, separators=(',', ':'))
         
-        # Create QR code
-        qr = qrcode.QRCode(
-            version=1,
-            error_correction=qrcode.constants.ERROR_CORRECT_L,
-            box_size=10,
-            border=4,
-        )
-        qr.add_data(qr_data)
-        qr.make(fit=True)
+        # qrcode/PIL are imported on first use to keep app startup fast
+        import qrcode
         
-        # Create QR code image
-        img = qr.make_image(fill_color="black", back_color="white")
+        with timed(qr_render):
+            # Create QR code
+            qr = qrcode.QRCode(
+                version=1,
+                error_correction=qrcode.constants.ERROR_CORRECT_L,
+                box_size=10,
+                border=4,
+            )
+            qr.add_data(qr_data)
+            qr.make(fit=True)
         
-        # Convert to base64
-        buffer = io.BytesIO()
-        img.save(buffer, format='PNG')
-        buffer.seek(0)
+            # Create QR code image
+            img = qr.make_image(fill_color="black", back_color="white")
+        
+            # Convert to base64
+            buffer = io.BytesIO()
+            img.save(buffer, format='PNG')
+            buffer.seek(0)
         
         # Encode to base64
         img_str = base64.b64encode(buffer.getvalue()).decode()
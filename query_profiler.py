@@ -0,0 +1,170 @@
+"""
+Per-request SQL profiler for spotting N+1 query patterns
+
+When QUERY_PROFILER is enabled every statement issued while handling a
+request is recorded and grouped by its normalized shape (literals and IN
+lists collapsed). Shapes repeated at least QUERY_PROFILER_THRESHOLD times
+are reported in the X-Query-Repeated response header and logged. Nothing
+is attached to the engine or the app when the profiler is disabled.
+
+Tests can assert query budgets with capture_queries() / query_budget().
+"""
+import hashlib
+import logging
+import os
+import re
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import List, Optional, Tuple
+
+from sqlalchemy import event
+
+logger = logging.getLogger("college_attendance.query_profiler")
+
+ENABLED = os.getenv("QUERY_PROFILER", "").lower() in ("1", "true", "yes")
+REPEAT_THRESHOLD = int(os.getenv("QUERY_PROFILER_THRESHOLD", "5"))
+
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r"\b\d+(?:\.\d+)?\b")
+_IN_LIST = re.compile(r"\bIN\s*\(\s*(?:\?|%\(\w+\)s|:\w+|\$\d+)(?:\s*,\s*(?:\?|%\(\w+\)s|:\w+|\$\d+))*\s*\)", re.I)
+_PLACEHOLDER = re.compile(r"%\(\w+\)s|:\w+|\$\d+")
+_WHITESPACE = re.compile(r"\s+")
+
+def normalize_statement(statement: str) -> str:
+    """Reduce a SQL statement to its shape so repeated executions group together"""
+    shape = _STRING_LITERAL.sub("?", statement)
+    shape = _PLACEHOLDER.sub("?", shape)
+    shape = _NUMBER_LITERAL.sub("?", shape)
+    shape = _IN_LIST.sub("IN (?)", shape)
+    return _WHITESPACE.sub(" ", shape).strip()
+
+def fingerprint(shape: str) -> str:
+    return hashlib.sha1(shape.encode()).hexdigest()[:8]
+
+class QueryProfile:
+    """Statements recorded during one request or capture block"""
+    def __init__(self):
+        self.statements: List[str] = []
+        self.duration = 0.0
+
+    def record(self, statement: str, elapsed: float):
+        self.statements.append(statement)
+        self.duration += elapsed
+
+    @property
+    def count(self) -> int:
+        return len(self.statements)
+
+    def shapes(self) -> Counter:
+        return Counter(normalize_statement(statement) for statement in self.statements)
+
+    def repeated(self, threshold: int = REPEAT_THRESHOLD) -> List[Tuple[str, int]]:
+        """Shapes executed at least threshold times, most frequent first"""
+        return [(shape, count) for shape, count in self.shapes().most_common() if count >= threshold]
+
+# Profile of the request being handled, set by the middleware
+_current: ContextVar[Optional[QueryProfile]] = ContextVar("query_profile", default=None)
+# Open capture_queries() blocks; process-wide because test clients run the
+# app in another thread where the caller's context is not visible
+_captures: List[QueryProfile] = []
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("profiler_started", []).append(time.perf_counter())
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info["profiler_started"].pop()
+    profile = _current.get()
+    if profile is not None:
+        profile.record(statement, elapsed)
+    for capture in _captures:
+        capture.record(statement, elapsed)
+
+def attach(engine):
+    """Record statements on this engine into the active profile"""
+    if not event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+def detach(engine):
+    if event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+        event.remove(engine, "before_cursor_execute", _before_cursor_execute)
+        event.remove(engine, "after_cursor_execute", _after_cursor_execute)
+
+class QueryProfilerMiddleware:
+    """ASGI middleware reporting per-request query counts and repeated shapes"""
+    def __init__(self, app, threshold: int = REPEAT_THRESHOLD):
+        self.app = app
+        self.threshold = threshold
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        profile = QueryProfile()
+        token = _current.set(profile)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                headers = list(message.get("headers", []))
+                headers.append((b"x-query-count", str(profile.count).encode()))
+                headers.append((b"x-query-time-ms", f"{profile.duration * 1000:.2f}".encode()))
+                repeated = profile.repeated(self.threshold)
+                if repeated:
+                    headers.append((b"x-query-repeated", ", ".join(
+                        f"{fingerprint(shape)}={count}" for shape, count in repeated
+                    ).encode()))
+                    for shape, count in repeated:
+                        logger.warning(
+                            "Possible N+1 on %s %s: %d x [%s] %s",
+                            scope.get("method"), scope.get("path"), count, fingerprint(shape), shape[:200]
+                        )
+                message["headers"] = headers
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _current.reset(token)
+
+def install(app, engine, enabled: bool = ENABLED):
+    """Enable per-request profiling on an app and its engine when configured"""
+    if not enabled:
+        return
+    attach(engine)
+    app.add_middleware(QueryProfilerMiddleware)
+
+@contextmanager
+def capture_queries(engine=None):
+    """Record every statement issued inside the block
+
+        with capture_queries() as profile:
+            client.get("/teacher/sessions")
+        assert profile.count <= 3
+    """
+    if engine is None:
+        from college_attendance.database import engine
+    was_attached = event.contains(engine, "before_cursor_execute", _before_cursor_execute)
+    attach(engine)
+    profile = QueryProfile()
+    _captures.append(profile)
+    try:
+        yield profile
+    finally:
+        _captures.remove(profile)
+        if not was_attached:
+            detach(engine)
+
+@contextmanager
+def query_budget(max_queries: int, max_repeats: Optional[int] = None, engine=None):
+    """Fail with AssertionError if the block exceeds its query budget"""
+    with capture_queries(engine) as profile:
+        yield profile
+    assert profile.count <= max_queries, (
+        f"Query budget exceeded: {profile.count} > {max_queries}\n" + "\n".join(profile.statements)
+    )
+    if max_repeats is not None:
+        repeated = profile.repeated(max_repeats + 1)
+        assert not repeated, f"Repeated query shapes over {max_repeats}: {repeated}"
@@ -0,0 +1,248 @@
+#!/usr/bin/env python3
+"""
+Local Redis stand-in for the shared state backend
+
+A small asyncio server speaking the Redis protocol (RESP2), implementing the
+commands the RedisBackend client uses: PING, AUTH, SELECT, GET, SET (EX/PX),
+DEL, SADD, SREM, SISMEMBER, INCRBY, EXPIRE/PEXPIRE, PUBLISH and SUBSCRIBE.
+Use it to run several workers with STATE_BACKEND=redis://... on a machine
+without Redis:
+    python redis_standin.py --port 6390
+    STATE_BACKEND=redis://localhost:6390/0 python run.py
+
+--check runs the state backend conformance checks against the memory,
+SQLite and Redis backends (the latter against an in-process stand-in) and
+exits non-zero on failure (test_checks.py runs it under pytest):
+    python redis_standin.py --check
+"""
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import argparse
+import asyncio
+import tempfile
+import threading
+import time
+from collections import defaultdict
+
+class StandInServer:
+    def __init__(self):
+        self.values = {}
+        self.expires = {}
+        self.channels = defaultdict(set)
+
+    def _live(self, key):
+        expires = self.expires.get(key)
+        if expires is not None and expires <= time.monotonic():
+            self.values.pop(key, None)
+            self.expires.pop(key, None)
+        return self.values.get(key)
+
+    def _expire(self, key, ms):
+        if key in self.values:
+            self.expires[key] = time.monotonic() + ms / 1000
+            return 1
+        return 0
+
+    def execute(self, args, writer):
+        """Reply to one command: an int, str, None, list, Exception or b"+OK" style status"""
+        name = args[0].upper()
+        if name in ("PING", "AUTH", "SELECT"):
+            return b"PONG" if name == "PING" else b"OK"
+        if name == "GET":
+            value = self._live(args[1])
+            if isinstance(value, set):
+                return Exception("WRONGTYPE Operation against a key holding the wrong kind of value")
+            return value
+        if name == "SET":
+            self.values[args[1]] = args[2]
+            self.expires.pop(args[1], None)
+            options = [arg.upper() for arg in args[3:]]
+            if "PX" in options:
+                self._expire(args[1], int(args[3 + options.index("PX") + 1]))
+            elif "EX" in options:
+                self._expire(args[1], int(args[3 + options.index("EX") + 1]) * 1000)
+            return b"OK"
+        if name == "DEL":
+            removed = sum(1 for key in args[1:] if self._live(key) is not None)
+            for key in args[1:]:
+                self.values.pop(key, None)
+                self.expires.pop(key, None)
+            return removed
+        if name in ("SADD", "SREM", "SISMEMBER"):
+            members = self._live(args[1])
+            if members is None:
+                members = self.values[args[1]] = set()
+            present = args[2] in members
+            if name == "SADD":
+                members.add(args[2])
+                return 0 if present else 1
+            if name == "SREM":
+                members.discard(args[2])
+            return 1 if present else 0
+        if name == "INCRBY":
+            value = int(self._live(args[1]) or 0) + int(args[2])
+            self.values[args[1]] = str(value)
+            return value
+        if name in ("EXPIRE", "PEXPIRE"):
+            self._live(args[1])
+            return self._expire(args[1], int(args[2]) * (1000 if name == "EXPIRE" else 1))
+        if name == "PUBLISH":
+            subscribers = list(self.channels.get(args[1], ()))
+            for subscriber in subscribers:
+                subscriber.write(encode(["message", args[1], args[2]]))
+            return len(subscribers)
+        if name == "SUBSCRIBE":
+            for i, channel in enumerate(args[1:], 1):
+                self.channels[channel].add(writer)
+                writer.write(encode(["subscribe", channel, i]))
+            return NotImplemented
+        return Exception(f"ERR unknown command '{args[0]}'")
+
+    async def handle(self, reader, writer):
+        try:
+            while True:
+                args = await read_command(reader)
+                if args is None:
+                    break
+                reply = self.execute(args, writer)
+                if reply is not NotImplemented:
+                    writer.write(encode(reply))
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            for subscribers in self.channels.values():
+                subscribers.discard(writer)
+            writer.close()
+
+async def read_command(reader):
+    line = await reader.readline()
+    if not line:
+        return None
+    count = int(line[1:-2])
+    args = []
+    for _ in range(count):
+        length = int((await reader.readline())[1:-2])
+        args.append((await reader.readexactly(length + 2))[:-2].decode())
+    return args
+
+def encode(value) -> bytes:
+    if isinstance(value, bytes):
+        return b"+" + value + b"\r\n"
+    if isinstance(value, Exception):
+        return b"-" + str(value).encode() + b"\r\n"
+    if isinstance(value, int):
+        return b":%d\r\n" % value
+    if value is None:
+        return b"$-1\r\n"
+    if isinstance(value, list):
+        return b"*%d\r\n" % len(value) + b"".join(encode(item if isinstance(item, int) else str(item)) for item in value)
+    data = str(value).encode()
+    return b"$%d\r\n%s\r\n" % (len(data), data)
+
+async def serve(host: str, port: int, ready: threading.Event = None):
+    server = await asyncio.start_server(StandInServer().handle, host, port)
+    if ready is not None:
+        ready.port = server.sockets[0].getsockname()[1]
+        ready.set()
+    async with server:
+        await server.serve_forever()
+
+def start_in_thread(host: str = "127.0.0.1", port: int = 0) -> int:
+    """Run a stand-in on a background thread; returns its port"""
+    ready = threading.Event()
+    threading.Thread(target=lambda: asyncio.run(serve(host, port, ready)), daemon=True).start()
+    ready.wait(5)
+    return ready.port
+
+def check_backend(checks, make_backend):
+    """Conformance checks for one backend, recorded in checks"""
+    expect = checks.expect
+    backend, other = make_backend(), make_backend()
+    try:
+        backend.set("k", {"a": 1})
+        expect("get", other.get("k"), {"a": 1})
+        expect("missing", backend.get("nope"), None)
+        backend.set("short", "v", ttl=0.2)
+        expect("ttl before", other.get("short"), "v")
+        time.sleep(0.3)
+        expect("ttl after", other.get("short"), None)
+        backend.delete("k")
+        expect("delete", other.get("k"), None)
+
+        expect("sadd new", backend.add_to_set("s", "x", ttl=5), True)
+        expect("sadd dup (other worker)", other.add_to_set("s", "x", ttl=5), False)
+        backend.remove_from_set("s", "x")
+        expect("sadd after remove", other.add_to_set("s", "x"), True)
+
+        expect("incr", backend.incr("c", ttl=5), 1)
+        expect("incr other", other.incr("c", 4), 5)
+
+        # Only one of many concurrent adders may win
+        wins = []
+        def race():
+            wins.append(make_backend().add_to_set("race", "roll-1"))
+        threads = [threading.Thread(target=race) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        expect("concurrent sadd winners", wins.count(True), 1)
+
+        received = threading.Event()
+        messages = []
+        def on_message(message):
+            messages.append(message)
+            received.set()
+        unsubscribe = other.subscribe("events", on_message)
+        time.sleep(0.2)
+        backend.publish("events", {"session_id": 7})
+        received.wait(3)
+        expect("pubsub", messages, [{"session_id": 7}])
+        unsubscribe()
+    except Exception as e:
+        checks.fail(f"error: {e!r}")
+    finally:
+        backend.close()
+        other.close()
+
+def run_checks() -> int:
+    from checks import Checks
+    from college_attendance.services.state_backend import MemoryBackend, RedisBackend, SQLiteBackend
+
+    memory = MemoryBackend()
+    # Both "workers" share one memory backend: it is process-local by design
+    memory.close = lambda: None
+    path = os.path.join(tempfile.mkdtemp(), "state.db")
+    port = start_in_thread()
+    backends = {
+        "memory": lambda: memory,
+        "sqlite": lambda: SQLiteBackend(path, poll_interval=0.05),
+        "redis": lambda: RedisBackend(f"redis://127.0.0.1:{port}/0"),
+    }
+    failed = 0
+    for name, make_backend in backends.items():
+        checks = Checks(name)
+        check_backend(checks, make_backend)
+        failed += bool(checks.report())
+    return failed
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Local Redis stand-in for the state backend")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=6390)
+    parser.add_argument("--check", action="store_true", help="Run the state backend conformance checks and exit")
+    args = parser.parse_args(argv)
+
+    if args.check:
+        sys.exit(1 if run_checks() else 0)
+    print(f"Redis stand-in listening on {args.host}:{args.port}")
+    try:
+        asyncio.run(serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
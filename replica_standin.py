@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+"""
+Local read-replica stand-in for SQLite
+
+Keeps a second SQLite file in sync with the primary by copying it with the
+SQLite online backup API every --interval seconds, so reads from it lag the
+primary the way a real replica would. Point DATABASE_READ_URLS at the copy
+to exercise read/write routing on one machine:
+    python replica_standin.py --primary college_attendance.db --replica replica.db
+    DATABASE_READ_URLS=sqlite:///./replica.db python run.py
+
+--once copies a single time and exits.
+"""
+import argparse
+import sqlite3
+import time
+
+def sync(primary: sqlite3.Connection, replica: sqlite3.Connection) -> float:
+    """Copy the primary onto the replica; returns seconds taken"""
+    started = time.perf_counter()
+    primary.backup(replica)
+    return time.perf_counter() - started
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Keep a SQLite replica in sync with the primary")
+    parser.add_argument("--primary", default="college_attendance.db")
+    parser.add_argument("--replica", default="replica.db")
+    parser.add_argument("--interval", type=float, default=1.0, help="Seconds between syncs (replication lag)")
+    parser.add_argument("--once", action="store_true", help="Sync once and exit")
+    args = parser.parse_args(argv)
+
+    primary = sqlite3.connect(args.primary, timeout=10)
+    replica = sqlite3.connect(args.replica, timeout=10)
+    print(f"Replicating {args.primary} -> {args.replica} every {args.interval}s")
+    try:
+        while True:
+            try:
+                elapsed = sync(primary, replica)
+            except sqlite3.OperationalError as e:
+                print(f"WARNING: sync failed, retrying: {e}")
+            else:
+                if args.once:
+                    print(f"Synced in {elapsed * 1000:.1f} ms")
+                    return
+            time.sleep(args.interval)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        primary.close()
+        replica.close()
+
+if __name__ == "__main__":
+    main()
@@ -54,8 +54,10 @@ def main():
         if not run_command("pip install -r requirements.txt", "Installing dependencies"):
             return
     
-    # Seed the database
+    # Create or update the schema, then seed the database
     print("\nSetting up database...")
+    if not run_command("python migrate.py", "Migrating database"):
+        return
     if not run_command("python seed_data.py", "Seeding database"):
         print("WARNING: Database seeding failed, but continuing...")
     
@@ -0,0 +1,194 @@
+"""
+On-demand sampling profiler for production requests
+
+A background thread samples every thread's Python stack at a fixed
+interval and aggregates them in the collapsed "folded" format used by
+flamegraph.pl, speedscope and inferno. Profiles are captured either for a
+single request carrying a valid signed X-Profile header, or for the whole
+process for N seconds via the admin API, and kept in a small in-memory store.
+
+Nothing is installed unless PROFILER_SECRET is set, so the request path
+carries no cost when profiling is disabled.
+"""
+import asyncio
+import hashlib
+import hmac
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import Counter, OrderedDict
+from typing import Dict, List, Optional
+
+PROFILER_SECRET = os.getenv("PROFILER_SECRET", "")
+SAMPLE_INTERVAL = float(os.getenv("PROFILER_INTERVAL_MS", "5")) / 1000
+MAX_PROFILES = int(os.getenv("PROFILER_KEEP", "10"))
+MAX_SECONDS = 120
+SIGNATURE_TTL = 300
+
+# Leaf functions where a thread is waiting rather than running Python code;
+# "cpu" mode drops those samples to approximate an on-CPU profile
+IDLE_FUNCTIONS = {
+    "select", "poll", "epoll", "kqueue", "wait", "acquire", "sleep",
+    "_worker", "get", "accept", "recv", "recv_into", "readinto", "run_forever",
+}
+
+class Profile:
+    def __init__(self, kind: str, label: str, mode: str):
+        self.id = uuid.uuid4().hex[:12]
+        self.kind = kind
+        self.label = label
+        self.mode = mode
+        self.started_at = time.time()
+        self.duration = 0.0
+        self.samples = 0
+        self.stacks: Counter = Counter()
+        self.done = False
+
+    def folded(self) -> str:
+        """Collapsed stacks, one "frame;frame;frame count" line per stack"""
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+    def summary(self) -> Dict:
+        return {
+            "id": self.id,
+            "kind": self.kind,
+            "label": self.label,
+            "mode": self.mode,
+            "started_at": self.started_at,
+            "duration_s": round(self.duration, 3),
+            "samples": self.samples,
+            "done": self.done,
+        }
+
+class ProfileStore:
+    """The most recent profiles, oldest evicted first"""
+    def __init__(self, limit: int = MAX_PROFILES):
+        self.limit = limit
+        self._profiles: "OrderedDict[str, Profile]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def add(self, profile: Profile):
+        with self._lock:
+            self._profiles[profile.id] = profile
+            while len(self._profiles) > self.limit:
+                self._profiles.popitem(last=False)
+
+    def get(self, profile_id: str) -> Optional[Profile]:
+        return self._profiles.get(profile_id)
+
+    def list(self) -> List[Dict]:
+        return [profile.summary() for profile in reversed(self._profiles.values())]
+
+store = ProfileStore()
+
+def _collapse(frame, thread_name: str) -> str:
+    stack = []
+    while frame is not None:
+        code = frame.f_code
+        stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+        frame = frame.f_back
+    stack.append(thread_name)
+    return ";".join(reversed(stack))
+
+class Sampler(threading.Thread):
+    """Samples all other threads' stacks into a Profile until stopped"""
+    def __init__(self, profile: Profile, interval: float = SAMPLE_INTERVAL):
+        super().__init__(name="sampling-profiler", daemon=True)
+        self.profile = profile
+        self.interval = interval
+        self._stop_event = threading.Event()
+
+    def run(self):
+        started = time.perf_counter()
+        names = {}
+        while not self._stop_event.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == self.ident:
+                    continue
+                if self.profile.mode == "cpu" and frame.f_code.co_name in IDLE_FUNCTIONS:
+                    continue
+                if thread_id not in names:
+                    names = {t.ident: t.name for t in threading.enumerate()}
+                self.profile.stacks[_collapse(frame, names.get(thread_id, str(thread_id)))] += 1
+            self.profile.samples += 1
+        self.profile.duration = time.perf_counter() - started
+        self.profile.done = True
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+def profile_process(seconds: float, mode: str = "wall") -> Profile:
+    """Start sampling the whole process for a number of seconds in the background"""
+    profile = Profile("process", f"process {seconds:g}s", mode)
+    store.add(profile)
+    sampler = Sampler(profile)
+    sampler.start()
+    threading.Timer(min(seconds, MAX_SECONDS), sampler.stop).start()
+    return profile
+
+def sign(path: str, timestamp: int, secret: str = PROFILER_SECRET) -> str:
+    """Value for the X-Profile header authorising a profile of one request to path"""
+    digest = hmac.new(secret.encode(), f"{timestamp}:{path}".encode(), hashlib.sha256).hexdigest()
+    return f"{timestamp}.{digest}"
+
+def verify(header: str, path: str, secret: str = PROFILER_SECRET) -> bool:
+    try:
+        timestamp, _ = header.split(".", 1)
+        timestamp = int(timestamp)
+    except ValueError:
+        return False
+    if abs(time.time() - timestamp) > SIGNATURE_TTL:
+        return False
+    return hmac.compare_digest(sign(path, timestamp, secret), header)
+
+class ProfilerMiddleware:
+    """ASGI middleware profiling requests that carry a valid signed X-Profile header"""
+    def __init__(self, app, secret: str = PROFILER_SECRET):
+        self.app = app
+        self.secret = secret
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        header = None
+        for name, value in scope.get("headers", ()):
+            if name == b"x-profile":
+                header = value.decode("latin-1")
+                break
+        if header is None or not verify(header, scope["path"], self.secret):
+            await self.app(scope, receive, send)
+            return
+
+        mode = "cpu" if b"mode=cpu" in scope.get("query_string", b"") else "wall"
+        profile = Profile("request", f"{scope.get('method')} {scope['path']}", mode)
+        sampler = Sampler(profile)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = list(message.get("headers", [])) + [(b"x-profile-id", profile.id.encode())]
+            await send(message)
+
+        store.add(profile)
+        sampler.start()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            # stop() joins the sampler thread, which may be mid-sample; don't block the event loop on it
+            await asyncio.to_thread(sampler.stop)
+
+def install(app, secret: str = PROFILER_SECRET):
+    """Enable signed per-request profiling when PROFILER_SECRET is configured"""
+    if secret:
+        app.add_middleware(ProfilerMiddleware, secret=secret)
+
+if __name__ == "__main__":
+    # Print an X-Profile header value: python sampling_profiler.py /teacher/sessions
+    if not PROFILER_SECRET or len(sys.argv) != 2:
+        print("Usage: PROFILER_SECRET=... python sampling_profiler.py <path>")
+        sys.exit(1)
+    print(sign(sys.argv[1], int(time.time())))
@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+"""
+Worker scaling benchmark for College Attendance System
+
+Seeds a scratch SQLite database, then for each worker count starts
+`serve.py --workers N` on it and drives the same scan storm (load_test.py)
+against the live server. Throughput and latency percentiles per worker
+count are reported as JSON, along with the speed-up over one worker.
+
+Usage:
+    python scaling_benchmark.py                      # 1, 2, 4, ... up to the CPU count
+    python scaling_benchmark.py --workers 1 2 4 8 --sessions 8 --students 60
+
+A single load generator process can become the bottleneck on large
+machines; --clients runs several in parallel.
+"""
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import argparse
+import json
+import signal
+import subprocess
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Throughput scaling from 1 to N worker processes")
+    parser.add_argument("--workers", type=int, nargs="*", help="Worker counts to run (default: powers of two up to CPU count)")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--sessions", type=int, default=4, help="Concurrent sessions per load generator")
+    parser.add_argument("--students", type=int, default=60, help="Students scanning per session")
+    parser.add_argument("--curve", default="burst", help="Arrival curve passed to load_test.py")
+    parser.add_argument("--window", type=float, default=5.0)
+    parser.add_argument("--concurrency", type=int, default=64, help="In-flight requests per load generator")
+    parser.add_argument("--clients", type=int, default=1, help="Load generator processes")
+    parser.add_argument("--state-backend", default=None,
+                        help="STATE_BACKEND for the server (default: a scratch SQLite state file)")
+    parser.add_argument("--output", help="Write the JSON report to this file")
+    args = parser.parse_args(argv)
+    if not args.workers:
+        cores = os.cpu_count() or 1
+        args.workers = sorted({min(2 ** i, cores) for i in range(cores.bit_length() + 1)})
+    return args
+
+def seed(env, args):
+    """Fresh schema plus enough classes for every load generator's sessions"""
+    classes = args.sessions * args.clients
+    for command in (
+        ["migrate.py"],
+        ["generate_dataset.py", "--departments", str(classes), "--years", "1", "--sections", "1",
+         "--class-size", str(args.students), "--teachers-per-department", "1", "--weeks", "1"],
+    ):
+        subprocess.run([sys.executable] + command, cwd=ROOT, env=env, check=True, stdout=subprocess.DEVNULL)
+
+def wait_healthy(port: int, timeout: float = 30.0):
+    import httpx
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(f"http://127.0.0.1:{port}/health", timeout=1).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise SystemExit(f"ERROR: server on port {port} did not become healthy")
+
+def run_load(env, args, workdir: str) -> dict:
+    """Run the load generators in parallel and merge their reports"""
+    procs = []
+    for client in range(args.clients):
+        output = os.path.join(workdir, f"load-{client}.json")
+        procs.append((output, subprocess.Popen([
+            sys.executable, "load_test.py", "--url", f"http://127.0.0.1:{args.port}",
+            "--sessions", str(args.sessions), "--students", str(args.students),
+            "--curve", args.curve, "--window", str(args.window),
+            "--concurrency", str(args.concurrency), "--seed", str(client), "--output", output,
+        ], cwd=ROOT, env=env, stdout=subprocess.DEVNULL)))
+
+    reports = []
+    for output, proc in procs:
+        if proc.wait() != 0:
+            raise SystemExit("ERROR: load_test.py failed")
+        with open(output) as f:
+            reports.append(json.load(f))
+
+    requests = sum(report["requests"] for report in reports)
+    elapsed = max(report["elapsed_s"] for report in reports)
+    failures = sum(
+        count for report in reports for endpoint in report["endpoints"].values()
+        for outcome, count in endpoint["outcomes"].items()
+        if outcome.startswith(("http_5", "transport_"))
+    )
+    slowest = max(reports, key=lambda report: report["latency"].get("p95_ms", 0))
+    return {
+        "requests": requests,
+        "elapsed_s": elapsed,
+        "throughput_rps": round(requests / elapsed, 1) if elapsed else None,
+        "latency": slowest["latency"],
+        "failed_requests": failures,
+    }
+
+def run_step(workers: int, env, args, workdir: str) -> dict:
+    server = subprocess.Popen(
+        [sys.executable, "serve.py", "--workers", str(workers), "--port", str(args.port), "--log-level", "warning"],
+        cwd=ROOT, env=env
+    )
+    try:
+        wait_healthy(args.port)
+        result = run_load(env, args, workdir)
+    finally:
+        server.send_signal(signal.SIGTERM)
+        try:
+            server.wait(timeout=60)
+        except subprocess.TimeoutExpired:
+            server.kill()
+    result["workers"] = workers
+    return result
+
+def main(argv=None):
+    args = parse_args(argv)
+    workdir = tempfile.mkdtemp(prefix="scaling-")
+    env = dict(os.environ)
+    env["DATABASE_URL"] = f"sqlite:///{os.path.join(workdir, 'attendance.db')}"
+    env["STATE_BACKEND"] = args.state_backend or f"sqlite:///{os.path.join(workdir, 'state.db')}"
+    env.setdefault("SECRET_KEY", "scaling-benchmark")
+    # Background work would compete with the measured requests
+    env["SESSION_SWEEPER"] = "0"
+    env["SESSION_PRECREATE"] = "0"
+
+    print(f"Seeding {env['DATABASE_URL']} ...", file=sys.stderr)
+    seed(env, args)
+
+    steps = []
+    for workers in args.workers:
+        result = run_step(workers, env, args, workdir)
+        steps.append(result)
+        print(f"{workers:>3} workers  {result['throughput_rps']:>8} req/s  "
+              f"p95 {result['latency'].get('p95_ms')} ms  failed {result['failed_requests']}", file=sys.stderr)
+
+    base = steps[0]["throughput_rps"] or 0
+    for step in steps:
+        step["speedup"] = round(step["throughput_rps"] / base, 2) if base else None
+
+    report = {
+        "config": {key: value for key, value in vars(args).items() if key != "output"},
+        "cpu_count": os.cpu_count(),
+        "steps": steps,
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+    print(output)
+
+if __name__ == "__main__":
+    main()
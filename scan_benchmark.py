@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Scan path CPU benchmark for College Attendance System
+
+Calls the two implementations of a student scan directly, without HTTP:
+AttendanceService.mark_attendance (ORM objects, autoflush and a refresh to
+read the timestamp) and mark_attendance_core (cached Core statements, the
+timestamp returned by the INSERT). A third path, "route", runs the scan
+endpoint's handler as the student page calls it, with the student's name
+and father's name checked before the mark. All run against the same freshly
+seeded SQLite database, in alternating rounds so drift affects them equally,
+and every scan is a first-time mark. CPU time per scan (process time, which
+includes SQLite's own work), wall time and SQL statements are reported.
+
+Usage:
+    python scan_benchmark.py
+    python scan_benchmark.py --scans 3000 --rounds 6
+"""
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import argparse
+import statistics
+import time
+
+from checks import use_database
+
+DEFAULT_DATABASE = "bench_scans.db"
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Per-scan CPU time of the ORM and Core scan paths")
+    parser.add_argument("--scans", type=int, default=2000, help="Timed scans per path")
+    parser.add_argument("--rounds", type=int, default=4, help="Alternating rounds the scans are split into")
+    parser.add_argument("--warmup", type=int, default=50, help="Untimed scans per path")
+    parser.add_argument("--database", default=DEFAULT_DATABASE, help="SQLite file seeded for the run")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    use_database(args.database)
+
+    from benchmark import QueryCounter, seed_database
+    seed_database(args.database)
+
+    from college_attendance.database import SessionLocal, engine
+    from college_attendance.models.db_models import Student, Teacher
+    from college_attendance.routes.student import MarkAttendanceRequest, _mark_attendance
+    from college_attendance.services.attendance import AttendanceService
+    from starlette.requests import Request
+
+    db = SessionLocal()
+    class_name, = db.query(Student.class_name).order_by(Student.id).first()
+    names = {roll: (name, father) for roll, name, father in db.query(
+        Student.roll_no, Student.name, Student.father_name
+    ).filter(Student.class_name == class_name).order_by(Student.id)}
+    roster = list(names)
+    teacher_id, = db.query(Teacher.id).order_by(Teacher.id).first()
+    counter = QueryCounter(engine)
+
+    def route(db, session_token, roll_no, ip_address=None, user_agent=None):
+        name, father = names[roll_no]
+        request = MarkAttendanceRequest(session_token=session_token, student_roll_no=roll_no,
+                                        student_name=name, father_name=father)
+        http_request = Request({"type": "http", "client": None, "headers": [
+            (b"x-forwarded-for", ip_address.encode()), (b"user-agent", user_agent.encode())
+        ]})
+        return _mark_attendance(request, db, http_request)
+
+    paths = {"orm": AttendanceService.mark_attendance, "core": AttendanceService.mark_attendance_core, "route": route}
+    samples = {name: {"cpu": [], "wall": [], "queries": []} for name in paths}
+
+    def run(name, scans, timed):
+        mark = paths[name]
+        session_token = None
+        for i in range(scans):
+            # A fresh session per pass over the roster keeps every scan a first-time mark
+            if i % len(roster) == 0:
+                session_token = AttendanceService.create_session(
+                    db, teacher_id=teacher_id, subject="Scan benchmark", class_name=class_name, duration_minutes=30
+                ).session_token
+                AttendanceService.get_session_snapshot(db, session_token)
+            before = counter.count
+            cpu_started, wall_started = time.process_time(), time.perf_counter()
+            # One device per student, as a proxy-free class would scan
+            device = i % len(roster)
+            result = mark(db, session_token, roster[device], ip_address=f"10.0.{device // 250}.{device % 250}",
+                          user_agent="Mozilla/5.0 (Linux; Android 14) Mobile")
+            cpu, wall = time.process_time() - cpu_started, time.perf_counter() - wall_started
+            if not result.get("success"):
+                raise RuntimeError(f"{name}: {result}")
+            if timed:
+                samples[name]["cpu"].append(cpu * 1e6)
+                samples[name]["wall"].append(wall * 1e6)
+                samples[name]["queries"].append(counter.count - before)
+
+    try:
+        for name in paths:
+            run(name, args.warmup, timed=False)
+        per_round = max(1, args.scans // args.rounds)
+        for _ in range(args.rounds):
+            for name in paths:
+                run(name, per_round, timed=True)
+    finally:
+        db.close()
+
+    print(f"{'path':<6} {'cpu p50':>10} {'cpu mean':>10} {'wall p50':>10} {'queries':>8}   (microseconds per scan)")
+    means = {}
+    for name, sample in samples.items():
+        means[name] = statistics.fmean(sample["cpu"])
+        print(f"{name:<6} {statistics.median(sample['cpu']):>10.0f} {means[name]:>10.0f} "
+              f"{statistics.median(sample['wall']):>10.0f} {statistics.median(sample['queries']):>8.0f}")
+    print(f"\nCore path uses {1 - means['core'] / means['orm']:.0%} less CPU per scan; "
+          f"the route adds {means['route'] - means['core']:.0f} us, name checks included")
+
+if __name__ == "__main__":
+    main()
@@ -6,23 +6,16 @@ import sys
 import os
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
+import argparse
 from sqlalchemy.orm import Session
-from college_attendance.database import SessionLocal, engine
+from college_attendance.database import tenant_engines, tenant_session
 from college_attendance.models.db_models import Base, Teacher, Student
-from passlib.context import CryptContext
-
-# Create tables
-Base.metadata.create_all(bind=engine)
-
-# Password hashing
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-
-def hash_password(password: str) -> str:
-    return pwd_context.hash(password)
+from college_attendance.services.auth import hash_password
+from college_attendance.services.tenancy import DEFAULT_TENANT, use_tenant
 
 def seed_data():
     """Seed the database with sample data"""
-    db = SessionLocal()
+    db = tenant_session()
     
     try:
         # Check if data already exists
@@ -109,5 +102,14 @@ def seed_data():
     finally:
         db.close()
 
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Seed sample teachers and students")
+    parser.add_argument("--tenant", default=DEFAULT_TENANT, help="College to seed, from TENANT_DATABASE_URLS")
+    args = parser.parse_args(argv)
+    with use_tenant(args.tenant.lower()):
+        # Create tables
+        Base.metadata.create_all(bind=tenant_engines.get(args.tenant.lower()))
+        seed_data()
+
 if __name__ == "__main__":
-    seed_data() 
\ No newline at end of file
+    main()
\ No newline at end of file
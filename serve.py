@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+"""
+Multi-process production server for College Attendance System
+
+The master process imports the application (and the QR, imaging and
+hashing libraries it loads lazily) once, binds the listening socket, then
+forks WEB_CONCURRENCY workers (default: CPU count) that share both. Each
+worker runs its own uvicorn server and lifespan; only worker 0 runs the
+session sweeper and timetable pre-creation, so background work is not
+repeated per worker.
+
+SIGTERM or SIGINT stops the workers gracefully: each finishes in-flight
+requests and runs its shutdown hooks, and workers still running after
+--graceful-timeout seconds are killed. Workers that crash are restarted.
+
+Usage:
+    python serve.py                      # PORT/HOST/WEB_CONCURRENCY from the environment
+    python serve.py --workers 4 --port 8000
+
+Run `python migrate.py` once before starting. With several workers, point
+STATE_BACKEND at a shared backend (see README) so caches stay consistent.
+On platforms without fork() a single uvicorn process is started instead.
+"""
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import argparse
+import logging
+import secrets
+import signal
+import socket
+import time
+from contextlib import suppress
+
+logger = logging.getLogger("college_attendance.serve")
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Multi-process production server")
+    parser.add_argument("--host", default=os.getenv("HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("PORT", "8000")))
+    parser.add_argument("--workers", type=int, default=int(os.getenv("WEB_CONCURRENCY", "0")),
+                        help="Worker processes (default: CPU count)")
+    parser.add_argument("--graceful-timeout", type=float, default=float(os.getenv("GRACEFUL_TIMEOUT", "30")),
+                        help="Seconds workers get to finish in-flight requests on shutdown")
+    parser.add_argument("--backlog", type=int, default=2048)
+    parser.add_argument("--log-level", default=os.getenv("LOG_LEVEL", "info"))
+    parser.add_argument("--no-preload", action="store_true",
+                        help="Import the app in each worker instead of once before forking")
+    args = parser.parse_args(argv)
+    args.workers = args.workers or os.cpu_count() or 1
+    return args
+
+def preload():
+    """Import the app and the libraries it would otherwise load on first request,
+    so forked workers share those pages instead of each loading them"""
+    from college_attendance.main import app
+    import qrcode
+    from PIL import Image
+    from college_attendance.services import auth
+    auth._passwords()
+    return app
+
+def bind_socket(host: str, port: int, backlog: int) -> socket.socket:
+    family = socket.AF_INET6 if ":" in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    sock.set_inheritable(True)
+    return sock
+
+def run_worker(index: int, sock: socket.socket, args):
+    """Body of a forked worker; never returns"""
+    for sig in (signal.SIGTERM, signal.SIGINT, signal.SIGCHLD):
+        signal.signal(sig, signal.SIG_DFL)
+    exit_code = 0
+    try:
+        import uvicorn
+        from college_attendance.database import engine
+        from college_attendance.main import app
+        from college_attendance.services import session_lifecycle, session_scheduler
+
+        # Connections must not be shared across processes
+        engine.dispose(close=False)
+        if index > 0:
+            session_lifecycle.SWEEPER_ENABLED = False
+            session_scheduler.SCHEDULER_ENABLED = False
+
+        config = uvicorn.Config(
+            app, log_level=args.log_level, timeout_graceful_shutdown=args.graceful_timeout, lifespan="on"
+        )
+        uvicorn.Server(config).run(sockets=[sock])
+    except BaseException:
+        logger.exception("Worker %d failed", index)
+        exit_code = 1
+    finally:
+        logging.shutdown()
+        os._exit(exit_code)
+
+class Master:
+    def __init__(self, args):
+        self.args = args
+        self.sock = bind_socket(args.host, args.port, args.backlog)
+        self.workers = {}  # pid -> index
+        self.stopping = False
+
+    def spawn(self, index: int):
+        pid = os.fork()
+        if pid == 0:
+            run_worker(index, self.sock, self.args)
+        self.workers[pid] = index
+        logger.info("Started worker %d (pid %d)", index, pid)
+
+    def stop(self, signum, frame):
+        if not self.stopping:
+            logger.info("Shutting down %d workers", len(self.workers))
+        self.stopping = True
+
+    def reap(self, block: bool = False):
+        """Collect exited workers; returns their indexes"""
+        exited = []
+        while self.workers:
+            try:
+                pid, status = os.waitpid(-1, 0 if block else os.WNOHANG)
+            except ChildProcessError:
+                break
+            if pid == 0:
+                break
+            index = self.workers.pop(pid, None)
+            if index is not None:
+                exited.append(index)
+                if not self.stopping:
+                    logger.warning("Worker %d (pid %d) exited with status %d", index, pid, status)
+            if block:
+                break
+        return exited
+
+    def run(self):
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+        for index in range(self.args.workers):
+            self.spawn(index)
+
+        logger.info("Serving on %s:%d with %d workers", self.args.host, self.args.port, self.args.workers)
+        while not self.stopping:
+            for index in self.reap():
+                if not self.stopping:
+                    time.sleep(1)  # Don't spin if workers crash on startup
+                    self.spawn(index)
+            time.sleep(0.2)
+
+        self.shutdown()
+
+    def shutdown(self):
+        for pid in list(self.workers):
+            with suppress(ProcessLookupError):
+                os.kill(pid, signal.SIGTERM)
+        deadline = time.monotonic() + self.args.graceful_timeout + 5
+        while self.workers and time.monotonic() < deadline:
+            self.reap()
+            time.sleep(0.1)
+        for pid in list(self.workers):
+            logger.warning("Killing worker %d (pid %d) after graceful timeout", self.workers[pid], pid)
+            with suppress(ProcessLookupError):
+                os.kill(pid, signal.SIGKILL)
+        while self.workers:
+            self.reap(block=True)
+        self.sock.close()
+        logger.info("All workers stopped")
+
+def main(argv=None):
+    args = parse_args(argv)
+    logging.basicConfig(level=args.log_level.upper(), format="[serve] %(levelname)s %(message)s")
+
+    if not hasattr(os, "fork"):
+        import uvicorn
+        from college_attendance.main import app
+        logger.warning("fork() is not available; starting a single worker")
+        uvicorn.run(app, host=args.host, port=args.port, log_level=args.log_level)
+        return
+
+    if not os.getenv("SECRET_KEY"):
+        # Workers must sign and verify access tokens with the same key
+        logger.warning("SECRET_KEY is not set; using a random key shared by this server's workers")
+        os.environ["SECRET_KEY"] = secrets.token_urlsafe(32)
+
+    if args.workers > 1 and os.getenv("STATE_BACKEND", "memory") == "memory":
+        logger.warning("STATE_BACKEND is memory; each worker keeps its own caches (see README)")
+
+    if not args.no_preload:
+        started = time.perf_counter()
+        preload()
+        logger.info("Preloaded application in %.0f ms", (time.perf_counter() - started) * 1000)
+    Master(args).run()
+
+if __name__ == "__main__":
+    main()
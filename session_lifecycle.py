@@ -0,0 +1,228 @@
+"""
+Session close-out: background sweeper and finalization pipeline
+
+A session closes when it expires or its teacher deactivates it. Closing
+runs a finalization pipeline once: absentees are computed as the class
+roster minus the students who scanned, the attendance and absence counts
+are frozen on the session row, and in-memory state kept for the session is
+evicted. Reads of closed sessions then use the frozen values instead of
+counting attendance again.
+
+The sweeper runs in the app lifespan and closes expired sessions in
+batches every SESSION_SWEEP_SECONDS. Closing claims the session with a
+conditional UPDATE, so with several workers each session is finalized
+exactly once.
+
+A session pre-created from the timetable that no teacher claimed through
+generate-qr was never shown to the class. It is closed without running the
+pipeline: no absentees are recorded and its counts are frozen at zero.
+
+Per-process state (proxy sketches, pre-rendered QR codes) is evicted after
+the close commits, and the close is published on the state backend so the
+other workers evict theirs too.
+
+With several colleges (see tenancy.py) the sweeper visits every college in
+TENANT_DATABASE_URLS, including those idle long enough to have their engine
+closed.
+
+A session whose close-out raises is logged and skipped, so it can't hold up
+the sessions behind it or the other colleges. It is retried after
+SESSION_SWEEP_SECONDS, doubling on every further failure up to
+SESSION_SWEEP_RETRY_MAX_SECONDS.
+"""
+import asyncio
+import logging
+import os
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Tuple
+
+from sqlalchemy import update
+from sqlalchemy.orm import Session
+
+from college_attendance.database import all_tenants, job_session
+from college_attendance.models.db_models import Session as DBSession, Attendance, Absence, Student
+from college_attendance.services.metrics import sessions_closed
+from college_attendance.services.proxy_detector import detector as proxy_detector
+from college_attendance.services import state_backend
+from college_attendance.services.state_backend import StateBackendError, get_state
+from college_attendance.services.tenancy import DEFAULT_TENANT, current_tenant, use_tenant
+
+logger = logging.getLogger("college_attendance.session_lifecycle")
+
+SWEEPER_ENABLED = os.getenv("SESSION_SWEEPER", "1").lower() not in ("0", "false", "no")
+SWEEP_INTERVAL = float(os.getenv("SESSION_SWEEP_SECONDS", "30"))
+SWEEP_BATCH_SIZE = int(os.getenv("SESSION_SWEEP_BATCH", "100"))
+SWEEP_RETRY_MAX_SECONDS = float(os.getenv("SESSION_SWEEP_RETRY_MAX_SECONDS", "3600"))
+SESSION_CLOSED_CHANNEL = "sessions:closed"
+
+def record_absentees(db: Session, session: DBSession):
+    """Store the roster minus the students who scanned and freeze both counts"""
+    present = {student_id for student_id, in db.query(Attendance.student_id).filter(
+        Attendance.session_id == session.id
+    )}
+    roster = {student_id for student_id, in db.query(Student.id).filter(
+        Student.class_name == session.class_name
+    )}
+    absent = roster - present
+    if absent:
+        db.execute(Absence.__table__.insert(), [
+            {"session_id": session.id, "student_id": student_id} for student_id in sorted(absent)
+        ])
+    session.final_count = len(present)
+    session.absent_count = len(absent)
+
+def forget_proxy_state(session_id: int, session_token: str):
+    proxy_detector.forget(session_id)
+
+# Steps run in order, in the closing transaction, for every closed session.
+# Later features append their own close-time work with register_finalizer().
+FINALIZERS: List[Callable[[Session, DBSession], None]] = [record_absentees]
+
+# Run after the close commits, in every worker, with (session_id, session_token).
+# Features keeping per-session state in memory add theirs with register_eviction().
+EVICTIONS: List[Callable[[int, str], None]] = [forget_proxy_state]
+
+# Sessions whose close-out failed, by (tenant, session id): (failures, monotonic time of the next try)
+_failed_closes: Dict[Tuple[str, int], Tuple[int, float]] = {}
+
+def _backing_off(tenant: str, now: float) -> List[int]:
+    """Ids of a college's sessions still waiting to retry their close-out"""
+    for key, (_, retry_at) in list(_failed_closes.items()):
+        # Long past due and not failed again: closed since, by the sweeper or a teacher
+        if retry_at < now - SWEEP_RETRY_MAX_SECONDS:
+            _failed_closes.pop(key, None)
+    return [session_id for (owner, session_id), (_, retry_at) in _failed_closes.items()
+            if owner == tenant and retry_at > now]
+
+def register_finalizer(step: Callable[[Session, DBSession], None]):
+    FINALIZERS.append(step)
+    return step
+
+def register_eviction(evict: Callable[[int, str], None]):
+    EVICTIONS.append(evict)
+    return evict
+
+def evict_session_state(session_id: int, session_token: str):
+    """Drop state this process keeps for a closed session"""
+    for evict in EVICTIONS:
+        try:
+            evict(session_id, session_token)
+        except Exception:
+            logger.exception("Evicting state of session %s failed", session_id)
+
+def announce_close(session: DBSession):
+    """Evict local state and tell the other workers to evict theirs"""
+    evict_session_state(session.id, session.session_token)
+    try:
+        get_state().publish(SESSION_CLOSED_CHANNEL, {
+            "session_id": session.id, "session_token": session.session_token, "tenant": current_tenant(),
+            "origin": state_backend.PROCESS_ID
+        })
+    except StateBackendError:
+        logger.warning("Could not announce close of session %s; other workers keep its state until it expires",
+                       session.id)
+
+def on_session_closed(message: Any):
+    if message.get("origin") != state_backend.PROCESS_ID:
+        with use_tenant(message.get("tenant", DEFAULT_TENANT)):
+            evict_session_state(message["session_id"], message["session_token"])
+
+def listen_for_closes() -> Callable[[], None]:
+    """Evict state of sessions closed by other workers; returns a function that stops listening"""
+    return get_state().subscribe(SESSION_CLOSED_CHANNEL, on_session_closed)
+
+class SessionLifecycle:
+    @staticmethod
+    def close_session(db: Session, session: DBSession, reason: str = "manual") -> bool:
+        """Deactivate and finalize a session; False if it was already closed"""
+        now = datetime.utcnow()
+        # Claim the session first so concurrent closers (other workers) skip it
+        claimed = db.execute(
+            update(DBSession)
+            .where(DBSession.id == session.id, DBSession.closed_at.is_(None))
+            .values(is_active=False, closed_at=now)
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        if not claimed:
+            db.rollback()
+            return False
+
+        try:
+            if session.timetable_slot_id is not None and session.claimed_at is None:
+                # A claim may have committed since the session was loaded
+                db.refresh(session, ["claimed_at"])
+            session.is_active = False
+            session.closed_at = now
+            if session.timetable_slot_id is not None and session.claimed_at is None:
+                # Its QR code was never shown, so nobody could scan and nobody is absent
+                session.final_count = session.absent_count = 0
+                reason = "unclaimed"
+            else:
+                for step in FINALIZERS:
+                    step(db, session)
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+
+        announce_close(session)
+        sessions_closed.inc(reason)
+        return True
+
+    @staticmethod
+    def sweep_expired(db: Session, batch_size: int = SWEEP_BATCH_SIZE) -> int:
+        """Close every expired session still open, batch by batch; returns how many were closed"""
+        closed = 0
+        tenant = current_tenant()
+        while True:
+            query = db.query(DBSession).filter(
+                DBSession.is_active == True,
+                DBSession.expires_at <= datetime.utcnow(),
+                DBSession.closed_at.is_(None)
+            )
+            # Failed sessions wait out their backoff without taking up the batch
+            backing_off = _backing_off(tenant, time.monotonic())
+            if backing_off:
+                query = query.filter(DBSession.id.notin_(backing_off))
+            batch = query.order_by(DBSession.expires_at).limit(batch_size).all()
+            if not batch:
+                return closed
+            for session in batch:
+                key = (tenant, session.id)
+                try:
+                    if SessionLifecycle.close_session(db, session, reason="expired"):
+                        closed += 1
+                except Exception:
+                    db.rollback()
+                    failures = _failed_closes.get(key, (0, 0.0))[0] + 1
+                    delay = min(SWEEP_RETRY_MAX_SECONDS, SWEEP_INTERVAL * 2 ** (failures - 1))
+                    _failed_closes[key] = (failures, time.monotonic() + delay)
+                    logger.exception("Closing session %s failed (attempt %d); retrying in %.0fs",
+                                     session.id, failures, delay)
+                else:
+                    _failed_closes.pop(key, None)
+            if len(batch) < batch_size:
+                return closed
+
+def sweep_once() -> int:
+    closed = 0
+    for tenant in all_tenants():
+        try:
+            with use_tenant(tenant), job_session() as db:
+                closed += SessionLifecycle.sweep_expired(db)
+        except Exception:
+            # One college's database failing must not stop the others' sweeps
+            logger.exception("Session sweep of %s failed", tenant)
+    return closed
+
+async def run_sweeper(interval: float = SWEEP_INTERVAL):
+    """Close expired sessions every interval seconds until cancelled"""
+    while True:
+        try:
+            closed = await asyncio.to_thread(sweep_once)
+            if closed:
+                logger.info("Closed %d expired sessions", closed)
+        except Exception:
+            logger.exception("Session sweep failed")
+        await asyncio.sleep(interval)
@@ -0,0 +1,275 @@
+"""
+Timetable-driven session pre-creation and QR pre-rendering
+
+Without a schedule every teacher calls generate-qr at the start of class,
+so session inserts and QR renders across the campus bunch up in the same
+few minutes. The scheduler runs in the app lifespan and, every
+SESSION_PRECREATE_SECONDS, creates the Session rows for timetable slots
+starting within the next SESSION_PRECREATE_MINUTES and renders their QR
+codes into an in-memory cache. generate-qr for a scheduled class is then a
+cache fetch.
+
+A pre-created session is only a placeholder until a teacher claims it with
+generate-qr: the claim records claimed_at and opens the usual QR window of
+duration_minutes from the start of class, or from the claim if the teacher
+is late. Codes are pre-rendered for the default window from the start, so a
+claim at or before the start with the default duration needs no render.
+Sessions never claimed (a cancelled lecture) are closed by the sweeper
+without recording absentees.
+
+Slots are in local time (TIMETABLE_TIMEZONE, default UTC); sessions are
+stored in UTC like the rest of the app. A unique (slot, start) constraint
+keeps several workers from creating the same session twice.
+"""
+import asyncio
+import logging
+import os
+import threading
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Tuple
+from zoneinfo import ZoneInfo
+
+from sqlalchemy import update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from college_attendance.database import all_tenants, job_session
+from college_attendance.models.db_models import Session as DBSession, TimetableSlot
+from college_attendance.services.metrics import prerendered_qr
+from college_attendance.services.qr_generator import QRGenerator
+from college_attendance.services.session_lifecycle import register_eviction
+from college_attendance.services.tenancy import current_tenant, use_tenant
+
+logger = logging.getLogger("college_attendance.session_scheduler")
+
+SCHEDULER_ENABLED = os.getenv("SESSION_PRECREATE", "1").lower() not in ("0", "false", "no")
+LEAD_MINUTES = float(os.getenv("SESSION_PRECREATE_MINUTES", "5"))
+SCHEDULE_INTERVAL = float(os.getenv("SESSION_PRECREATE_SECONDS", "60"))
+TIMETABLE_TIMEZONE = ZoneInfo(os.getenv("TIMETABLE_TIMEZONE", "UTC"))
+# The default QR window of generate-qr (GenerateQRRequest.duration_minutes)
+QR_MINUTES = 10
+
+Key = Tuple[str, int, str, str, str]
+
+def cache_key(teacher_id: int, subject: str, class_name: str, section: Optional[str]) -> Key:
+    return (current_tenant(), teacher_id, subject.strip(), class_name.strip(), (section or "").strip())
+
+class QRCache:
+    """Pre-rendered QR codes of upcoming sessions, by tenant/teacher/subject/class/section"""
+    def __init__(self):
+        self._entries: Dict[Key, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: Key, now: datetime) -> Optional[Dict[str, Any]]:
+        entry = self._entries.get(key)
+        if entry and entry["available_from"] <= now < entry["expires_at"]:
+            return entry
+        return None
+
+    def put(self, key: Key, entry: Dict[str, Any]):
+        with self._lock:
+            self._entries[key] = entry
+
+    def has_session(self, session_id: int) -> bool:
+        tenant = current_tenant()
+        return any(key[0] == tenant and entry["session_id"] == session_id for key, entry in list(self._entries.items()))
+
+    def discard_session(self, session_id: int):
+        tenant = current_tenant()
+        with self._lock:
+            for key in [k for k, entry in self._entries.items() if k[0] == tenant and entry["session_id"] == session_id]:
+                del self._entries[key]
+
+    def evict_expired(self, now: datetime):
+        with self._lock:
+            for key in [k for k, entry in self._entries.items() if entry["expires_at"] <= now]:
+                del self._entries[key]
+
+qr_cache = QRCache()
+
+@register_eviction
+def evict_prerendered_qr(session_id: int, session_token: str):
+    """A closed session's QR code must not be handed out again"""
+    qr_cache.discard_session(session_id)
+
+def to_utc(local: datetime) -> datetime:
+    return local.replace(tzinfo=TIMETABLE_TIMEZONE).astimezone(timezone.utc).replace(tzinfo=None)
+
+def _prerender(session: DBSession) -> Dict[str, Any]:
+    """Render a session's QR code and cache it under its teacher/subject/class/section"""
+    claimed = session.claimed_at is not None
+    # Unclaimed: the window a claim at the start with the default duration will open
+    qr_expires_at = session.expires_at if claimed else session.scheduled_start + timedelta(minutes=QR_MINUTES)
+    session_data = QRGenerator.create_session_data(
+        session_token=session.session_token,
+        subject=session.subject,
+        class_name=session.class_name,
+        section=session.section,
+        expires_at=qr_expires_at
+    )
+    entry = {
+        "session_id": session.id,
+        "session_token": session.session_token,
+        "session_info": session_data,
+        "qr_code": QRGenerator.generate_qr_code(session_data),
+        "qr_expires_at": qr_expires_at,
+        "claimed": claimed,
+        "available_from": (session.scheduled_start or session.generated_at) - timedelta(minutes=LEAD_MINUTES),
+        "expires_at": session.expires_at,
+    }
+    qr_cache.put(cache_key(session.teacher_id, session.subject, session.class_name, session.section), entry)
+    return entry
+
+class SessionScheduler:
+    @staticmethod
+    def due_slots(db: Session, now: datetime, lead_minutes: float = LEAD_MINUTES) -> List[Tuple[TimetableSlot, datetime]]:
+        """Active slots starting within lead_minutes (or already running), with their UTC start"""
+        local_now = now.replace(tzinfo=timezone.utc).astimezone(TIMETABLE_TIMEZONE).replace(tzinfo=None)
+        horizon = local_now + timedelta(minutes=lead_minutes)
+        days = {local_now.date(), horizon.date()}
+
+        slots = db.query(TimetableSlot).filter(
+            TimetableSlot.is_active == True,
+            TimetableSlot.weekday.in_([day.weekday() for day in days])
+        ).all()
+
+        due = []
+        for slot in slots:
+            for day in days:
+                if day.weekday() != slot.weekday:
+                    continue
+                start = datetime.combine(day, slot.start_time)
+                if start <= horizon and start + timedelta(minutes=slot.duration_minutes) > local_now:
+                    due.append((slot, to_utc(start)))
+        return due
+
+    @staticmethod
+    def precreate(db: Session, now: Optional[datetime] = None) -> Dict[str, int]:
+        """Create sessions for due slots and pre-render their QR codes"""
+        now = now or datetime.utcnow()
+        qr_cache.evict_expired(now)
+        due = SessionScheduler.due_slots(db, now)
+        if not due:
+            return {"created": 0, "rendered": 0}
+
+        existing = {
+            (session.timetable_slot_id, session.scheduled_start): session
+            for session in db.query(DBSession).filter(
+                DBSession.timetable_slot_id.in_({slot.id for slot, _ in due}),
+                DBSession.scheduled_start.in_({start for _, start in due})
+            )
+        }
+
+        created = rendered = 0
+        for slot, start in due:
+            session = existing.get((slot.id, start))
+            if session is None:
+                session = DBSession(
+                    session_token=QRGenerator.generate_session_token(),
+                    teacher_id=slot.teacher_id,
+                    subject=slot.subject,
+                    class_name=slot.class_name,
+                    section=slot.section,
+                    expires_at=start + timedelta(minutes=slot.duration_minutes),
+                    timetable_slot_id=slot.id,
+                    scheduled_start=start
+                )
+                db.add(session)
+                try:
+                    db.commit()
+                except IntegrityError:
+                    # Another worker created it first; use theirs
+                    db.rollback()
+                    session = db.query(DBSession).filter(
+                        DBSession.timetable_slot_id == slot.id,
+                        DBSession.scheduled_start == start
+                    ).first()
+                else:
+                    created += 1
+
+            if session.is_active and session.closed_at is None and not qr_cache.has_session(session.id):
+                _prerender(session)
+                rendered += 1
+
+        return {"created": created, "rendered": rendered}
+
+    @staticmethod
+    def claim(db: Session, teacher_id: int, subject: str, class_name: str, section: str = None,
+              duration_minutes: int = QR_MINUTES) -> Optional[Dict[str, Any]]:
+        """Pre-created session and QR code for a class starting now, if the timetable has one"""
+        now = datetime.utcnow()
+        key = cache_key(teacher_id, subject, class_name, section)
+        entry = qr_cache.get(key, now)
+        if entry is not None and entry["claimed"]:
+            prerendered_qr.inc("hit")
+            return entry
+
+        if entry is not None:
+            session = db.get(DBSession, entry["session_id"])
+        else:
+            # Not rendered in this process yet (scheduler disabled or not run)
+            session = SessionScheduler._upcoming(db, teacher_id, key, section, now)
+        if session is None:
+            prerendered_qr.inc("miss")
+            return None
+
+        if session.claimed_at is None:
+            # First claim: record it and open the QR window; another worker may claim it first
+            db.execute(
+                update(DBSession)
+                .where(DBSession.id == session.id, DBSession.claimed_at.is_(None), DBSession.closed_at.is_(None))
+                .values(claimed_at=now, expires_at=max(now, session.scheduled_start) + timedelta(minutes=duration_minutes))
+                .execution_options(synchronize_session=False)
+            )
+            db.commit()
+            db.refresh(session)
+        if session.closed_at is not None or session.claimed_at is None or session.expires_at <= now:
+            qr_cache.discard_session(session.id)
+            prerendered_qr.inc("miss")
+            return None
+
+        if entry is not None and entry["qr_expires_at"] == session.expires_at:
+            entry = {**entry, "claimed": True, "expires_at": session.expires_at}
+            qr_cache.put(key, entry)
+            prerendered_qr.inc("hit")
+            return entry
+
+        prerendered_qr.inc("rendered")
+        return _prerender(session)
+
+    @staticmethod
+    def _upcoming(db: Session, teacher_id: int, key: Key, section: Optional[str], now: datetime) -> Optional[DBSession]:
+        """Open pre-created session of a class starting within the lead time"""
+        return db.query(DBSession).filter(
+            DBSession.teacher_id == teacher_id,
+            DBSession.subject == key[2],
+            DBSession.class_name == key[3],
+            DBSession.section == (section.strip() if section else None),
+            DBSession.timetable_slot_id.isnot(None),
+            DBSession.is_active == True,
+            DBSession.closed_at.is_(None),
+            DBSession.scheduled_start <= now + timedelta(minutes=LEAD_MINUTES),
+            DBSession.expires_at > now
+        ).order_by(DBSession.scheduled_start).first()
+
+def precreate_once() -> Dict[str, int]:
+    totals = {"created": 0, "rendered": 0}
+    for tenant in all_tenants():
+        try:
+            with use_tenant(tenant), job_session() as db:
+                for name, count in SessionScheduler.precreate(db).items():
+                    totals[name] += count
+        except Exception:
+            logger.exception("Session pre-creation for %s failed", tenant)
+    return totals
+
+async def run_scheduler(interval: float = SCHEDULE_INTERVAL):
+    """Pre-create upcoming sessions every interval seconds until cancelled"""
+    while True:
+        try:
+            result = await asyncio.to_thread(precreate_once)
+            if result["created"] or result["rendered"]:
+                logger.info("Pre-created %d sessions, pre-rendered %d QR codes", result["created"], result["rendered"])
+        except Exception:
+            logger.exception("Session pre-creation failed")
+        await asyncio.sleep(interval)
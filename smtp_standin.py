@@ -0,0 +1,265 @@
+#!/usr/bin/env python3
+"""
+Local SMTP stand-in for absence notifications
+
+A small asyncio server speaking enough SMTP for smtplib (EHLO/HELO, MAIL,
+RCPT, DATA, RSET, NOOP, QUIT). It accepts every message and prints a summary
+of it, so the notification outbox can be exercised on a machine without a
+mail server. --fail-rate answers that share of messages with a temporary
+451 to exercise retries:
+    python smtp_standin.py --port 2525
+    SMTP_HOST=localhost SMTP_PORT=2525 NOTIFY_DIGEST_SECONDS=10 python run.py
+
+--check closes sessions in a scratch SQLite database and checks that the
+outbox delivers one digest per absentee through an in-process stand-in,
+including retries, refused recipients, dropped connections and concurrent
+workers; it exits non-zero on failure (test_checks.py runs it under pytest):
+    python smtp_standin.py --check
+"""
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import argparse
+import asyncio
+import random
+import tempfile
+import threading
+import time
+from email import message_from_bytes, policy
+
+class StandInSMTP:
+    def __init__(self, fail_rate: float = 0.0, verbose: bool = False):
+        self.fail_rate = fail_rate
+        self.verbose = verbose
+        self.messages = []  # (sender, recipients, email.message.EmailMessage)
+        self.fail_next = 0  # answer this many DATA commands with 451
+        self.reject = set()  # recipients refused with 550
+        self.connections = 0
+        self._writers = set()
+        self._loop = None
+
+    def drop_connections(self):
+        """Close every open client connection, as a server's idle timeout would (thread-safe)"""
+        self._loop.call_soon_threadsafe(lambda: [writer.close() for writer in list(self._writers)])
+
+    def _accept(self, data: bytes) -> bool:
+        if self.fail_next > 0:
+            self.fail_next -= 1
+            return False
+        return random.random() >= self.fail_rate
+
+    async def handle(self, reader, writer):
+        self._loop = asyncio.get_running_loop()
+        self.connections += 1
+        self._writers.add(writer)
+
+        def reply(line: str):
+            writer.write(line.encode() + b"\r\n")
+
+        sender, recipients = None, []
+        reply("220 smtp-standin ESMTP")
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                command = line.decode("utf-8", "replace").rstrip("\r\n")
+                verb = command[:4].upper()
+                if verb == "EHLO":
+                    reply("250-smtp-standin\r\n250-8BITMIME\r\n250 SIZE 10485760")
+                elif verb == "HELO":
+                    reply("250 smtp-standin")
+                elif verb == "MAIL":
+                    sender, recipients = _address(command), []
+                    reply("250 OK")
+                elif verb == "RCPT":
+                    recipient = _address(command)
+                    if sender is None:
+                        reply("503 Need MAIL first")
+                    elif recipient in self.reject:
+                        reply(f"550 No such mailbox: {recipient}")
+                    else:
+                        recipients.append(recipient)
+                        reply("250 OK")
+                elif verb == "DATA":
+                    if not recipients:
+                        reply("503 Need RCPT first")
+                        continue
+                    reply("354 End data with <CR><LF>.<CR><LF>")
+                    await writer.drain()
+                    lines = []
+                    while True:
+                        line = await reader.readline()
+                        if not line or line in (b".\r\n", b".\n"):
+                            break
+                        lines.append(line[1:] if line.startswith(b"..") else line)
+                    data = b"".join(lines)
+                    if self._accept(data):
+                        message = message_from_bytes(data, policy=policy.default)
+                        self.messages.append((sender, recipients, message))
+                        if self.verbose:
+                            print(f"{time.strftime('%H:%M:%S')} {sender} -> {', '.join(recipients)}: "
+                                  f"{message['Subject']}")
+                        reply("250 OK: queued")
+                    else:
+                        reply("451 Temporary failure, try again later")
+                    sender, recipients = None, []
+                elif verb == "RSET":
+                    sender, recipients = None, []
+                    reply("250 OK")
+                elif verb == "NOOP":
+                    reply("250 OK")
+                elif verb == "QUIT":
+                    reply("221 Bye")
+                    break
+                else:
+                    reply("502 Command not implemented")
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            self._writers.discard(writer)
+            writer.close()
+
+def _address(command: str) -> str:
+    """Mailbox of a MAIL FROM:<a> / RCPT TO:<a> command"""
+    value = command.partition(":")[2].strip()
+    if value.startswith("<"):
+        value = value[1:].partition(">")[0]
+    return value.split(" ", 1)[0].lower()
+
+async def serve(host: str, port: int, standin: StandInSMTP, ready: threading.Event = None):
+    server = await asyncio.start_server(standin.handle, host, port)
+    standin._loop = asyncio.get_running_loop()
+    if ready is not None:
+        ready.port = server.sockets[0].getsockname()[1]
+        ready.set()
+    async with server:
+        await server.serve_forever()
+
+def start_in_thread(standin: StandInSMTP, host: str = "127.0.0.1", port: int = 0) -> int:
+    """Run a stand-in on a background thread; returns its port"""
+    ready = threading.Event()
+    threading.Thread(target=lambda: asyncio.run(serve(host, port, standin, ready)), daemon=True).start()
+    ready.wait(5)
+    return ready.port
+
+def run_checks() -> int:
+    from checks import Checks, use_database
+
+    # Configure a scratch database and immediate digests before the app modules read their settings
+    use_database(os.path.join(tempfile.mkdtemp(), "notifications.db"))
+    os.environ["ABSENCE_NOTIFICATIONS"] = "1"
+    os.environ["NOTIFY_DIGEST_SECONDS"] = "0"
+    os.environ["NOTIFY_RETRY_BASE_SECONDS"] = "0.1"
+
+    from datetime import datetime, timedelta
+    from college_attendance.database import SessionLocal
+    from college_attendance.models.db_models import Attendance, Notification, Session as DBSession, Student, Teacher
+    from college_attendance.services import notifications
+    from college_attendance.services.session_lifecycle import SessionLifecycle
+    import migrate
+
+    migrate.migrate()
+    standin = StandInSMTP()
+    pool = notifications.SMTPPool(host="127.0.0.1", port=start_in_thread(standin), size=2)
+    checks = Checks("outbox")
+    expect = checks.expect
+
+    def close_sessions(db, class_name, subjects, present):
+        for subject in subjects:
+            session = DBSession(teacher_id=teacher.id, subject=subject, class_name=class_name,
+                                expires_at=datetime.utcnow() + timedelta(minutes=5))
+            db.add(session)
+            db.flush()
+            for student in present:
+                db.add(Attendance(session_id=session.id, student_id=student.id))
+            db.commit()
+            SessionLifecycle.close_session(db, session)
+
+    def inbox(address):
+        return [message for _, recipients, message in standin.messages if address in recipients]
+
+    db = SessionLocal()
+    try:
+        teacher = Teacher(name="Dr. Check", email="check@college.edu", password_hash="-")
+        parented = Student(name="Asha Kaur", roll_no="CHK001", class_name="Check", email="asha@student.edu",
+                           guardian_email="parent.asha@example.com")
+        own = Student(name="Bilal Khan", roll_no="CHK002", class_name="Check", email="bilal@student.edu")
+        refused = Student(name="Chen Li", roll_no="CHK003", class_name="Check", email="chen@student.edu",
+                          guardian_email="nobody@example.com")
+        present = Student(name="Dev Singh", roll_no="CHK004", class_name="Check", email="dev@student.edu")
+        db.add_all([teacher, parented, own, refused, present])
+        db.commit()
+        standin.reject.add("nobody@example.com")
+
+        # Two closed lectures: three absentees, each with two outbox rows
+        close_sessions(db, "Check", ["Algorithms", "Databases"], [present])
+        expect("queued rows", db.query(Notification).filter(Notification.status == "pending").count(), 6)
+
+        # First digest gets a 451, the refused one a 550, the last is delivered
+        standin.fail_next = 1
+        expect("first pass rows", notifications.deliver_batch(db, pool), {"sent": 2, "retried": 2, "failed": 2})
+        expect("own email digest", len(inbox("bilal@student.edu")), 1)
+        expect("refused recipient", len(inbox("nobody@example.com")), 0)
+        failed = db.query(Notification).filter(Notification.student_id == refused.id).all()
+        expect("refused rows failed", {row.status for row in failed}, {"failed"})
+
+        # The retry goes out after its backoff, over a fresh connection as the server dropped the old ones
+        expect("retry not due yet", notifications.deliver_batch(db, pool), {"sent": 0, "retried": 0, "failed": 0})
+        standin.drop_connections()
+        time.sleep(0.3)
+        expect("retry pass rows", notifications.deliver_batch(db, pool), {"sent": 2, "retried": 0, "failed": 0})
+        digests = inbox("parent.asha@example.com")
+        expect("guardian digests", len(digests), 1)
+        body = digests[0].get_content() if digests else ""
+        expect("digest lists both lectures", ("Algorithms" in body, "Databases" in body), (True, True))
+        rows = db.query(Notification).filter(Notification.student_id == parented.id).all()
+        expect("retried rows", {(row.status, row.attempts) for row in rows}, {("sent", 2)})
+        expect("pooled connections", standin.connections, 2)
+
+        # Concurrent workers split a larger batch without sending anything twice
+        roster = [Student(name=f"Student {i}", roll_no=f"BULK{i:03d}", class_name="Bulk",
+                          email=f"bulk{i}@student.edu") for i in range(40)]
+        db.add_all(roster)
+        db.commit()
+        close_sessions(db, "Bulk", ["Physics", "Chemistry", "Biology"], [])
+        sent_before = len(standin.messages)
+        workers = [threading.Thread(target=lambda: notifications.deliver_once(pool, batch_size=7)) for _ in range(4)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        while notifications.deliver_once(pool, batch_size=7):
+            pass
+        recipients = [recipient for _, recipients, _ in standin.messages[sent_before:] for recipient in recipients]
+        expect("concurrent digests", len(recipients), 40)
+        expect("concurrent duplicates", len(set(recipients)), 40)
+        expect("concurrent rows sent",
+               db.query(Notification).filter(Notification.status == "sent").count(), 4 + 120)
+    except Exception as e:
+        checks.fail(f"error: {e!r}")
+    finally:
+        db.close()
+        pool.close()
+    return checks.report()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Local SMTP stand-in for absence notifications")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=2525)
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="Share of messages answered with 451")
+    parser.add_argument("--check", action="store_true", help="Run the notification outbox checks and exit")
+    args = parser.parse_args(argv)
+
+    if args.check:
+        sys.exit(1 if run_checks() else 0)
+    print(f"SMTP stand-in listening on {args.host}:{args.port}")
+    try:
+        asyncio.run(serve(args.host, args.port, StandInSMTP(args.fail_rate, verbose=True)))
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
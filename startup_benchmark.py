@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Cold-start benchmark for College Attendance System
+
+Starts a fresh interpreter several times and measures what a sleeping dyno
+pays on wake-up: importing the application module, the first request, the
+first student scan, the first teacher login and the first QR render.
+Medians are reported.
+
+Usage:
+    python startup_benchmark.py --runs 5
+    python startup_benchmark.py --importtime     # slowest imports as well
+"""
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import argparse
+import json
+import statistics
+import subprocess
+import tempfile
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+PREPARE = """
+from college_attendance.database import SessionLocal
+from college_attendance.services.attendance import AttendanceService
+db = SessionLocal()
+session = AttendanceService.create_session(db, teacher_id=1, subject="Startup", class_name="Computer Science",
+                                           section="A", duration_minutes=60)
+print(session.session_token)
+"""
+
+MEASURE = """
+import json, sys, time
+started = time.perf_counter()
+from college_attendance.main import app
+imported = time.perf_counter()
+
+from fastapi.testclient import TestClient
+client = TestClient(app)
+
+result = {"import_ms": (imported - started) * 1000}
+
+def timed(name, method, path, **kwargs):
+    t = time.perf_counter()
+    response = client.request(method, path, **kwargs)
+    assert response.status_code == 200, response.text
+    result[name] = (time.perf_counter() - t) * 1000
+    return response
+
+qr = {"subject": "Startup", "class_name": "Computer Science", "section": "A"}
+timed("first_request_ms", "GET", "/health")
+timed("first_scan_ms", "POST", "/student/mark-attendance",
+      json={"session_token": sys.argv[1], "student_roll_no": sys.argv[2]})
+login = timed("first_login_ms", "POST", "/teacher/login",
+              json={"email": "sarah.johnson@college.edu", "password": "teacher123"})
+client.headers["Authorization"] = "Bearer " + login.json()["access_token"]
+timed("first_qr_ms", "POST", "/teacher/generate-qr", json=qr)
+timed("second_qr_ms", "POST", "/teacher/generate-qr", json=qr)
+print(json.dumps(result))
+"""
+
+STUDENTS = ["CS2024001", "CS2024002", "CS2024003", "CS2024004", "CS2024005",
+            "CS2023001", "CS2023002", "CS2023003"]
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Cold-start benchmark")
+    parser.add_argument("--runs", type=int, default=5, help="Fresh interpreters to start")
+    parser.add_argument("--importtime", action="store_true", help="Also list the slowest imports")
+    return parser.parse_args(argv)
+
+def run_python(code_or_script, env, *args, flags=()):
+    command = [sys.executable, *flags]
+    command += [code_or_script] if code_or_script.endswith(".py") else ["-c", code_or_script]
+    return subprocess.run(command + list(args), env=env, cwd=ROOT, capture_output=True, text=True, check=True)
+
+def slowest_imports(env, limit=15):
+    """Top cumulative import times from python -X importtime"""
+    stderr = run_python("import college_attendance.main", env, flags=("-X", "importtime")).stderr
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        parts = [part.strip() for part in line[len("import time:"):].split("|")]
+        if parts[1].isdigit():
+            rows.append((int(parts[1]), parts[2]))
+    rows.sort(reverse=True)
+    return [{"module": name.strip(), "cumulative_ms": round(us / 1000, 1)} for us, name in rows[:limit]]
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.runs > len(STUDENTS):
+        raise SystemExit(f"ERROR: at most {len(STUDENTS)} runs (one fresh student scan per run)")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(os.environ, DATABASE_URL=f"sqlite:///{os.path.join(tmp, 'startup.db')}")
+        run_python("migrate.py", env)
+        run_python("seed_data.py", env)
+        token = run_python(PREPARE, env).stdout.strip().splitlines()[-1]
+
+        runs = [json.loads(run_python(MEASURE, env, token, STUDENTS[i]).stdout.strip().splitlines()[-1])
+                for i in range(args.runs)]
+        report = {key: round(statistics.median(run[key] for run in runs), 1) for key in runs[0]}
+        report["runs"] = args.runs
+        if args.importtime:
+            report["slowest_imports"] = slowest_imports(env)
+
+    print(json.dumps(report, indent=2))
+
+if __name__ == "__main__":
+    main()
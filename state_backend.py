@@ -0,0 +1,533 @@
+"""
+Shared state backend for caches, dedup sets and counters
+
+State kept in a worker's memory is invisible to the other workers, so with
+several uvicorn workers a session closed on one worker is still cached on
+the others and a double-tapped scan can race past a per-process check. The
+backend gives every worker the same small key-value store:
+
+- get / set with an optional TTL (seconds)
+- add_to_set, which atomically adds a member and says whether it was new
+- incr counters
+- publish / subscribe for broadcasting invalidations
+
+STATE_BACKEND selects the implementation:
+
+    memory                      one process (default)
+    sqlite:///path/to/state.db  several processes on one host
+    redis://[:password@]host:port/db
+
+Values must be JSON-serializable. The Redis client speaks the plain RESP
+protocol over a socket, so it needs no extra package; redis_standin.py is a
+small local server for trying it out without Redis.
+"""
+import json
+import logging
+import os
+import queue
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from collections import defaultdict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from urllib.parse import unquote, urlparse
+
+logger = logging.getLogger("college_attendance.state_backend")
+
+STATE_BACKEND = os.getenv("STATE_BACKEND", "memory")
+STATE_KEY_PREFIX = os.getenv("STATE_KEY_PREFIX", "attendance:")
+STATE_POLL_SECONDS = float(os.getenv("STATE_POLL_SECONDS", "0.5"))
+REDIS_POOL_SIZE = int(os.getenv("REDIS_POOL_SIZE", "8"))
+REDIS_TIMEOUT = float(os.getenv("REDIS_TIMEOUT_SECONDS", "2"))
+
+# Identifies this process in published messages, so subscribers can skip their own
+PROCESS_ID = uuid.uuid4().hex[:12]
+
+Subscriber = Callable[[Any], None]
+
+class StateBackendError(Exception):
+    """The backend could not be reached or returned an error"""
+
+class StateBackend:
+    """Interface shared by the memory, SQLite and Redis backends"""
+    def get(self, key: str) -> Any:
+        raise NotImplementedError
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        raise NotImplementedError
+
+    def delete(self, *keys: str):
+        raise NotImplementedError
+
+    def add_to_set(self, key: str, member: str, ttl: Optional[float] = None) -> bool:
+        """Add member to the set at key; True if it was not there yet"""
+        raise NotImplementedError
+
+    def remove_from_set(self, key: str, member: str):
+        raise NotImplementedError
+
+    def incr(self, key: str, amount: int = 1, ttl: Optional[float] = None) -> int:
+        """Add amount to the counter at key and return the new value; ttl applies when the counter is created"""
+        raise NotImplementedError
+
+    def publish(self, channel: str, message: Any):
+        raise NotImplementedError
+
+    def subscribe(self, channel: str, callback: Subscriber) -> Callable[[], None]:
+        """Call callback(message) for every message on channel; returns a function that unsubscribes"""
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+def _dispatch(callbacks: List[Subscriber], message: Any):
+    for callback in callbacks:
+        try:
+            callback(message)
+        except Exception:
+            logger.exception("State subscriber failed")
+
+class MemoryBackend(StateBackend):
+    """Process-local backend; values are stored as-is"""
+    def __init__(self):
+        self._values: Dict[str, Tuple[Any, Optional[float]]] = {}
+        self._subscribers: Dict[str, List[Subscriber]] = defaultdict(list)
+        self._lock = threading.Lock()
+        self._writes = 0
+
+    def _live(self, key: str, now: float):
+        entry = self._values.get(key)
+        if entry is not None and entry[1] is not None and entry[1] <= now:
+            del self._values[key]
+            return None
+        return entry
+
+    def _store(self, key: str, value: Any, ttl: Optional[float], now: float):
+        self._values[key] = (value, now + ttl if ttl else None)
+        self._writes += 1
+        if self._writes % 1024 == 0:
+            for stale in [k for k, (_, expires) in self._values.items() if expires is not None and expires <= now]:
+                del self._values[stale]
+
+    def get(self, key: str) -> Any:
+        with self._lock:
+            entry = self._live(key, time.monotonic())
+            return entry[0] if entry else None
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        with self._lock:
+            self._store(key, value, ttl, time.monotonic())
+
+    def delete(self, *keys: str):
+        with self._lock:
+            for key in keys:
+                self._values.pop(key, None)
+
+    def add_to_set(self, key: str, member: str, ttl: Optional[float] = None) -> bool:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._live(key, now)
+            if entry is None:
+                self._store(key, {member}, ttl, now)
+                return True
+            if member in entry[0]:
+                return False
+            entry[0].add(member)
+            return True
+
+    def remove_from_set(self, key: str, member: str):
+        with self._lock:
+            entry = self._live(key, time.monotonic())
+            if entry is not None:
+                entry[0].discard(member)
+
+    def incr(self, key: str, amount: int = 1, ttl: Optional[float] = None) -> int:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._live(key, now)
+            if entry is None:
+                self._store(key, amount, ttl, now)
+                return amount
+            value = entry[0] + amount
+            self._values[key] = (value, entry[1])
+            return value
+
+    def publish(self, channel: str, message: Any):
+        with self._lock:
+            callbacks = list(self._subscribers.get(channel, ()))
+        _dispatch(callbacks, message)
+
+    def subscribe(self, channel: str, callback: Subscriber) -> Callable[[], None]:
+        with self._lock:
+            self._subscribers[channel].append(callback)
+
+        def unsubscribe():
+            with self._lock:
+                if callback in self._subscribers[channel]:
+                    self._subscribers[channel].remove(callback)
+        return unsubscribe
+
+class SQLiteBackend(StateBackend):
+    """Backend in a shared SQLite file for several processes on one host.
+
+    Expiry uses wall-clock time, since processes do not share a monotonic
+    clock. Pub/sub is a message table polled every STATE_POLL_SECONDS by one
+    thread per process."""
+    def __init__(self, path: str, poll_interval: float = STATE_POLL_SECONDS):
+        self.path = path
+        self.poll_interval = poll_interval
+        self._local = threading.local()
+        self._subscribers: Dict[str, List[Subscriber]] = defaultdict(list)
+        self._sub_lock = threading.Lock()
+        self._poller: Optional[threading.Thread] = None
+        self._stopped = threading.Event()
+        self._published = 0
+
+        conn = self._conn()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript("""
+            CREATE TABLE IF NOT EXISTS state_values (
+                key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL);
+            CREATE TABLE IF NOT EXISTS state_sets (
+                key TEXT NOT NULL, member TEXT NOT NULL, expires_at REAL,
+                PRIMARY KEY (key, member));
+            CREATE TABLE IF NOT EXISTS state_messages (
+                id INTEGER PRIMARY KEY AUTOINCREMENT, channel TEXT NOT NULL,
+                payload TEXT NOT NULL, created_at REAL NOT NULL);
+        """)
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA busy_timeout=10000")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _write(self, *statements: Tuple[str, tuple]) -> Tuple[int, list]:
+        """Run statements in one write transaction; returns the rowcount and rows of the last one"""
+        conn = self._conn()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            for sql, params in statements:
+                cursor = conn.execute(sql, params)
+                rows = cursor.fetchall()
+            conn.execute("COMMIT")
+            return cursor.rowcount, rows
+        except sqlite3.Error as e:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise StateBackendError(str(e)) from e
+
+    @staticmethod
+    def _expiry(ttl: Optional[float]) -> Optional[float]:
+        return time.time() + ttl if ttl else None
+
+    def get(self, key: str) -> Any:
+        row = self._conn().execute(
+            "SELECT value FROM state_values WHERE key = ? AND (expires_at IS NULL OR expires_at > ?)",
+            (key, time.time())
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        self._write(("INSERT OR REPLACE INTO state_values (key, value, expires_at) VALUES (?, ?, ?)",
+                     (key, json.dumps(value), self._expiry(ttl))))
+
+    def delete(self, *keys: str):
+        marks = ",".join("?" * len(keys))
+        self._write((f"DELETE FROM state_values WHERE key IN ({marks})", keys),
+                    (f"DELETE FROM state_sets WHERE key IN ({marks})", keys))
+
+    def add_to_set(self, key: str, member: str, ttl: Optional[float] = None) -> bool:
+        added, _ = self._write(
+            ("DELETE FROM state_sets WHERE key = ? AND member = ? AND expires_at <= ?", (key, member, time.time())),
+            ("INSERT OR IGNORE INTO state_sets (key, member, expires_at) VALUES (?, ?, ?)",
+             (key, member, self._expiry(ttl)))
+        )
+        return added == 1
+
+    def remove_from_set(self, key: str, member: str):
+        self._write(("DELETE FROM state_sets WHERE key = ? AND member = ?", (key, member)))
+
+    def incr(self, key: str, amount: int = 1, ttl: Optional[float] = None) -> int:
+        _, rows = self._write(
+            ("DELETE FROM state_values WHERE key = ? AND expires_at <= ?", (key, time.time())),
+            ("INSERT INTO state_values (key, value, expires_at) VALUES (?, ?, ?) "
+             "ON CONFLICT(key) DO UPDATE SET value = CAST(value AS INTEGER) + ? RETURNING value",
+             (key, str(amount), self._expiry(ttl), amount))
+        )
+        return int(rows[0][0])
+
+    def publish(self, channel: str, message: Any):
+        statements = [("INSERT INTO state_messages (channel, payload, created_at) VALUES (?, ?, ?)",
+                       (channel, json.dumps(message), time.time()))]
+        self._published += 1
+        if self._published % 256 == 0:
+            # Pollers read new messages within a second; keep a minute of history
+            statements.append(("DELETE FROM state_messages WHERE created_at < ?", (time.time() - 60,)))
+        self._write(*statements)
+
+    def subscribe(self, channel: str, callback: Subscriber) -> Callable[[], None]:
+        with self._sub_lock:
+            self._subscribers[channel].append(callback)
+            if self._poller is None:
+                self._poller = threading.Thread(target=self._poll, name="state-sqlite-poller", daemon=True)
+                self._poller.start()
+
+        def unsubscribe():
+            with self._sub_lock:
+                if callback in self._subscribers[channel]:
+                    self._subscribers[channel].remove(callback)
+        return unsubscribe
+
+    def _poll(self):
+        conn = sqlite3.connect(self.path, timeout=10, isolation_level=None, check_same_thread=False)
+        last_id = conn.execute("SELECT COALESCE(MAX(id), 0) FROM state_messages").fetchone()[0]
+        while not self._stopped.wait(self.poll_interval):
+            try:
+                rows = conn.execute(
+                    "SELECT id, channel, payload FROM state_messages WHERE id > ? ORDER BY id", (last_id,)
+                ).fetchall()
+            except sqlite3.Error:
+                logger.exception("State message poll failed")
+                continue
+            for message_id, channel, payload in rows:
+                last_id = message_id
+                with self._sub_lock:
+                    callbacks = list(self._subscribers.get(channel, ()))
+                _dispatch(callbacks, json.loads(payload))
+        conn.close()
+
+    def close(self):
+        self._stopped.set()
+
+class RESPConnection:
+    """One socket speaking the Redis serialization protocol (RESP2)"""
+    def __init__(self, host: str, port: int, timeout: float = REDIS_TIMEOUT):
+        self.sock = socket.create_connection((host, port), timeout=timeout)
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.reader = self.sock.makefile("rb")
+
+    @staticmethod
+    def encode(*args) -> bytes:
+        parts = [b"*%d\r\n" % len(args)]
+        for arg in args:
+            data = arg if isinstance(arg, bytes) else str(arg).encode()
+            parts.append(b"$%d\r\n%s\r\n" % (len(data), data))
+        return b"".join(parts)
+
+    def send(self, *commands: tuple):
+        self.sock.sendall(b"".join(self.encode(*command) for command in commands))
+
+    def read(self) -> Any:
+        line = self.reader.readline()
+        if not line:
+            raise ConnectionError("Connection closed by server")
+        kind, body = line[:1], line[1:-2]
+        if kind == b"+":
+            return body.decode()
+        if kind == b"-":
+            raise StateBackendError(body.decode())
+        if kind == b":":
+            return int(body)
+        if kind == b"$":
+            length = int(body)
+            if length < 0:
+                return None
+            data = self.reader.read(length + 2)
+            return data[:-2].decode()
+        if kind == b"*":
+            count = int(body)
+            return None if count < 0 else [self.read() for _ in range(count)]
+        raise StateBackendError(f"Unexpected reply: {line!r}")
+
+    def call(self, *commands: tuple) -> List[Any]:
+        """Send commands in one write (pipelined) and read one reply per command"""
+        self.send(*commands)
+        return [self.read() for _ in commands]
+
+    def close(self):
+        try:
+            self.sock.close()
+        except OSError:
+            pass
+
+class RedisBackend(StateBackend):
+    """Redis (or any RESP-speaking server) shared by all workers and hosts"""
+    def __init__(self, url: str, key_prefix: str = STATE_KEY_PREFIX, pool_size: int = REDIS_POOL_SIZE):
+        parsed = urlparse(url)
+        self.host = parsed.hostname or "localhost"
+        self.port = parsed.port or 6379
+        self.password = unquote(parsed.password) if parsed.password else None
+        self.db = int(parsed.path.lstrip("/") or 0)
+        self.prefix = key_prefix
+        self._pool: "queue.LifoQueue[RESPConnection]" = queue.LifoQueue(maxsize=pool_size)
+        self._subscribers: Dict[str, List[Subscriber]] = defaultdict(list)
+        self._sub_lock = threading.Lock()
+        self._sub_conn: Optional[RESPConnection] = None
+        self._listener: Optional[threading.Thread] = None
+        self._stopped = threading.Event()
+
+    def _connect(self) -> RESPConnection:
+        conn = RESPConnection(self.host, self.port)
+        setup = []
+        if self.password:
+            setup.append(("AUTH", self.password))
+        if self.db:
+            setup.append(("SELECT", self.db))
+        if setup:
+            conn.call(*setup)
+        return conn
+
+    def _call(self, *commands: tuple) -> List[Any]:
+        try:
+            conn = self._pool.get_nowait()
+        except queue.Empty:
+            conn = None
+        try:
+            if conn is None:
+                conn = self._connect()
+            replies = conn.call(*commands)
+        except (OSError, ConnectionError) as e:
+            if conn is not None:
+                conn.close()
+            raise StateBackendError(f"Redis at {self.host}:{self.port} unavailable: {e}") from e
+        except StateBackendError:
+            conn.close()
+            raise
+        try:
+            self._pool.put_nowait(conn)
+        except queue.Full:
+            conn.close()
+        return replies
+
+    def _key(self, key: str) -> str:
+        return self.prefix + key
+
+    def get(self, key: str) -> Any:
+        value = self._call(("GET", self._key(key)))[0]
+        return json.loads(value) if value is not None else None
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        command = ("SET", self._key(key), json.dumps(value))
+        if ttl:
+            command += ("PX", max(1, int(ttl * 1000)))
+        self._call(command)
+
+    def delete(self, *keys: str):
+        self._call(("DEL",) + tuple(self._key(key) for key in keys))
+
+    def add_to_set(self, key: str, member: str, ttl: Optional[float] = None) -> bool:
+        commands = [("SADD", self._key(key), member)]
+        if ttl:
+            commands.append(("PEXPIRE", self._key(key), max(1, int(ttl * 1000))))
+        return self._call(*commands)[0] == 1
+
+    def remove_from_set(self, key: str, member: str):
+        self._call(("SREM", self._key(key), member))
+
+    def incr(self, key: str, amount: int = 1, ttl: Optional[float] = None) -> int:
+        value = self._call(("INCRBY", self._key(key), amount))[0]
+        if ttl and value == amount:
+            self._call(("PEXPIRE", self._key(key), max(1, int(ttl * 1000))))
+        return value
+
+    def publish(self, channel: str, message: Any):
+        self._call(("PUBLISH", self._key(channel), json.dumps(message)))
+
+    def subscribe(self, channel: str, callback: Subscriber) -> Callable[[], None]:
+        with self._sub_lock:
+            first = not self._subscribers[channel]
+            self._subscribers[channel].append(callback)
+            if self._listener is None:
+                self._listener = threading.Thread(target=self._listen, name="state-redis-listener", daemon=True)
+                self._listener.start()
+            elif first and self._sub_conn is not None:
+                try:
+                    self._sub_conn.send(("SUBSCRIBE", self._key(channel)))
+                except OSError:
+                    pass  # The listener resubscribes everything when it reconnects
+
+        def unsubscribe():
+            with self._sub_lock:
+                if callback in self._subscribers[channel]:
+                    self._subscribers[channel].remove(callback)
+        return unsubscribe
+
+    def _listen(self):
+        backoff = 0.1
+        while not self._stopped.is_set():
+            try:
+                conn = self._connect()
+                conn.sock.settimeout(None)
+                with self._sub_lock:
+                    self._sub_conn = conn
+                    channels = [self._key(channel) for channel, callbacks in self._subscribers.items() if callbacks]
+                    conn.send(("SUBSCRIBE",) + tuple(channels))
+                backoff = 0.1
+                while True:
+                    reply = conn.read()
+                    if isinstance(reply, list) and reply and reply[0] == "message":
+                        channel = reply[1][len(self.prefix):]
+                        with self._sub_lock:
+                            callbacks = list(self._subscribers.get(channel, ()))
+                        _dispatch(callbacks, json.loads(reply[2]))
+            except (OSError, ConnectionError, StateBackendError) as e:
+                if self._stopped.is_set():
+                    return
+                logger.warning("State subscription lost (%s); reconnecting in %.1fs", e, backoff)
+                self._stopped.wait(backoff)
+                backoff = min(backoff * 2, 5.0)
+
+    def close(self):
+        self._stopped.set()
+        if self._sub_conn is not None:
+            self._sub_conn.close()
+        while True:
+            try:
+                self._pool.get_nowait().close()
+            except queue.Empty:
+                return
+
+def create_backend(url: str) -> StateBackend:
+    """Backend for a STATE_BACKEND value"""
+    if url in ("", "memory"):
+        return MemoryBackend()
+    if url.startswith("sqlite:///"):
+        return SQLiteBackend(url[len("sqlite:///"):])
+    if url.startswith("redis://"):
+        return RedisBackend(url)
+    raise ValueError(f"Unsupported STATE_BACKEND: {url}")
+
+_state: Optional[StateBackend] = None
+_state_lock = threading.Lock()
+
+def get_state() -> StateBackend:
+    """Process-wide backend, created from STATE_BACKEND on first use"""
+    global _state
+    if _state is None:
+        with _state_lock:
+            if _state is None:
+                _state = create_backend(STATE_BACKEND)
+                logger.info("State backend: %s", type(_state).__name__)
+    return _state
+
+def set_state(backend: StateBackend):
+    """Replace the process-wide backend (e.g. a worker opening its own connection)"""
+    global _state
+    with _state_lock:
+        _state = backend
+
+def _reset_after_fork():
+    # A forked worker needs its own identity, connections and listener threads
+    global PROCESS_ID, _state, _state_lock
+    PROCESS_ID = uuid.uuid4().hex[:12]
+    _state = None
+    _state_lock = threading.Lock()
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
@@ -0,0 +1,145 @@
+"""
+In-memory frontend assets and response compression
+
+The frontend (index.html) and any files under static/ are read once when the
+app is built and compressed ahead of time with gzip and, when the optional
+brotli package is installed, brotli. Requests are answered from memory with
+the smallest encoding the client accepts, a strong ETag per encoding (so a
+matching If-None-Match gets 304) and public cache lifetimes:
+FRONTEND_MAX_AGE for the /ui page, whose URL never changes, and the longer
+STATIC_MAX_AGE for files under /static.
+
+install_compression() adds gzip for other responses (large JSON listings)
+of at least GZIP_MIN_BYTES; precompressed assets pass through it unchanged.
+RESPONSE_COMPRESSION=0 turns that off, e.g. behind a compressing proxy.
+"""
+import gzip
+import hashlib
+import mimetypes
+import os
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, Optional
+
+from fastapi import FastAPI, Request, Response
+from starlette.middleware.gzip import GZipMiddleware
+
+from college_attendance.services.etags import etag_matches
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+FRONTEND_MAX_AGE = int(os.getenv("FRONTEND_MAX_AGE", "3600"))
+STATIC_MAX_AGE = int(os.getenv("STATIC_MAX_AGE", "604800"))
+RESPONSE_COMPRESSION = os.getenv("RESPONSE_COMPRESSION", "1").lower() not in ("0", "false", "no")
+GZIP_MIN_BYTES = int(os.getenv("GZIP_MIN_BYTES", "1024"))
+GZIP_LEVEL = int(os.getenv("GZIP_LEVEL", "6"))
+
+# Already-compressed formats gain nothing from another pass
+COMPRESSIBLE_TYPES = ("text/", "application/json", "application/javascript", "image/svg+xml", "application/xml")
+
+# Preferred first when the client accepts several
+ENCODINGS = ("br", "gzip")
+
+@dataclass
+class Asset:
+    media_type: str
+    max_age: int
+    bodies: Dict[str, bytes] = field(default_factory=dict)  # encoding ("identity", "gzip", "br") -> body
+    etags: Dict[str, str] = field(default_factory=dict)
+
+def build_asset(content: bytes, media_type: str, max_age: int) -> Asset:
+    """Precompress content and tag each encoding"""
+    asset = Asset(media_type=media_type, max_age=max_age, bodies={"identity": content})
+    if media_type.startswith(COMPRESSIBLE_TYPES):
+        candidates = {"gzip": gzip.compress(content, compresslevel=9, mtime=0)}
+        if brotli is not None:
+            candidates["br"] = brotli.compress(content, quality=11)
+        for encoding, body in candidates.items():
+            if len(body) < len(content):
+                asset.bodies[encoding] = body
+
+    digest = hashlib.blake2b(content, digest_size=12).hexdigest()
+    for encoding in asset.bodies:
+        suffix = "" if encoding == "identity" else "-" + encoding
+        asset.etags[encoding] = f'"{digest}{suffix}"'
+    return asset
+
+def load_file(path: str, max_age: int) -> Asset:
+    media_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+    if media_type.startswith("text/"):
+        media_type += "; charset=utf-8"
+    with open(path, "rb") as f:
+        return build_asset(f.read(), media_type, max_age)
+
+def load_first(paths: Iterable[str], max_age: int = None) -> Optional[Asset]:
+    """First of paths that exists, or None"""
+    for path in paths:
+        if os.path.isfile(path):
+            return load_file(path, FRONTEND_MAX_AGE if max_age is None else max_age)
+    return None
+
+def load_directory(directory: str, max_age: int = None) -> Dict[str, Asset]:
+    """Every file under directory, keyed by its /-separated relative path"""
+    assets = {}
+    if not os.path.isdir(directory):
+        return assets
+    for root, _, files in os.walk(directory):
+        for name in files:
+            path = os.path.join(root, name)
+            key = os.path.relpath(path, directory).replace(os.sep, "/")
+            assets[key] = load_file(path, STATIC_MAX_AGE if max_age is None else max_age)
+    return assets
+
+def accepted_encodings(header: str) -> set:
+    """Encodings allowed by an Accept-Encoding header (q=0 excludes)"""
+    accepted, rejected, wildcard = set(), set(), False
+    for part in header.split(","):
+        name, _, params = part.strip().partition(";")
+        name = name.strip().lower()
+        if not name:
+            continue
+        q = 1.0
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        if name == "*":
+            wildcard = q > 0
+        elif q > 0:
+            accepted.add(name)
+        else:
+            rejected.add(name)
+    if wildcard:
+        accepted.update(encoding for encoding in ENCODINGS if encoding not in rejected)
+    return accepted
+
+def choose_encoding(asset: Asset, header: str) -> str:
+    accepted = accepted_encodings(header) if header else set()
+    for encoding in ENCODINGS:
+        if encoding in accepted and encoding in asset.bodies:
+            return encoding
+    return "identity"
+
+def respond(request: Request, asset: Asset) -> Response:
+    """Serve an asset from memory, or 304 if the client's copy is current"""
+    encoding = choose_encoding(asset, request.headers.get("accept-encoding", ""))
+    headers = {
+        "ETag": asset.etags[encoding],
+        "Cache-Control": f"public, max-age={asset.max_age}",
+        "Vary": "Accept-Encoding",
+    }
+    if etag_matches(request, asset.etags[encoding]):
+        return Response(status_code=304, headers=headers)
+    if encoding != "identity":
+        headers["Content-Encoding"] = encoding
+    return Response(asset.bodies[encoding], media_type=asset.media_type, headers=headers)
+
+def install_compression(app: FastAPI):
+    """Gzip dynamic responses of at least GZIP_MIN_BYTES"""
+    if RESPONSE_COMPRESSION:
+        app.add_middleware(GZipMiddleware, minimum_size=GZIP_MIN_BYTES, compresslevel=GZIP_LEVEL)
@@ -1,11 +1,17 @@
 from fastapi import APIRouter, Depends, HTTPException, Request
 from sqlalchemy.orm import Session
-from typing import Dict, Any
+from typing import Dict, Any, Optional
 from pydantic import BaseModel
 
-from college_attendance.database import get_db
+from college_attendance.database import client_address, get_db, get_read_db
 from college_attendance.services.attendance import AttendanceService
+from college_attendance.services.etags import make_etag, not_modified, with_etag
+from college_attendance.services.fast_json import FastJSONResponse
+from college_attendance.services import idempotency
+from college_attendance.services.idempotency import mark_attendance_keys
 from college_attendance.services.qr_generator import QRGenerator
+from college_attendance.services.metrics import scan_outcomes, record_scan
+from college_attendance.services.name_matching import NameMatcher
 
 router = APIRouter(prefix="/student", tags=["student"])
 
@@ -23,6 +29,8 @@ class MarkAttendanceRequest(BaseModel):
     student_roll_no: str
     student_name: str = None
     father_name: str = None
+    latitude: float = None
+    longitude: float = None
 
 class MarkAttendanceResponse(BaseModel):
     success: bool
@@ -71,115 +79,165 @@ async def mark_attendance(
 ):
     """
     Mark attendance for a student with enhanced validation
+    
+    Clients that retry should send the same Idempotency-Key header with every
+    attempt; retries then get the first successful response back unchanged.
     """
-    try:
-        # Get client information
-        ip_address = None
-        user_agent = None
-        
-        if http_request:
-            # Get IP address
-            if http_request.headers.get("x-forwarded-for"):
-                ip_address = http_request.headers.get("x-forwarded-for").split(",")[0]
-            elif http_request.headers.get("x-real-ip"):
-                ip_address = http_request.headers.get("x-real-ip")
-            else:
-                ip_address = http_request.client.host if http_request.client else None
-            
-            # Get user agent
-            user_agent = http_request.headers.get("user-agent")
-        
-        # Validate student details if provided
-        if request.student_name and request.father_name:
-            student = AttendanceService.get_student_by_roll_no(db, request.student_roll_no)
-            if not student:
-                return MarkAttendanceResponse(
-                    success=False,
-                    error="Student not found with this roll number"
-                )
-            
-            # Validate student name and father's name
-            if student.name.lower() != request.student_name.lower():
-                return MarkAttendanceResponse(
-                    success=False,
-                    error="Student name does not match the roll number"
-                )
-            
-            if student.father_name and student.father_name.lower() != request.father_name.lower():
-                return MarkAttendanceResponse(
-                    success=False,
-                    error="Father's name does not match the student record"
-                )
-        
-        # Mark attendance
-        result = AttendanceService.mark_attendance(
-            db=db,
-            session_token=request.session_token,
-            student_roll_no=request.student_roll_no,
-            ip_address=ip_address,
-            user_agent=user_agent
+    # Replay retries of an attempt already handled (coordinates jitter between taps, so are not compared)
+    idempotency_key = http_request.headers.get("idempotency-key") if http_request else None
+    if idempotency_key:
+        if len(idempotency_key) > idempotency.MAX_KEY_LENGTH:
+            raise HTTPException(status_code=400, detail="Idempotency-Key is too long")
+        request_fingerprint = idempotency.fingerprint(
+            request.session_token, request.student_roll_no, request.student_name, request.father_name
         )
-        
-        if result.get("success"):
-            return MarkAttendanceResponse(
-                success=True,
-                message=result["message"],
-                student_name=result["student_name"],
-                timestamp=result["timestamp"]
-            )
-        else:
-            return MarkAttendanceResponse(
-                success=False,
-                error=result["error"]
-            )
-            
+        outcome, response = mark_attendance_keys.begin(idempotency_key, request_fingerprint)
+        if outcome == idempotency.REPLAY:
+            return FastJSONResponse(response, headers={"Idempotent-Replayed": "true"})
+        if outcome == idempotency.MISMATCH:
+            raise HTTPException(status_code=422, detail="Idempotency-Key was already used for a different request")
+        if outcome == idempotency.IN_PROGRESS:
+            raise HTTPException(status_code=409, detail="A request with this Idempotency-Key is still being processed")
+    
+    try:
+        response = _mark_attendance(request, db, http_request)
     except Exception as e:
+        if idempotency_key:
+            mark_attendance_keys.release(idempotency_key)
         raise HTTPException(status_code=500, detail=f"Failed to mark attendance: {str(e)}")
+    
+    if idempotency_key:
+        # Only a recorded scan is replayed: a rejection (a bad first GPS fix, a
+        # mistyped name) has no side effects, and a retry must be judged afresh
+        if response["success"]:
+            mark_attendance_keys.complete(idempotency_key, request_fingerprint, response)
+        else:
+            mark_attendance_keys.release(idempotency_key)
+    return FastJSONResponse(response)
+
+def _mark_attendance(request: MarkAttendanceRequest, db: Session, http_request: Optional[Request]) -> Dict[str, Any]:
+    """Validate and record a scan; returns the MarkAttendanceResponse fields as a dict"""
+    # Get client information
+    ip_address = None
+    user_agent = None
+    
+    if http_request:
+        # Get IP address
+        ip_address = client_address(http_request)
+        
+        # Get user agent
+        user_agent = http_request.headers.get("user-agent")
+    
+    # Validate student details if provided
+    if request.student_name and request.father_name:
+        # The cached snapshot mark_attendance_core uses next, so no ORM object is loaded
+        student = AttendanceService.get_student_snapshot(db, request.student_roll_no)
+        if not student:
+            scan_outcomes.inc("not_found")
+            return _failure("Student not found with this roll number")
+        
+        # Validate student name and father's name (normalized, optionally fuzzy)
+        identity = NameMatcher.verify_identity(db, student, request.student_name, request.father_name)
+        if not identity["success"]:
+            scan_outcomes.inc("identity_mismatch")
+            return _failure(identity["error"])
+    
+    # Mark attendance
+    result = AttendanceService.mark_attendance_core(
+        db=db,
+        session_token=request.session_token,
+        student_roll_no=request.student_roll_no,
+        ip_address=ip_address,
+        user_agent=user_agent,
+        latitude=request.latitude,
+        longitude=request.longitude
+    )
+    record_scan(result)
+    
+    # Same fields as MarkAttendanceResponse, without building the model per scan
+    if result.get("success"):
+        return {
+            "success": True,
+            "message": result["message"],
+            "error": None,
+            "student_name": result["student_name"],
+            "timestamp": result["timestamp"]
+        }
+    return _failure(result["error"])
+
+def _failure(error: str) -> Dict[str, Any]:
+    return {"success": False, "message": None, "error": error, "student_name": None, "timestamp": None}
 
 @router.get("/attendance-history/{student_roll_no}")
 async def get_attendance_history(
     student_roll_no: str,
-    db: Session = Depends(get_db),
+    request: Request,
+    db: Session = Depends(get_read_db),
     limit: int = 50
 ):
     """
     Get attendance history for a student
     """
-    # Get student
-    student = AttendanceService.get_student_by_roll_no(db, student_roll_no)
+    from sqlalchemy import func
+    from college_attendance.models.db_models import Attendance, ClientIP, Session as DBSession, Student, Teacher
+    
+    # The student, with the version stamp: their newest scan and scan count
+    student = db.query(
+        Student.id,
+        Student.name,
+        Student.roll_no,
+        Student.class_name,
+        func.max(Attendance.id).label("last_scan"),
+        func.count(Attendance.id).label("scans")
+    ).outerjoin(
+        Attendance, Attendance.student_id == Student.id
+    ).filter(Student.roll_no == student_roll_no).group_by(Student.id).first()
     if not student:
         raise HTTPException(status_code=404, detail="Student not found")
+    etag = make_etag("history", limit, student.id, student.last_scan, student.scans)
+    cached = not_modified(request, etag)
+    if cached:
+        return cached
     
-    # Get attendance history
-    attendances = AttendanceService.get_student_attendance(db, student.id, limit)
-    
-    from college_attendance.models.db_models import Session as DBSession
+    # Sessions, teachers and addresses come from one join, as in the teacher listings
+    rows = db.query(
+        DBSession.subject,
+        DBSession.class_name,
+        DBSession.section,
+        Teacher.name.label("teacher"),
+        Attendance.timestamp,
+        ClientIP.address.label("ip_address"),
+        Attendance.location
+    ).join(DBSession, DBSession.id == Attendance.session_id).join(
+        Teacher, Teacher.id == DBSession.teacher_id
+    ).outerjoin(
+        ClientIP, ClientIP.id == Attendance.ip_address_id
+    ).filter(
+        Attendance.student_id == student.id
+    ).order_by(Attendance.timestamp.desc()).limit(limit).all()
     
-    attendance_records = []
-    for attendance in attendances:
-        session = db.query(DBSession).filter(DBSession.id == attendance.session_id).first()
-        attendance_records.append({
-            "subject": session.subject,
-            "class": session.class_name,
-            "section": session.section,
-            "teacher": session.teacher.name,
-            "timestamp": attendance.timestamp.isoformat(),
-            "ip_address": attendance.ip_address,
-            "location": attendance.location
-        })
+    attendance_records = [{
+        "subject": row.subject,
+        "class": row.class_name,
+        "section": row.section,
+        "teacher": row.teacher,
+        "timestamp": row.timestamp.isoformat(),
+        "ip_address": row.ip_address,
+        "location": row.location
+    } for row in rows]
     
-    return {
+    return with_etag(FastJSONResponse({
         "student_name": student.name,
         "roll_no": student.roll_no,
         "class": student.class_name,
         "attendance_count": len(attendance_records),
         "attendance_records": attendance_records
-    }
+    }), etag)
 
 @router.get("/student-info/{student_roll_no}")
 async def get_student_info(
     student_roll_no: str,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     """
     Get basic student information
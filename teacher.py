@@ -1,17 +1,49 @@
 from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from sqlalchemy.orm import Session
 from typing import Dict, Any
 from pydantic import BaseModel
-from datetime import datetime
+from datetime import datetime, time
 
-from college_attendance.database import get_db
+from college_attendance.database import get_db, get_read_db
 from college_attendance.services.qr_generator import QRGenerator
 from college_attendance.services.attendance import AttendanceService
+from college_attendance.services.auth import AuthService, verify_access_token
+from college_attendance.services.etags import make_etag, not_modified, with_etag
+from college_attendance.services.fast_json import FastJSONResponse
+from college_attendance.services.proxy_detector import detector as proxy_detector, fingerprint
+from college_attendance.services.session_lifecycle import SessionLifecycle
+from college_attendance.services.session_scheduler import SessionScheduler
 from college_attendance.models.db_models import Teacher
 
 router = APIRouter(prefix="/teacher", tags=["teacher"])
 
+bearer_scheme = HTTPBearer(auto_error=False)
+
+def get_current_teacher(
+    credentials: HTTPAuthorizationCredentials = Depends(bearer_scheme)
+) -> Dict[str, Any]:
+    """Teacher identity from the Bearer access token; no DB query per request"""
+    claims = verify_access_token(credentials.credentials) if credentials else None
+    if claims is None:
+        raise HTTPException(
+            status_code=401,
+            detail="Invalid or expired access token",
+            headers={"WWW-Authenticate": "Bearer"}
+        )
+    return claims
+
 # Pydantic models for request/response
+class LoginRequest(BaseModel):
+    email: str
+    password: str
+
+class LoginResponse(BaseModel):
+    access_token: str
+    token_type: str = "bearer"
+    expires_at: int
+    teacher: Dict[str, Any]
+
 class GenerateQRRequest(BaseModel):
     subject: str
     class_name: str
@@ -24,6 +56,14 @@ class GenerateQRResponse(BaseModel):
     session_info: Dict[str, Any]
     expires_at: str
 
+class TimetableSlotRequest(BaseModel):
+    subject: str
+    class_name: str
+    section: str = None
+    weekday: int  # 0 = Monday
+    start_time: time
+    duration_minutes: int = 60
+
 class SessionInfoResponse(BaseModel):
     id: int
     session_token: str
@@ -35,20 +75,53 @@ class SessionInfoResponse(BaseModel):
     is_active: bool
     attendance_count: int
 
+@router.post("/login", response_model=LoginResponse)
+async def login(
+    request: LoginRequest,
+    db: Session = Depends(get_db)
+):
+    """
+    Log in with email and password and receive a Bearer access token
+    """
+    result = await AuthService.login(db, request.email, request.password)
+    if not result["success"]:
+        raise HTTPException(
+            status_code=401,
+            detail=result["error"],
+            headers={"WWW-Authenticate": "Bearer"}
+        )
+    
+    return LoginResponse(
+        access_token=result["access_token"],
+        expires_at=result["expires_at"],
+        teacher=result["teacher"]
+    )
+
 @router.post("/generate-qr", response_model=GenerateQRResponse)
 async def generate_qr_code(
     request: GenerateQRRequest,
     db: Session = Depends(get_db),
+    teacher: Dict[str, Any] = Depends(get_current_teacher),
     http_request: Request = None
 ):
     """
     Generate a QR code for attendance session
     """
-    # TODO: Add teacher authentication
-    # For now, using a default teacher ID
-    teacher_id = 1  # This should come from authentication
+    teacher_id = teacher["teacher_id"]
     
     try:
+        # Timetabled classes have their session and QR code ready
+        prerendered = SessionScheduler.claim(
+            db, teacher_id, request.subject, request.class_name, request.section, request.duration_minutes
+        )
+        if prerendered:
+            return GenerateQRResponse(
+                qr_code=prerendered["qr_code"],
+                session_token=prerendered["session_token"],
+                session_info=prerendered["session_info"],
+                expires_at=prerendered["expires_at"].isoformat()
+            )
+        
         # Create session in database
         session = AttendanceService.create_session(
             db=db,
@@ -81,101 +154,275 @@ async def generate_qr_code(
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to generate QR code: {str(e)}")
 
+@router.get("/timetable")
+async def get_timetable(
+    db: Session = Depends(get_read_db),
+    teacher: Dict[str, Any] = Depends(get_current_teacher)
+):
+    """
+    Get the teacher's weekly timetable
+    """
+    from college_attendance.models.db_models import TimetableSlot
+    
+    slots = db.query(TimetableSlot).filter(
+        TimetableSlot.teacher_id == teacher["teacher_id"],
+        TimetableSlot.is_active == True
+    ).order_by(TimetableSlot.weekday, TimetableSlot.start_time).all()
+    
+    return [
+        {
+            "id": slot.id,
+            "subject": slot.subject,
+            "class_name": slot.class_name,
+            "section": slot.section,
+            "weekday": slot.weekday,
+            "start_time": slot.start_time.strftime("%H:%M"),
+            "duration_minutes": slot.duration_minutes
+        }
+        for slot in slots
+    ]
+
+@router.post("/timetable")
+async def add_timetable_slot(
+    request: TimetableSlotRequest,
+    db: Session = Depends(get_db),
+    teacher: Dict[str, Any] = Depends(get_current_teacher)
+):
+    """
+    Add a weekly slot; its session and QR code are prepared shortly before it starts
+    """
+    from college_attendance.models.db_models import TimetableSlot
+    
+    if not 0 <= request.weekday <= 6:
+        raise HTTPException(status_code=400, detail="weekday must be between 0 (Monday) and 6 (Sunday)")
+    if request.duration_minutes <= 0:
+        raise HTTPException(status_code=400, detail="duration_minutes must be positive")
+    
+    slot = TimetableSlot(
+        teacher_id=teacher["teacher_id"],
+        subject=request.subject.strip(),
+        class_name=request.class_name.strip(),
+        section=request.section.strip() if request.section else None,
+        weekday=request.weekday,
+        start_time=request.start_time.replace(second=0, microsecond=0),
+        duration_minutes=request.duration_minutes
+    )
+    db.add(slot)
+    db.commit()
+    db.refresh(slot)
+    
+    return {"id": slot.id, "message": "Timetable slot added"}
+
+@router.delete("/timetable/{slot_id}")
+async def remove_timetable_slot(
+    slot_id: int,
+    db: Session = Depends(get_db),
+    teacher: Dict[str, Any] = Depends(get_current_teacher)
+):
+    """
+    Remove a weekly slot (sessions already created are kept)
+    """
+    from college_attendance.models.db_models import TimetableSlot
+    
+    slot = db.query(TimetableSlot).filter(
+        TimetableSlot.id == slot_id,
+        TimetableSlot.teacher_id == teacher["teacher_id"]
+    ).first()
+    if not slot:
+        raise HTTPException(status_code=404, detail="Timetable slot not found")
+    
+    slot.is_active = False
+    db.commit()
+    
+    return {"message": "Timetable slot removed"}
+
 @router.get("/sessions", response_model=list[SessionInfoResponse])
 async def get_teacher_sessions(
-    db: Session = Depends(get_db),
+    request: Request,
+    db: Session = Depends(get_read_db),
+    teacher: Dict[str, Any] = Depends(get_current_teacher),
     limit: int = 20
 ):
     """
     Get all sessions for the teacher
     """
-    # TODO: Add teacher authentication
-    teacher_id = 1  # This should come from authentication
+    teacher_id = teacher["teacher_id"]
     
+    from sqlalchemy import func, select
     from college_attendance.models.db_models import Session as DBSession, Attendance
     
-    sessions = db.query(DBSession).filter(
+    # Version stamp: newest session, sessions claimed (a claim moves expires_at) and
+    # closed so far, newest scan in an open session
+    open_sessions = select(DBSession.id).where(DBSession.teacher_id == teacher_id, DBSession.closed_at.is_(None))
+    stamp = db.query(
+        func.max(DBSession.id),
+        func.count(DBSession.claimed_at),
+        func.count(DBSession.closed_at),
+        select(func.max(Attendance.id)).where(Attendance.session_id.in_(open_sessions)).scalar_subquery()
+    ).filter(DBSession.teacher_id == teacher_id).one()
+    etag = make_etag("sessions", teacher_id, limit, *stamp)
+    cached = not_modified(request, etag)
+    if cached:
+        return cached
+    
+    rows = db.query(
+        DBSession.id,
+        DBSession.session_token,
+        DBSession.subject,
+        DBSession.class_name,
+        DBSession.section,
+        DBSession.generated_at,
+        DBSession.expires_at,
+        DBSession.is_active,
+        DBSession.final_count.label("attendance_count")
+    ).filter(
         DBSession.teacher_id == teacher_id
     ).order_by(DBSession.generated_at.desc()).limit(limit).all()
     
-    session_responses = []
-    for session in sessions:
-        attendance_count = db.query(Attendance).filter(
-            Attendance.session_id == session.id
-        ).count()
-        
-        session_responses.append(SessionInfoResponse(
-            id=session.id,
-            session_token=session.session_token,
-            subject=session.subject,
-            class_name=session.class_name,
-            section=session.section,
-            generated_at=session.generated_at.isoformat(),
-            expires_at=session.expires_at.isoformat(),
-            is_active=session.is_active,
-            attendance_count=attendance_count
-        ))
+    # Closed sessions carry their frozen count; open ones are counted in one grouped query
+    sessions = [row._asdict() for row in rows]
+    open_ids = [session["id"] for session in sessions if session["attendance_count"] is None]
+    if open_ids:
+        live_counts = dict(db.query(Attendance.session_id, func.count(Attendance.id)).filter(
+            Attendance.session_id.in_(open_ids)
+        ).group_by(Attendance.session_id).all())
+        for session in sessions:
+            if session["attendance_count"] is None:
+                session["attendance_count"] = live_counts.get(session["id"], 0)
     
-    return session_responses
+    # Rows go straight to the encoder, which formats the datetimes
+    return with_etag(FastJSONResponse(sessions), etag)
 
 @router.get("/sessions/{session_id}/attendance")
 async def get_session_attendance(
     session_id: int,
-    db: Session = Depends(get_db)
+    request: Request,
+    db: Session = Depends(get_read_db),
+    teacher: Dict[str, Any] = Depends(get_current_teacher)
 ):
     """
     Get attendance records for a specific session
     """
-    # TODO: Add teacher authentication and verify teacher owns this session
+    from college_attendance.models.db_models import Session as DBSession, Attendance, Student, ClientIP, UserAgent
     
-    from college_attendance.models.db_models import Session as DBSession, Attendance, Student
-    
-    session = db.query(DBSession).filter(DBSession.id == session_id).first()
+    # Sessions of other teachers are reported as not found
+    session = db.query(DBSession).filter(
+        DBSession.id == session_id,
+        DBSession.teacher_id == teacher["teacher_id"]
+    ).first()
     if not session:
         raise HTTPException(status_code=404, detail="Session not found")
     
-    attendances = db.query(Attendance).filter(Attendance.session_id == session_id).all()
+    from sqlalchemy import func
+    
+    # Version stamp: newest scan and scan count, plus whether the session has closed
+    stamp = db.query(func.max(Attendance.id), func.count(Attendance.id)).filter(
+        Attendance.session_id == session_id
+    ).one()
+    etag = make_etag("attendance", session_id, session.closed_at, *stamp)
+    cached = not_modified(request, etag)
+    if cached:
+        return cached
     
+    rows = db.query(
+        Student.name.label("student_name"),
+        Student.roll_no,
+        Attendance.timestamp,
+        ClientIP.address.label("ip_address"),
+        Attendance.location,
+        UserAgent.value.label("user_agent")
+    ).join(Student, Student.id == Attendance.student_id).outerjoin(
+        ClientIP, ClientIP.id == Attendance.ip_address_id
+    ).outerjoin(
+        UserAgent, UserAgent.id == Attendance.user_agent_id
+    ).filter(
+        Attendance.session_id == session_id
+    ).order_by(Attendance.id).all()
+    
+    # Flag scans from devices that marked several students, counted from these rows so every worker agrees
+    flagged = proxy_detector.clusters((row.roll_no, row.ip_address, row.user_agent) for row in rows)
     attendance_records = []
-    for attendance in attendances:
-        student = db.query(Student).filter(Student.id == attendance.student_id).first()
+    proxy_clusters = {}
+    for row in rows:
+        device = fingerprint(row.ip_address, row.user_agent)
         attendance_records.append({
-            "student_name": student.name,
-            "roll_no": student.roll_no,
-            "timestamp": attendance.timestamp.isoformat(),
-            "ip_address": attendance.ip_address,
-            "location": attendance.location
+            "student_name": row.student_name,
+            "roll_no": row.roll_no,
+            "timestamp": row.timestamp,
+            "ip_address": row.ip_address,
+            "location": row.location,
+            "suspected_proxy": device in flagged
         })
+        if device in flagged:
+            proxy_clusters.setdefault(device, []).append(row.roll_no)
     
-    return {
+    return with_etag(FastJSONResponse({
         "session_info": {
             "subject": session.subject,
             "class": session.class_name,
             "section": session.section,
-            "generated_at": session.generated_at.isoformat(),
-            "expires_at": session.expires_at.isoformat()
+            "generated_at": session.generated_at,
+            "expires_at": session.expires_at,
+            "closed_at": session.closed_at,
+            "absent_count": session.absent_count
         },
         "attendance_count": len(attendance_records),
-        "attendance_records": attendance_records
-    }
+        "attendance_records": attendance_records,
+        "proxy_clusters": [
+            {"fingerprint": device, "estimated_students": flagged[device], "roll_nos": roll_nos}
+            for device, roll_nos in proxy_clusters.items()
+        ]
+    }), etag)
 
 @router.delete("/sessions/{session_id}")
 async def deactivate_session(
     session_id: int,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_db),
+    teacher: Dict[str, Any] = Depends(get_current_teacher)
 ):
     """
     Deactivate a session (mark as inactive)
     """
-    # TODO: Add teacher authentication and verify teacher owns this session
-    
     from college_attendance.models.db_models import Session as DBSession
     
-    session = db.query(DBSession).filter(DBSession.id == session_id).first()
+    session = db.query(DBSession).filter(
+        DBSession.id == session_id,
+        DBSession.teacher_id == teacher["teacher_id"]
+    ).first()
     if not session:
         raise HTTPException(status_code=404, detail="Session not found")
     
-    session.is_active = False
-    db.commit()
+    # Deactivate and run the close-out pipeline (absentees, frozen counts)
+    SessionLifecycle.close_session(db, session, reason="manual")
     
-    return {"message": "Session deactivated successfully"} 
\ No newline at end of file
+    return {"message": "Session deactivated successfully"}
+
+@router.get("/sessions/{session_id}/absentees")
+async def get_session_absentees(
+    session_id: int,
+    db: Session = Depends(get_read_db),
+    teacher: Dict[str, Any] = Depends(get_current_teacher)
+):
+    """
+    Get the students of the class who did not mark attendance (closed sessions only)
+    """
+    from college_attendance.models.db_models import Session as DBSession, Absence, Student
+    
+    session = db.query(DBSession).filter(
+        DBSession.id == session_id,
+        DBSession.teacher_id == teacher["teacher_id"]
+    ).first()
+    if not session:
+        raise HTTPException(status_code=404, detail="Session not found")
+    if session.closed_at is None:
+        raise HTTPException(status_code=409, detail="Absentees are recorded when the session closes")
+    
+    absentees = db.query(Student.name, Student.roll_no).join(
+        Absence, Absence.student_id == Student.id
+    ).filter(Absence.session_id == session_id).order_by(Student.roll_no).all()
+    
+    return {
+        "absent_count": session.absent_count,
+        "attendance_count": session.final_count,
+        "absentees": [{"student_name": name, "roll_no": roll_no} for name, roll_no in absentees]
+    } 
\ No newline at end of file
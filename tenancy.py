@@ -0,0 +1,118 @@
+"""
+Multi-college tenancy
+
+One deployment can serve several colleges, each with its own database. The
+college (tenant) of a request comes from the X-Tenant header (TENANT_HEADER),
+else from its Host: an exact match in TENANT_HOSTS, else the first label of
+the host name (beant.attendance.example.edu -> beant). Requests naming no
+known college use the default tenant, i.e. DATABASE_URL, so a deployment
+without TENANT_DATABASE_URLS behaves exactly as a single-college one.
+
+    TENANT_DATABASE_URLS=beant=postgresql://.../beant,gndu=postgresql://.../gndu
+    TENANT_HOSTS=attendance.bbsbec.ac.in=beant
+
+The tenant is held in a context variable for the whole request (and set
+explicitly by background jobs with use_tenant()), so per-request database
+sessions, access tokens and every cache keyed by ids (which repeat across
+colleges' databases) are kept apart. Engines per tenant are managed in
+database.py.
+"""
+import os
+import re
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterator, Optional
+
+from starlette.datastructures import Headers
+from starlette.responses import JSONResponse
+
+DEFAULT_TENANT = "default"
+TENANT_HEADER = os.getenv("TENANT_HEADER", "X-Tenant")
+TENANT_ID = re.compile(r"^[a-z0-9][a-z0-9_-]{0,62}$")
+
+def parse_mapping(value: str) -> Dict[str, str]:
+    """"a=x,b=y" -> {"a": "x", "b": "y"}"""
+    mapping = {}
+    for item in value.split(","):
+        key, sep, target = item.partition("=")
+        if not sep or not key.strip() or not target.strip():
+            continue
+        mapping[key.strip().lower()] = target.strip()
+    return mapping
+
+def _tenant_urls(value: str) -> Dict[str, str]:
+    urls = parse_mapping(value)
+    for tenant in urls:
+        if not TENANT_ID.match(tenant) or tenant == DEFAULT_TENANT:
+            raise ValueError(f"Invalid tenant id in TENANT_DATABASE_URLS: {tenant!r}")
+    return urls
+
+TENANT_DATABASE_URLS = _tenant_urls(os.getenv("TENANT_DATABASE_URLS", ""))
+TENANT_HOSTS = {host: tenant.lower() for host, tenant in parse_mapping(os.getenv("TENANT_HOSTS", "")).items()}
+
+_current: ContextVar[str] = ContextVar("tenant", default=DEFAULT_TENANT)
+
+class UnknownTenant(LookupError):
+    pass
+
+def current_tenant() -> str:
+    return _current.get()
+
+@contextmanager
+def use_tenant(tenant: str) -> Iterator[str]:
+    """Run a block (e.g. a background job) as the given tenant"""
+    token = _current.set(tenant)
+    try:
+        yield tenant
+    finally:
+        _current.reset(token)
+
+def scoped(key: str) -> str:
+    """Shared-state key for the current tenant (unchanged for the default tenant)"""
+    tenant = _current.get()
+    return key if tenant == DEFAULT_TENANT else f"{tenant}/{key}"
+
+def is_known(tenant: str) -> bool:
+    return tenant == DEFAULT_TENANT or tenant in TENANT_DATABASE_URLS
+
+def resolve_tenant(header: Optional[str], host: Optional[str]) -> str:
+    """Tenant named by the tenant header, else by the host; UnknownTenant if the header names none"""
+    if header:
+        tenant = header.strip().lower()
+        if not is_known(tenant):
+            raise UnknownTenant(tenant)
+        return tenant
+    if host:
+        host = host.rsplit(":", 1)[0].lower() if not host.endswith("]") else host.lower()
+        if host in TENANT_HOSTS:
+            return TENANT_HOSTS[host]
+        label = host.split(".", 1)[0]
+        if label in TENANT_DATABASE_URLS:
+            return label
+    return DEFAULT_TENANT
+
+class TenantMiddleware:
+    """Resolve each request's tenant before anything else runs"""
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] not in ("http", "websocket"):
+            await self.app(scope, receive, send)
+            return
+        headers = Headers(scope=scope)
+        try:
+            tenant = resolve_tenant(headers.get(TENANT_HEADER), headers.get("host"))
+        except UnknownTenant:
+            await JSONResponse({"detail": "Unknown college"}, status_code=404)(scope, receive, send)
+            return
+        token = _current.set(tenant)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _current.reset(token)
+
+def install(app):
+    """Add tenant resolution to the app when colleges are configured"""
+    if TENANT_DATABASE_URLS:
+        app.add_middleware(TenantMiddleware)
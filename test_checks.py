@@ -0,0 +1,35 @@
+#!/usr/bin/env python3
+"""
+The --check self-checks under pytest
+
+Each script's --check runs in its own interpreter: the checks configure the
+package through settings it reads at import time (a scratch database,
+immediate digests), which one test process could only set once.
+
+Usage:
+    python -m pytest test_checks.py
+"""
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+# Generous: the backup check copies a database under write load
+TIMEOUT_SECONDS = 600
+
+def _run_check(script):
+    """Run script --check and fail with its report unless it exits cleanly"""
+    result = subprocess.run(
+        [sys.executable, os.path.join(ROOT, script), "--check"],
+        capture_output=True, text=True, timeout=TIMEOUT_SECONDS
+    )
+    assert result.returncode == 0, f"{script} --check failed:\n{result.stdout}{result.stderr}"
+
+def test_state_backends():
+    _run_check("redis_standin.py")
+
+def test_notification_outbox():
+    _run_check("smtp_standin.py")
+
+def test_backup_snapshots():
+    _run_check("backup.py")
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+In-process SQL query budgets for the hot endpoints
+
+Runs each endpoint against a freshly seeded database (the benchmark.py
+dataset and fixtures) inside query_budget(), which fails when a request
+issues more statements than its endpoint's budget or repeats a statement
+shape, the signature of an N+1 loop. test_system.py checks the same budgets
+against a running server through the X-Query-Count header.
+
+Usage:
+    python -m pytest test_query_budgets.py
+"""
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import tempfile
+
+from checks import use_database
+
+# SQL statements allowed per request. A scan's budget covers the first scan
+# of a session from a new device (snapshots and interned client metadata
+# loaded); later scans of the session are held to WARM_SCAN_BUDGET.
+QUERY_BUDGETS = {
+    "generate-qr": 3,
+    "validate-qr": 0,
+    "mark-attendance": 7,
+    "attendance-history": 2,
+    "teacher-sessions": 3,
+    "session-attendance": 3,
+}
+WARM_SCAN_BUDGET = 2
+
+# Endpoint names above to the benchmark.py fixtures that call them
+BENCHMARKS = {
+    "generate-qr": "generate_qr",
+    "validate-qr": "validate_qr",
+    "mark-attendance": "mark_attendance",
+    "attendance-history": "student_history",
+    "teacher-sessions": "teacher_sessions",
+    "session-attendance": "session_attendance",
+}
+
+# Requests per endpoint; enough for a scan session's first and later scans
+REQUESTS = 5
+
+_fixtures = {}
+
+def _endpoints():
+    """Test client and benchmark fixtures, seeded once per run"""
+    if not _fixtures:
+        database = os.path.join(tempfile.mkdtemp(), "query_budgets.db")
+        use_database(database)
+        from benchmark import build_benchmarks, seed_database
+        seed_database(database)
+
+        from fastapi.testclient import TestClient
+        from college_attendance.database import SessionLocal
+        from college_attendance.main import app
+
+        client = TestClient(app)
+        db = SessionLocal()
+        try:
+            _fixtures.update({bench.name: bench for bench in build_benchmarks(client, db)})
+        finally:
+            db.close()
+        _fixtures["client"] = client
+    return _fixtures
+
+def _check(endpoint, budgets=None):
+    """Call an endpoint REQUESTS times, each within its budget (budgets[i] overrides the i-th)"""
+    from college_attendance.services.query_profiler import query_budget
+
+    fixtures = _endpoints()
+    client, bench = fixtures["client"], fixtures[BENCHMARKS[endpoint]]
+    for i in range(REQUESTS):
+        request = bench.setup(i)
+        budget = (budgets or {}).get(i, QUERY_BUDGETS[endpoint])
+        with query_budget(budget, max_repeats=1):
+            response = client.request(bench.method, bench.path, **request)
+        assert response.status_code == 200, f"{endpoint}: HTTP {response.status_code} {response.text}"
+
+def test_generate_qr():
+    _check("generate-qr")
+
+def test_validate_qr():
+    _check("validate-qr")
+
+def test_mark_attendance():
+    # The first scan of the session loads every cache; the rest only read the student
+    _check("mark-attendance", {i: WARM_SCAN_BUDGET for i in range(1, REQUESTS)})
+
+def test_attendance_history():
+    _check("attendance-history")
+
+def test_teacher_sessions():
+    _check("teacher-sessions")
+
+def test_session_attendance():
+    _check("session-attendance")
@@ -5,11 +5,45 @@ This script demonstrates the complete workflow of the attendance system.
 """
 import requests
 import json
+import sys
 import time
 from datetime import datetime
 
+from test_query_budgets import QUERY_BUDGETS
+
 # Configuration
 BASE_URL = "http://localhost:8000"
+TEACHER_EMAIL = "sarah.johnson@college.edu"
+TEACHER_PASSWORD = "teacher123"
+
+# Authorization header for teacher endpoints, filled in by test_teacher_login()
+AUTH_HEADERS = {}
+
+# SQL statements allowed per request (shared with test_query_budgets.py) are
+# checked against the X-Query-Count header, so run the server with
+# QUERY_PROFILER=1. Endpoints over budget or without the header are collected
+# here and fail the run.
+BUDGET_FAILURES = []
+
+def check_query_budget(response, endpoint):
+    """Check the profiler's query count header against the endpoint budget"""
+    count = response.headers.get("x-query-count")
+    if count is None:
+        print(f"❌ No X-Query-Count header from {endpoint}: start the server with QUERY_PROFILER=1")
+        BUDGET_FAILURES.append(f"{endpoint}: no query count")
+        return False
+    
+    budget = QUERY_BUDGETS[endpoint]
+    repeated = response.headers.get("x-query-repeated")
+    if int(count) > budget:
+        print(f"❌ Query budget exceeded for {endpoint}: {count} > {budget}")
+        if repeated:
+            print(f"   Repeated query shapes: {repeated}")
+        BUDGET_FAILURES.append(f"{endpoint}: {count} > {budget} queries")
+        return False
+    
+    print(f"Queries: {count}/{budget}" + (f" (repeated shapes: {repeated})" if repeated else ""))
+    return True
 
 def test_health_check():
     """Test the health endpoint"""
@@ -19,6 +53,25 @@ def test_health_check():
     print(f"Response: {response.json()}")
     print()
 
+def test_teacher_login():
+    """Test teacher login"""
+    print("🔑 Testing teacher login...")
+    
+    response = requests.post(f"{BASE_URL}/teacher/login", json={
+        "email": TEACHER_EMAIL,
+        "password": TEACHER_PASSWORD
+    })
+    print(f"Status: {response.status_code}")
+    
+    if response.status_code == 200:
+        result = response.json()
+        AUTH_HEADERS["Authorization"] = f"Bearer {result['access_token']}"
+        print(f"✅ Logged in as {result['teacher']['name']}")
+        return True
+    else:
+        print(f"❌ Failed to log in: {response.text}")
+        return False
+
 def test_generate_qr():
     """Test QR code generation"""
     print("📱 Testing QR code generation...")
@@ -30,8 +83,9 @@ def test_generate_qr():
         "duration_minutes": 10
     }
     
-    response = requests.post(f"{BASE_URL}/teacher/generate-qr", json=data)
+    response = requests.post(f"{BASE_URL}/teacher/generate-qr", json=data, headers=AUTH_HEADERS)
     print(f"Status: {response.status_code}")
+    check_query_budget(response, "generate-qr")
     
     if response.status_code == 200:
         result = response.json()
@@ -54,6 +108,7 @@ def test_validate_qr(qr_data):
     
     response = requests.post(f"{BASE_URL}/student/validate-qr", json=data)
     print(f"Status: {response.status_code}")
+    check_query_budget(response, "validate-qr")
     
     if response.status_code == 200:
         result = response.json()
@@ -80,6 +135,7 @@ def test_mark_attendance(session_token, student_roll_no):
     
     response = requests.post(f"{BASE_URL}/student/mark-attendance", json=data)
     print(f"Status: {response.status_code}")
+    check_query_budget(response, "mark-attendance")
     
     if response.status_code == 200:
         result = response.json()
@@ -101,6 +157,7 @@ def test_get_attendance_history(student_roll_no):
     
     response = requests.get(f"{BASE_URL}/student/attendance-history/{student_roll_no}")
     print(f"Status: {response.status_code}")
+    check_query_budget(response, "attendance-history")
     
     if response.status_code == 200:
         result = response.json()
@@ -123,8 +180,9 @@ def test_get_teacher_sessions():
     """Test getting teacher sessions"""
     print("\n👨‍🏫 Testing teacher sessions...")
     
-    response = requests.get(f"{BASE_URL}/teacher/sessions")
+    response = requests.get(f"{BASE_URL}/teacher/sessions", headers=AUTH_HEADERS)
     print(f"Status: {response.status_code}")
+    check_query_budget(response, "teacher-sessions")
     
     if response.status_code == 200:
         sessions = response.json()
@@ -144,8 +202,9 @@ def test_get_session_attendance(session_id):
     """Test getting session attendance"""
     print(f"\n📋 Testing session attendance for session {session_id}...")
     
-    response = requests.get(f"{BASE_URL}/teacher/sessions/{session_id}/attendance")
+    response = requests.get(f"{BASE_URL}/teacher/sessions/{session_id}/attendance", headers=AUTH_HEADERS)
     print(f"Status: {response.status_code}")
+    check_query_budget(response, "session-attendance")
     
     if response.status_code == 200:
         result = response.json()
@@ -171,6 +230,11 @@ def main():
     # Test health check
     test_health_check()
     
+    # Test teacher login
+    if not test_teacher_login():
+        print("❌ Cannot continue without a teacher access token")
+        return
+    
     # Test QR code generation
     qr_result = test_generate_qr()
     if not qr_result:
@@ -203,6 +267,12 @@ def main():
     if session_id:
         test_get_session_attendance(session_id)
     
+    if BUDGET_FAILURES:
+        print("\n❌ Query budgets failed:")
+        for failure in BUDGET_FAILURES:
+            print(f"  - {failure}")
+        sys.exit(1)
+    
     print("\n🎉 Test workflow completed!")
     print("\n📋 Next Steps:")
     print("1. Visit http://localhost:8000/docs for interactive API documentation")